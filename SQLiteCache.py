@@ -43,6 +43,7 @@ class SqliteCache:
     _set_sql = 'REPLACE INTO entries (key, val, exp) VALUES (?, ?, ?)'
     _add_sql = 'INSERT INTO entries (key, val, exp) VALUES (?, ?, ?)'
     _clear_sql = "DELETE FROM cache"  # Corrected SQL statement
+    _del_response_sql = 'DELETE FROM responses WHERE key = ?'
 
     _create_sql_stats = '''
     CREATE TABLE IF NOT EXISTS stats (
@@ -93,6 +94,18 @@ class SqliteCache:
             conn.execute('''CREATE TABLE IF NOT EXISTS omdb_cache
                             (key TEXT PRIMARY KEY, value BLOB, expires REAL)''')
 
+            # Create validators table if it doesn't exist
+            conn.execute('''CREATE TABLE IF NOT EXISTS validators
+                            (key TEXT PRIMARY KEY, value TEXT)''')
+
+            # Create responses table if it doesn't exist
+            conn.execute('''CREATE TABLE IF NOT EXISTS responses
+                            (key TEXT PRIMARY KEY, etag TEXT, meta TEXT, identity BLOB, gzip BLOB, br BLOB)''')
+
+            # Create hits table (cache hits per key) if it doesn't exist
+            conn.execute('''CREATE TABLE IF NOT EXISTS hits
+                            (key TEXT PRIMARY KEY, count INTEGER)''')
+
     def _get_conn(self):
         conn = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
         return conn
@@ -138,6 +151,53 @@ class SqliteCache:
 
         return return_value
 
+    def get_entry(self, key):
+
+        """ Retreive a value and its expiry time without dropping it when expired """
+
+        key = key.lower()
+        with self._get_conn() as conn:
+            row = conn.execute(self._get_sql, (key,)).fetchone()
+        if not row:
+            return None, None
+        return loads(row[0]), loads(row[1])
+
+    def touch(self, key, timeout=None):
+
+        """ Push back the expiry of an existing entry """
+
+        Default_caching_period = 30*24*60*60  # 30 days
+        expire = time() + Default_caching_period if timeout is None else time() + float(timeout)
+        with self._get_conn() as conn:
+            conn.execute('UPDATE entries SET exp = ? WHERE key = ?', (PickleBuffer(dumps(expire)), key.lower()))
+
+    def get_many(self, keys):
+
+        """ Retreive several values at once, returned as a dict of the lowercased keys that hit """
+
+        keys = list(dict.fromkeys(key.lower() for key in keys))
+        if not keys:
+            return {}
+
+        # Expired entries are skipped but kept, so they can still be revalidated
+        results = {}
+        now = time()
+        placeholders = ', '.join('?' for _ in keys)
+        with self._get_conn() as conn:
+            for key, val, exp in conn.execute(f'SELECT key, val, exp FROM entries WHERE key IN ({placeholders})', keys):
+                expire = loads(exp)
+                if expire == 0 or expire > now:
+                    results[key] = loads(val)
+
+        return results
+
+    def keys(self):
+
+        """ List every key in the cache, expired or not """
+
+        with self._get_conn() as conn:
+            return [row[0] for row in conn.execute('SELECT key FROM entries')]
+
     def get_exp(self, key):
         return_value = None
         key = key.lower()
@@ -157,6 +217,7 @@ class SqliteCache:
 
         with self._get_conn() as conn:
             conn.execute(self._del_sql, (key,))
+            conn.execute(self._del_response_sql, (key.lower(),))
 
     def update(self, key, show_info, timeout=None):
         """ Sets a k,v pair with an optional timeout """
@@ -172,6 +233,8 @@ class SqliteCache:
         with self._get_conn() as conn:
             try:
                 conn.execute(self._set_sql, (key, val, expire))
+                # The stored response was encoded from the old value
+                conn.execute(self._del_response_sql, (key.lower(),))
                 if isinstance(show_info, dict):
                     logger.info(f"Successfully updated results in cache for [{show_info.get('title', 'Unknown')}] [{show_info.get('provider', 'Unknown')}]")
                 else:
@@ -207,10 +270,13 @@ class SqliteCache:
         with self._get_conn() as conn:
             try:
                 conn.execute(self._add_sql, (key, val, expire2))
+                conn.execute(self._del_response_sql, (key.lower(),))
+                return
             except sqlite3.IntegrityError:
-                # Call the update method as fallback
                 logger.info(f'Attempting to set an existing key {key}. Falling back to update method.')
-                self.update(key, show_info, timeout)
+
+        # Call the update method as fallback, once the failed insert has released its lock
+        self.update(key, show_info, timeout)
 
     def clear(self):
         try:
@@ -220,6 +286,9 @@ class SqliteCache:
                 conn.execute("DELETE FROM stats")
                 conn.execute("DELETE FROM logs")
                 conn.execute("DELETE FROM omdb_cache")
+                conn.execute("DELETE FROM validators")
+                conn.execute("DELETE FROM responses")
+                conn.execute("DELETE FROM hits")
             logger.info('Cache cleared successfully')
         except Exception as e:
             logger.error(f"Failed to clear cache: {e}")
@@ -258,6 +327,22 @@ class SqliteCache:
             logger.error(f"Error getting all stats: {e}")
             return {}  # Return an empty dict if there's an error
 
+    # Hit statistics per cache key, added up across processes
+    def record_hits(self, counts):
+        with self._get_conn() as conn:
+            conn.executemany("INSERT INTO hits (key, count) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET count = count + excluded.count",
+                             [(key.lower(), count) for key, count in counts.items()])
+
+    def hottest_keys(self, limit):
+        with self._get_conn() as conn:
+            return [key for key, in conn.execute("SELECT key FROM hits ORDER BY count DESC LIMIT ?", (limit,))]
+
+    def ping(self):
+        """ Check that the database file can be opened and read """
+        with self._get_conn() as conn:
+            conn.execute("SELECT 1 FROM entries LIMIT 1").fetchall()
+        return True
+
     # Logs methods
     def add_log(self, level, message):
         timestamp = datetime.now().isoformat()
@@ -286,6 +371,38 @@ class SqliteCache:
             conn.execute("INSERT OR REPLACE INTO omdb_cache (key, value, expires) VALUES (?, ?, ?)", 
                          (key, val, expire))
 
+    # Validators (ETag, Last-Modified, body hash) of the pages behind each cache entry
+    def get_validators(self, key):
+        with self._get_conn() as conn:
+            result = conn.execute("SELECT value FROM validators WHERE key = ?", (key.lower(),)).fetchone()
+            return json.loads(result[0]) if result else None
+
+    def set_validators(self, key, validators):
+        with self._get_conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO validators (key, value) VALUES (?, ?)", (key.lower(), json.dumps(validators)))
+
+    # Encoded /get_data responses (see response_cache.py), valid as long as their entry
+    def get_response(self, key):
+
+        """ Retreive the encoded response of an entry and the entry's expiry time """
+
+        with self._get_conn() as conn:
+            row = conn.execute(
+                'SELECT r.etag, r.meta, r.identity, r.gzip, r.br, e.exp FROM responses r '
+                'JOIN entries e ON e.key = r.key WHERE r.key = ?', (key.lower(),)
+            ).fetchone()
+        if not row:
+            return None, None
+        etag, meta, identity, gzip, br, exp = row
+        return {'etag': etag, 'meta': json.loads(meta), 'identity': identity, 'gzip': gzip, 'br': br}, loads(exp)
+
+    def set_response(self, key, response):
+        with self._get_conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, meta, identity, gzip, br) VALUES (?, ?, ?, ?, ?, ?)",
+                (key.lower(), response['etag'], json.dumps(response['meta']), response['identity'], response['gzip'], response['br'])
+            )
+
     def clear_logs(self):
         with self._get_conn() as conn:
             conn.execute("DELETE FROM logs")
@@ -293,6 +410,7 @@ class SqliteCache:
     def clear_stats(self):
         with self._get_conn() as conn:
             conn.execute("DELETE FROM stats")
+            conn.execute("DELETE FROM hits")
 
     def get_logs_count(self):
         with self._get_conn() as conn:
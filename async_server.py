@@ -0,0 +1,240 @@
+#!/usr/bin/python
+
+import argparse
+import asyncio
+import io
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import index
+import profiling
+import readiness
+import response_cache
+import tracing
+import upstream
+
+logger = logging.getLogger(__name__)
+
+# Event-loop server for the API. /get_data runs end to end as coroutines
+# (ParentalGuideService.lookup_async): OMDB, the provider pages and the rate limiter
+# waits are all awaited, so a slow upstream costs a parked coroutine rather
+# than a server thread. Cache reads and writes and the stats update are short
+# blocking calls and go to the loop's default thread pool.
+#
+# Every other route (the admin panel, stats, batch, ...) is served by the Flask
+# app as before, through a small WSGI bridge running it on WSGI_THREADS threads
+# and streaming its response back.
+#
+#     python async_server.py --port 8080
+
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 8))
+
+
+async def get_data(request):
+    with tracing.trace('get_data') as trace:
+        with profiling.profile(request.query.get('provider', '').lower()):
+            response = await lookup_response(request, trace)
+        tracing.respond(trace, response.headers, response.status)
+        return response
+
+
+async def lookup_response(request, trace):
+    try:
+        index.app.logger.info("Received request for /get_data")
+
+        imdb_id = request.query.get('imdb_id')
+        video_name = index.normalize_video_name(request.query.get('video_name', ''))
+        release_year = request.query.get('release_year')
+        provider = request.query.get('provider', '').lower()
+
+        index.app.logger.info(f"Request parameters: imdb_id={imdb_id}, video_name={video_name}, release_year={release_year}, provider={provider}")
+
+        country = index.get_country_from_ip(request.remote)
+
+        lookup = await index.service.lookup_async(imdb_id, video_name, release_year, provider, country, encoded=True)
+        if trace is not None:
+            trace.note(provider=provider, key=lookup.key, source=lookup.source)
+        payload, status_code = lookup.payload, lookup.status_code
+    except Exception as e:
+        logger.error(f"Error in get_data: {str(e)}", exc_info=True)
+        payload, status_code = {"error": "An internal server error occurred"}, 500
+
+    if isinstance(payload, response_cache.EncodedResponse):
+        status_code, headers, body = response_cache.respond(payload, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+        return web.Response(status=status_code, body=body, headers=headers)
+
+    # Same bytes as jsonify() in the Flask app
+    response = web.Response(status=status_code, body=response_cache.json_body(payload), content_type='application/json')
+    if payload.get('retry_after'):
+        response.headers['Retry-After'] = str(payload['retry_after'])
+    return response
+
+
+def _environ(request, body):
+    host, _, port = (request.host or '').partition(':')
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': request.path,
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': host or 'localhost',
+        'SERVER_PORT': port or ('443' if request.secure else '80'),
+        'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+        'REMOTE_ADDR': request.remote or '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace('-', '_')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'CONTENT_LENGTH':
+            key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WSGIBridge:
+    """
+        WSGIBridge
+
+        Serves an aiohttp request with a WSGI app on a thread pool. The
+        status line and body chunks are handed back to the loop as they are
+        produced, so streamed responses (/get_data/batch) still stream.
+    """
+
+    def __init__(self, wsgi_app, threads=WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, request):
+        environ = _environ(request, await request.read())
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+        chunks = asyncio.Queue()
+
+        def start_response(status, headers, exc_info=None):
+            loop.call_soon_threadsafe(_resolve, started, (status, headers))
+            return lambda data: loop.call_soon_threadsafe(chunks.put_nowait, data)
+
+        def run():
+            try:
+                result = self.wsgi_app(environ, start_response)
+                try:
+                    for data in result:
+                        if data:
+                            loop.call_soon_threadsafe(chunks.put_nowait, data)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            except BaseException as e:
+                loop.call_soon_threadsafe(_resolve, started, e)
+                raise
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+        done = loop.run_in_executor(self.executor, run)
+        try:
+            status, headers = await started
+        except BaseException:
+            await asyncio.gather(done, return_exceptions=True)
+            raise
+        code, _, reason = status.partition(' ')
+        response = web.StreamResponse(status=int(code), reason=reason or None)
+        for name, value in headers:
+            response.headers.add(name, value)
+        await response.prepare(request)
+        while True:
+            data = await chunks.get()
+            if data is None:
+                break
+            await response.write(data)
+        await done
+        await response.write_eof()
+        return response
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def _resolve(future, outcome):
+    if future.done():
+        return
+    if isinstance(outcome, BaseException):
+        future.set_exception(outcome)
+    else:
+        future.set_result(outcome)
+
+
+def _queue_database_logging():
+    """
+    Move the log-to-database handlers onto a listener thread, so logging from
+    the event loop never waits for a log row to be written.
+    """
+    # Install the Flask app's handler now, not on its first request
+    index.app.before_first_request_funcs = [f for f in index.app.before_first_request_funcs if f is not index.setup_logging]
+    index.setup_logging()
+
+    listeners = []
+    # app.logger is index.logger itself when index is imported rather than run
+    for target in {id(target): target for target in (index.logger, index.app.logger)}.values():
+        for handler in list(target.handlers):
+            if isinstance(handler, index.DatabaseHandler):
+                records = queue.SimpleQueue()
+                target.removeHandler(handler)
+                target.addHandler(logging.handlers.QueueHandler(records))
+                listeners.append(logging.handlers.QueueListener(records, handler, respect_handler_level=True))
+    for listener in listeners:
+        listener.start()
+    return listeners
+
+
+def make_app(wsgi_threads=WSGI_THREADS):
+    app = web.Application()
+    bridge = WSGIBridge(index.app, wsgi_threads)
+    app.router.add_get('/get_data', get_data)
+    app.router.add_route('*', '/{tail:.*}', bridge)
+
+    async def on_startup(app):
+        app['log_listeners'] = _queue_database_logging()
+        # Warms the pools of this loop; /status reports ready once it is done
+        app['warm_up'] = asyncio.get_running_loop().create_task(readiness.warm_up_async())
+
+    async def on_cleanup(app):
+        app['warm_up'].cancel()
+        await upstream.close_async_session()
+        # Loaded with the IMDb provider, if it was used
+        imdb = sys.modules.get('imdb')
+        if imdb:
+            await imdb.close_async_session()
+        bridge.close()
+        for listener in app['log_listeners']:
+            listener.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the API on an event loop, with /get_data running as coroutines")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    print(f" * Async server starting on http://{args.host}:{args.port}")
+    print(f" * API endpoint: http://{args.host}:{args.port}/get_data")
+    print(f" * Readiness: http://{args.host}:{args.port}/status")
+    web.run_app(make_app(), host=args.host, port=args.port, print=None)
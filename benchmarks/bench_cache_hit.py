@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+"""
+    CPU time per cached /get_data request.
+
+    Seeds a throwaway SQLite cache with one result shaped like a provider's
+    (--items review items of --text-bytes each) and requests it repeatedly
+    through the Flask test client, logging as deployed (to the database and
+    to a discarded stdout). Reports process CPU time and response size per
+    request for a plain client, a gzip/brotli-accepting one and, when the
+    response carries an ETag, a revalidating one (If-None-Match). The log
+    and stats writes dominate; --no-log leaves them out to show the cost of
+    preparing the response itself.
+
+    Usage: python benchmarks/bench_cache_hit.py [--requests 2000] [--no-log]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ['Sex & Nudity', 'Violence & Gore', 'Profanity', 'Alcohol, Drugs & Smoking', 'Frightening & Intense Scenes']
+
+
+def sample_result(items, text_bytes):
+    sentence = "A scene in a bedroom implies more than it shows, and a later argument turns physical. "
+    text = (sentence * (text_bytes // len(sentence) + 1))[:text_bytes]
+    return {
+        'id': 'tt0000001',
+        'title': 'Sample Title',
+        'provider': 'imdb',
+        'review-link': 'https://www.imdb.com/title/tt0000001/parentalguide',
+        'review-items': [
+            {'name': CATEGORIES[n % len(CATEGORIES)], 'score': n % 10, 'description': text, 'cat': 'Moderate', 'votes': {'None': 3, 'Mild': 14, 'Moderate': 52, 'Severe': 9}}
+            for n in range(items)
+        ],
+    }
+
+
+def measure(client, url, clients, requests):
+    """CPU seconds per request and the last response, per client; requests are interleaved so drift hits every client alike."""
+    cpu = {name: 0.0 for name in clients}
+    last = {}
+    for _ in range(requests):
+        for name, headers in clients.items():
+            started = time.process_time()
+            last[name] = client.get(url, headers=headers)
+            cpu[name] += time.process_time() - started
+    return {name: (cpu[name] / requests, last[name]) for name in clients}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=5, help="review items in the cached result")
+    parser.add_argument('--text-bytes', type=int, default=1500, help="description length of each review item")
+    parser.add_argument('--no-log', action='store_true', help="disable logging")
+    args = parser.parse_args()
+
+    os.environ['CACHE_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench_cache_hit.sqlite')
+    # In WAL mode, as server.py runs it
+    import server
+    server._use_wal()
+    import index
+
+    # Log as deployed, minus the terminal
+    devnull = open(os.devnull, 'w')
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream in (sys.stdout, sys.stderr):
+            handler.setStream(devnull)
+    if args.no_log:
+        logging.disable(logging.CRITICAL)
+
+    index.db.set('imdb:tt0000001', sample_result(args.items, args.text_bytes))
+    url = '/get_data?imdb_id=tt0000001&provider=imdb&video_name=Sample+Title'
+    client = index.app.test_client()
+
+    clients = {'plain': {}, 'compressed': {'Accept-Encoding': 'gzip, deflate, br'}}
+    etag = client.get(url, headers=clients['compressed']).headers.get('ETag')
+    if etag:
+        clients['revalidate'] = dict(clients['compressed'], **{'If-None-Match': etag})
+    results = measure(client, url, clients, args.requests)
+
+    print(f"{args.requests} cached requests per row, result of {args.items} items x {args.text_bytes} bytes")
+    print(f"{'client':<12}{'status':>8}{'encoding':>10}{'bytes':>8}{'CPU us/req':>12}")
+    for name, (cpu, response) in results.items():
+        print(f"{name:<12}{response.status_code:>8}{response.headers.get('Content-Encoding', '-'):>10}"
+              f"{len(response.get_data()):>8}{cpu * 1e6:>12.0f}")
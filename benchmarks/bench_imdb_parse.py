@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+"""
+    Compare the IMDb __NEXT_DATA__ fast path with the full BeautifulSoup parse.
+
+    Runs both over the saved new-structure fixture and reports the mean parse
+    time and the peak traced memory of a single parse.
+
+    Usage: python benchmarks/bench_imdb_parse.py [--runs 50]
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+
+import imdb
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'imdb_new_structure.html')
+PG_URL = 'https://www.imdb.com/title/tt0000001/parentalguide'
+
+
+def full_parse(html):
+    soup = BeautifulSoup(html, 'lxml')
+    return imdb.process_new_structure(soup, 'tt0000001', 'Sample', PG_URL)
+
+
+def fast_parse(html):
+    return imdb.parse_parentsguide(html, 'tt0000001', 'Sample', PG_URL)
+
+
+def measure(fn, html, runs):
+    fn(html)  # warm up
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn(html)
+    mean = (time.perf_counter() - started) / runs
+
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return mean, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    # The parsers log every category; keep that out of the timings
+    logging.disable(logging.CRITICAL)
+
+    with open(FIXTURE, encoding='utf-8') as f:
+        html = f.read()
+
+    # ...and the debug prints too
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        assert fast_parse(html) == full_parse(html), "fast path and full parse disagree"
+        results = {name: measure(fn, html, args.runs) for name, fn in (('beautifulsoup', full_parse), ('next_data', fast_parse))}
+
+    print(f"Fixture: {os.path.basename(FIXTURE)} ({len(html) / 1024:.0f} KiB), {args.runs} runs")
+    print(f"{'parser':<16}{'mean ms':>10}{'peak KiB':>12}")
+    for name, (mean, peak) in results.items():
+        print(f"{name:<16}{mean * 1000:>10.2f}{peak / 1024:>12.0f}")
+
+    (slow, slow_peak), (fast, fast_peak) = results['beautifulsoup'], results['next_data']
+    print(f"speedup: {slow / fast:.1f}x, peak memory: {slow_peak / fast_peak:.1f}x lower")
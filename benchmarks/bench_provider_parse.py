@@ -0,0 +1,84 @@
+#!/usr/bin/python
+
+"""
+    Compare the targeted provider parsers with the full-page html.parser parse
+    they replace.
+
+    The "full" column is what each scraper used to pay per page: a complete
+    html.parser tree (plus str(soup) where the old code regexed the serialised
+    tree). The "targeted" column is the current parse function, extraction
+    included, building only the subtrees it reads.
+
+    Usage: python benchmarks/bench_provider_parse.py [--runs 30]
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+
+import commonsensemedia
+import cringMDB
+import dove
+import kidsinmind
+import movieguide
+import parentpreviews
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def full_parse(html):
+    return BeautifulSoup(html, 'html.parser')
+
+
+def full_parse_and_serialise(html):
+    return str(BeautifulSoup(html, 'html.parser'))
+
+
+def kidsinmind_title(html):
+    _, title, _ = kidsinmind.parse_title_page(html)
+    return kidsinmind.parse_review_items(html, title)
+
+
+CASES = [
+    ('kidsinmind search', 'kidsinmind_search.html', full_parse, lambda html: kidsinmind.parse_search_results(html, 'fixture')),
+    ('kidsinmind title', 'kidsinmind_title.html', full_parse_and_serialise, kidsinmind_title),
+    ('dove search', 'dove_search.html', full_parse, dove.parse_search_results),
+    ('dove review', 'dove_review.html', full_parse, dove.parse_review),
+    ('commonsense', 'commonsense_review.html', full_parse, lambda html: commonsensemedia.parse_review(html, 'tt0000001', 'fixture')),
+    ('cringmdb', 'cringmdb_movie.html', full_parse, cringMDB.parse_movie_page),
+    ('movieguide', 'movieguide_review.html', full_parse, lambda html: movieguide.parse_review(html, 'fixture')),
+    ('parentpreviews', 'parentpreviews_review.html', full_parse_and_serialise, parentpreviews.parse_review_items),
+]
+
+
+def measure(fn, html, runs):
+    fn(html)  # warm up
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn(html)
+    return (time.perf_counter() - started) / runs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'provider':<20}{'KiB':>6}{'full ms':>10}{'targeted ms':>14}{'speedup':>10}")
+    for name, fixture, baseline, targeted in CASES:
+        with open(os.path.join(FIXTURES, fixture), encoding='utf-8') as f:
+            html = f.read()
+        # cringMDB prints the sections it finds
+        with open(os.path.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            full = measure(baseline, html, args.runs)
+            fast = measure(targeted, html, args.runs)
+        print(f"{name:<20}{len(html) / 1024:>6.0f}{full * 1000:>10.2f}{fast * 1000:>14.2f}{full / fast:>9.1f}x")
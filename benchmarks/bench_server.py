@@ -0,0 +1,115 @@
+#!/usr/bin/python
+
+"""
+    Throughput of server.py across worker/thread configurations.
+
+    For each configuration (mode:workers x threads) server.py is started as a
+    subprocess against the stand-in upstream, with a throwaway SQLite cache,
+    and driven over HTTP like load_test.py does. It is then stopped with
+    SIGTERM, so every row also checks that the server drains and exits
+    cleanly.
+
+    Usage: python benchmarks/bench_server.py [--configs waitress:1x16,waitress:4x8,async:4x8]
+"""
+
+import argparse
+import contextlib
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS, '..')
+sys.path.insert(0, ROOT)
+
+import requests
+
+import ratelimit
+import standin
+from load_test import LoadTest
+
+DEFAULT_CONFIGS = 'waitress:1x16,waitress:4x8,async:1x8,async:4x8'
+STARTUP_TIMEOUT = 30
+
+
+def parse_config(config):
+    mode, _, shape = config.partition(':')
+    workers, _, threads = shape.partition('x')
+    return mode, int(workers), int(threads)
+
+
+def free_port():
+    with contextlib.closing(socket.socket()) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, workers, threads, port, env):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'server.py'), '--host', '127.0.0.1', '--port', str(port),
+         '--mode', mode, '--workers', str(workers), '--threads', str(threads)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    give_up = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < give_up:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"server.py did not come up on port {port}")
+
+
+def stop_server(process):
+    """Seconds the server took to drain and exit after SIGTERM, and its exit code."""
+    started = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    try:
+        code = process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        code = process.wait()
+    return time.perf_counter() - started, code
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS, help="comma-separated mode:workers x threads")
+    parser.add_argument('--profile', choices=sorted(standin.PROFILES), default='realistic')
+    parser.add_argument('--provider', default='parentpreviews')
+    parser.add_argument('--threads', type=int, default=64, help="client threads")
+    parser.add_argument('--requests', type=int, default=256, help="requests per workload")
+    parser.add_argument('--workloads', default='hit,miss')
+    parser.add_argument('--hit-ratio', type=float, default=0.8)
+    args = parser.parse_args()
+
+    fake_upstream = standin.StandInServer(args.profile)
+    env = dict(os.environ, UPSTREAM_STANDIN=fake_upstream.start(), OMDB_API_KEY='standin')
+    # Let the stand-in profile decide how the "upstream" behaves
+    for name in ratelimit.PROVIDER_LIMITS:
+        env[f"RATE_LIMIT_{name.upper()}"] = "10000,10000,1000"
+
+    rows = []
+    for config in args.configs.split(','):
+        mode, workers, threads = parse_config(config)
+        env['CACHE_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench_server.sqlite')
+        port = free_port()
+        process = start_server(mode, workers, threads, port, env)
+        load = LoadTest(f"http://127.0.0.1:{port}", args.provider)
+        load.warm()
+        results = [(workload, load.run(workload, args.threads, args.requests, args.hit_ratio)) for workload in args.workloads.split(',')]
+        drained, code = stop_server(process)
+        rows.extend((config, workload, result, drained, code) for workload, result in results)
+
+    print(f"Profile: {args.profile}, provider: {args.provider}, {args.threads} client threads, {args.requests} requests per row")
+    print(f"{'config':<14}{'workload':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'stop s':>8}  errors")
+    for config, workload, result, drained, code in rows:
+        stop = f"{drained:.1f}" if code == 0 else f"exit {code}"
+        print(f"{config:<14}{workload:<10}{result['throughput']:>10.1f}{result['p50'] * 1000:>10.1f}"
+              f"{result['p99'] * 1000:>10.1f}{stop:>8}  {result['errors'] or '-'}")
+    fake_upstream.stop()
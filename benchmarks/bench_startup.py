@@ -0,0 +1,181 @@
+#!/usr/bin/python
+
+"""
+    Cold-start cost of the app, tracked against a baseline.
+
+    Import time: runs `python -X importtime -c "import index"` --runs times in
+    fresh interpreters and parses the reports. Shows the median cumulative
+    time of `import index` and of each module it imports directly, heaviest
+    first.
+
+    Time to first response: starts server.py (one worker, per --modes) on a
+    free port against a throwaway cache seeded with one result and polls
+    /get_data for it until it answers 200. The median time from spawning the
+    server to that response is reported over --runs starts.
+
+    Results are compared with benchmarks/startup_baseline.json. A figure fails
+    when it grows by more than --tolerance (and by more than SLACK_MS).
+    Modules that index now imports eagerly but did not in the baseline are
+    listed by name, since a new import is how startup usually regresses.
+    Timings are machine-specific, so record the baseline on the machine that
+    runs the comparison:
+
+        python benchmarks/bench_startup.py --save-baseline
+        python benchmarks/bench_startup.py            # exits 1 on a regression
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS, '..')
+BASELINE = os.path.join(BENCHMARKS, 'startup_baseline.json')
+sys.path.insert(0, ROOT)
+
+# Differences below this are process start-up noise, not regressions
+SLACK_MS = 10
+# Give up on a server that has not answered after this long
+START_TIMEOUT_SECONDS = 30
+POLL_INTERVAL_SECONDS = 0.005
+
+URL_PATH = '/get_data?imdb_id=tt0000001&provider=imdb&video_name=Sample+Title'
+SAMPLE_RESULT = {
+    'id': 'tt0000001',
+    'title': 'Sample Title',
+    'provider': 'imdb',
+    'review-link': 'https://www.imdb.com/title/tt0000001/parentalguide',
+    'review-items': [{'name': 'Sex & Nudity', 'score': 3, 'description': 'Sample', 'cat': 'Mild', 'votes': {}}],
+}
+
+
+def parse_importtime(stderr, module='index'):
+    """(cumulative ms of module, {direct import: cumulative ms}) from an -X importtime report."""
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # the header
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        # A module is reported after everything it imports, so its direct
+        # imports are the depth-1 lines since the previous top-level one
+        if depth == 1:
+            children[name] = int(cumulative) / 1000
+        elif depth == 0:
+            if name == module:
+                return int(cumulative) / 1000, children
+            children = {}
+    raise ValueError(f"{module} not found in the -X importtime report")
+
+
+def import_times(env, runs):
+    totals, modules = [], {}
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import index'],
+                                   cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        total, children = parse_importtime(completed.stderr)
+        totals.append(total)
+        for name, ms in children.items():
+            modules.setdefault(name, []).append(ms)
+    return statistics.median(totals), {name: round(statistics.median(times), 1) for name, times in modules.items()}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def first_response(env, mode):
+    """Seconds from spawning server.py to its first 200 for the seeded result."""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}{URL_PATH}'
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, 'server.py', '--host', '127.0.0.1', '--port', str(port), '--mode', mode, '--workers', '1'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < START_TIMEOUT_SECONDS:
+            if server.poll() is not None:
+                raise RuntimeError(f"server.py exited with {server.returncode} before answering")
+            try:
+                with urllib.request.urlopen(url, timeout=START_TIMEOUT_SECONDS) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(POLL_INTERVAL_SECONDS)
+        raise RuntimeError(f"server.py did not answer within {START_TIMEOUT_SECONDS}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def regressed(current, baseline, tolerance):
+    return current > max(baseline * (1 + tolerance), baseline + SLACK_MS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters (and server starts) per figure")
+    parser.add_argument('--modes', default='waitress,async', help="comma-separated server.py modes to time the first response of")
+    parser.add_argument('--top', type=int, default=10, help="heaviest direct imports to show")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed growth as a fraction (default 0.25)")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="record the results as the new baseline")
+    args = parser.parse_args()
+
+    # A throwaway cache holding the one result the first request asks for
+    from SQLiteCache import SqliteCache
+    env = dict(os.environ, CACHE_DB_PATH=os.path.join(tempfile.mkdtemp(), 'bench_startup.sqlite'))
+    SqliteCache(env['CACHE_DB_PATH']).set('imdb:tt0000001', SAMPLE_RESULT)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    import_ms, modules = import_times(env, args.runs)
+    figures = {'import index': round(import_ms, 1)}
+    for mode in args.modes.split(','):
+        figures[f'first response ({mode})'] = round(statistics.median(first_response(env, mode) for _ in range(args.runs)) * 1000, 1)
+
+    failures = 0
+    print(f"{'figure':<28}{'ms':>10}  vs baseline")
+    for name, ms in figures.items():
+        if args.save_baseline:
+            verdict = "saved"
+        elif name not in baseline.get('figures', {}):
+            verdict = "no baseline"
+        else:
+            before = baseline['figures'][name]
+            verdict = f"REGRESSED: {before:.1f}ms -> {ms:.1f}ms" if regressed(ms, before, args.tolerance) else f"ok ({ms / before:.2f}x)"
+            failures += verdict.startswith("REGRESSED")
+        print(f"{name:<28}{ms:>10.1f}  {verdict}")
+
+    print(f"\nHeaviest imports of index (cumulative ms, median of {args.runs})")
+    for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<26}{ms:>10.1f}")
+    if baseline.get('modules') and not args.save_baseline:
+        new = sorted(set(modules) - set(baseline['modules']), key=lambda name: -modules[name])
+        if new:
+            print("Imported eagerly since the baseline: " + ", ".join(f"{name} ({modules[name]:.1f}ms)" for name in new))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'runs': args.runs, 'figures': figures, 'modules': modules}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f" * Baseline written to {args.baseline}")
+    elif failures:
+        print(f"[!] {failures} figure(s) regressed")
+        sys.exit(1)
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+
+"""
+    Import time and lookup latency of the local title index.
+
+    Writes a synthetic title.basics.tsv.gz / title.ratings.tsv.gz in the IMDb
+    layout (--titles rows), imports it with title_index.build() and times
+    by-title, by-title-and-year, by-id and unknown-title lookups against the
+    result. Pass --basics (and --ratings) to use the real dataset instead.
+
+    Usage: python benchmarks/bench_title_index.py [--titles 200000] [--lookups 20000]
+"""
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import title_index
+
+WORDS = ("love night war star dark city king queen last first lost secret house river mountain ghost "
+         "summer winter road home heart fire ice blood gold silver story dream shadow island world "
+         "return rise fall edge game light storm wild blue red black white iron glass stone").split()
+TYPES = ['movie', 'movie', 'movie', 'tvSeries', 'tvMovie', 'tvEpisode', 'tvEpisode', 'short', 'tvMiniSeries']
+
+
+def write_dataset(directory, count, rng):
+    basics = os.path.join(directory, 'title.basics.tsv.gz')
+    ratings = os.path.join(directory, 'title.ratings.tsv.gz')
+    rows = []
+    with gzip.open(basics, 'wt', encoding='utf-8') as b, gzip.open(ratings, 'wt', encoding='utf-8') as r:
+        b.write("tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\truntimeMinutes\tgenres\n")
+        r.write("tconst\taverageRating\tnumVotes\n")
+        for n in range(1, count + 1):
+            tconst = f"tt{n:07d}"
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+            if rng.random() < 0.1:
+                title = f"The {title}"
+            kind = rng.choice(TYPES)
+            year = rng.randint(1920, 2024)
+            b.write(f"{tconst}\t{kind}\t{title}\t{title}\t0\t{year}\t\\N\t{rng.randint(5, 200)}\tDrama\n")
+            if rng.random() < 0.6:
+                r.write(f"{tconst}\t{rng.randint(10, 95) / 10}\t{rng.randint(5, 500000)}\n")
+            if kind in title_index.IMPORT_TYPES:
+                rows.append((tconst, title, year))
+    return basics, ratings, rows
+
+
+def time_lookups(fn, args):
+    timings = []
+    for arg in args:
+        started = time.perf_counter()
+        fn(*arg)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--titles', type=int, default=200000, help="rows in the synthetic dataset")
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--basics', help="real title.basics.tsv.gz to import instead")
+    parser.add_argument('--ratings', help="real title.ratings.tsv.gz to import with --basics")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    workdir = tempfile.mkdtemp()
+    rows = None
+    if args.basics:
+        basics, ratings = args.basics, args.ratings
+    else:
+        basics, ratings, rows = write_dataset(workdir, args.titles, rng)
+
+    output = os.path.join(workdir, 'title_index.sqlite')
+    counts = title_index.build(basics, output, ratings)
+    size = os.path.getsize(output) / (1 << 20)
+    print(f"import: {counts['read']} rows read, {counts['titles']} titles kept in {counts['seconds']}s "
+          f"({counts['read'] / max(counts['seconds'], 0.001):.0f} rows/s), {size:.1f} MiB")
+
+    index = title_index.TitleIndex(output)
+    if rows is None:
+        conn = index._conn()
+        rows = conn.execute('SELECT tconst, title, year FROM titles ORDER BY random() LIMIT ?', (args.lookups,)).fetchall()
+    sample = [rng.choice(rows) for _ in range(args.lookups)]
+
+    cases = [
+        ('by title', index.by_title, [(title,) for _, title, _ in sample]),
+        ('by title + year', index.by_title, [(title, year) for _, title, year in sample]),
+        ('by id', index.by_id, [(tconst,) for tconst, _, _ in sample]),
+        ('unknown title', index.by_title, [(f"Zzyzx {n}",) for n in range(args.lookups)]),
+    ]
+    resolved = sum(1 for _, title, year in sample if index.by_title(title, year))
+    print(f"{'lookup':<18}{'p50 us':>10}{'p99 us':>10}")
+    for name, fn, lookup_args in cases:
+        p50, p99 = time_lookups(fn, lookup_args)
+        print(f"{name:<18}{p50 * 1e6:>10.1f}{p99 * 1e6:>10.1f}")
+    print(f" * {resolved / len(sample):.0%} of title + year lookups resolved locally, the rest would go to OMDB")
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+"""
+    Compare titles.best_match with the difflib.SequenceMatcher matching it
+    replaces.
+
+    Builds a deterministic list of candidate titles and a set of queries that
+    are variants of some of them (case, punctuation, accents, leading article,
+    '&' for 'and', roman numerals). Reports the time to find the best
+    candidate for every query and how often the right one was picked.
+
+    Usage: python benchmarks/bench_title_match.py [--candidates 2000] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import titles
+
+WORDS = ("love night war star dark city king queen last first lost secret house river mountain ghost "
+         "summer winter road home heart fire ice blood gold silver story dream shadow island world").split()
+VARIANTS = [
+    lambda t: t.upper(),
+    lambda t: t.replace(' and ', ' & '),
+    lambda t: t.replace(':', ' -'),
+    lambda t: t.replace('e', 'é', 1),
+    lambda t: t[4:] if t.startswith('The ') else 'The ' + t,
+    lambda t: t.replace(' 2', ' II').replace(' 3', ' III'),
+    lambda t: t.replace("'s", 's'),
+]
+
+
+def make_titles(count, rng):
+    seen = set()
+    while len(seen) < count:
+        title = ' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.3:
+            title = 'The ' + title
+        if rng.random() < 0.2:
+            title += f": {rng.choice(WORDS).title()} and {rng.choice(WORDS).title()}"
+        if rng.random() < 0.15:
+            title += f" {rng.randint(2, 3)}"
+        if rng.random() < 0.1:
+            title = title.replace(' ', "'s ", 1)
+        seen.add(title)
+    return sorted(seen)
+
+
+def sequence_matcher_best(query, candidates):
+    query = query.lower()
+    return max(range(len(candidates)), key=lambda i: SequenceMatcher(None, query, candidates[i].lower()).ratio())
+
+
+def titles_best(query, prepared):
+    query = titles.Title(query)
+    return max(range(len(prepared)), key=lambda i: titles.score(query, prepared[i]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    candidates = make_titles(args.candidates, rng)
+    targets = rng.sample(range(len(candidates)), args.queries)
+    queries = [(rng.choice(VARIANTS)(candidates[i]), i) for i in targets]
+
+    started = time.perf_counter()
+    prepared = titles.prepare_all(candidates)
+    prepare_time = time.perf_counter() - started
+
+    print(f"{len(candidates)} candidates, {len(queries)} queries")
+    print(f"{'matcher':<18}{'total ms':>10}{'per query ms':>14}{'correct':>10}")
+    for name, best, pool in (('SequenceMatcher', sequence_matcher_best, candidates), ('titles', titles_best, prepared)):
+        started = time.perf_counter()
+        correct = sum(best(query, pool) == target for query, target in queries)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<18}{elapsed * 1000:>10.0f}{elapsed * 1000 / len(queries):>14.2f}{correct / len(queries):>10.0%}")
+    print(f"(preparing the candidate list once took {prepare_time * 1000:.0f} ms)")
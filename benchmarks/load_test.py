@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+"""
+    End-to-end load test of /get_data against the stand-in upstream server.
+
+    Starts standin.StandInServer with the chosen profile, points upstream at
+    it, serves the app on a free port (with a throwaway SQLite cache) and
+    drives it over HTTP. --server picks waitress (threads) or async_server
+    (an event loop, /get_data as coroutines). For every workload and thread count it
+    reports throughput and p50/p99 latency:
+
+        hit    every request is served from the cache (keys warmed first)
+        miss   every request is for a title not seen before
+        mixed  --hit-ratio of the requests hit, the rest miss
+
+    Client-side rate limits are lifted unless --keep-client-limits is given,
+    so the stand-in profile decides how the "upstream" behaves.
+
+    Usage: python benchmarks/load_test.py [--profile realistic] [--threads 1,4,16] [--server async]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import requests
+from waitress import create_server
+
+import omdb
+import ratelimit
+import standin
+import upstream
+
+WARM_KEYS = 20
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class LoadTest:
+    def __init__(self, base_url, provider):
+        self.base_url = base_url
+        self.provider = provider
+        self.fresh_ids = (f"tt9{n:06d}" for n in itertools.count())
+        self.fresh_lock = threading.Lock()
+        self.warm_ids = []
+        self.local = threading.local()
+
+    def next_fresh_id(self):
+        with self.fresh_lock:
+            return next(self.fresh_ids)
+
+    def get(self, imdb_id):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.get(f"{self.base_url}/get_data", params={'imdb_id': imdb_id, 'provider': self.provider})
+        return time.perf_counter() - started, response.status_code
+
+    def warm(self):
+        self.warm_ids = [self.next_fresh_id() for _ in range(WARM_KEYS)]
+        for imdb_id in self.warm_ids:
+            self.get(imdb_id)
+
+    def pick(self, workload, hit_ratio):
+        if workload == 'hit' or (workload == 'mixed' and random.random() < hit_ratio):
+            return random.choice(self.warm_ids)
+        return self.next_fresh_id()
+
+    def run(self, workload, threads, count, hit_ratio):
+        ids = [self.pick(workload, hit_ratio) for _ in range(count)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(self.get, ids))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for latency, _ in results)
+        statuses = Counter(status for _, status in results)
+        return {
+            'throughput': count / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p99': percentile(latencies, 0.99),
+            'errors': {status: n for status, n in statuses.items() if status != 200},
+        }
+
+
+def start_async_server():
+    """Serve async_server's app from a background event loop; returns (port, stop)."""
+    from aiohttp import web
+
+    import async_server
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(async_server.make_app(), access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return runner.addresses[0][1], stop
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=sorted(standin.PROFILES), default='realistic')
+    parser.add_argument('--provider', default='imdb')
+    parser.add_argument('--threads', default='1,4,16', help="comma-separated client thread counts")
+    parser.add_argument('--requests', type=int, default=200, help="requests per workload and thread count")
+    parser.add_argument('--workloads', default='hit,miss,mixed')
+    parser.add_argument('--hit-ratio', type=float, default=0.8, help="share of cache hits in the mixed workload")
+    parser.add_argument('--server', choices=['waitress', 'async'], default='waitress', help="server to run the app on")
+    parser.add_argument('--server-threads', type=int, default=16, help="waitress worker threads")
+    parser.add_argument('--keep-client-limits', action='store_true', help="keep the per-host limits from ratelimit")
+    args = parser.parse_args()
+
+    os.environ.setdefault('OMDB_API_KEY', 'standin')
+    if not args.keep_client_limits:
+        for name in ratelimit.PROVIDER_LIMITS:
+            os.environ[f"RATE_LIMIT_{name.upper()}"] = "10000,10000,1000"
+        ratelimit._limiters = ratelimit._build_limiters()
+
+    fake_upstream = standin.StandInServer(args.profile)
+    upstream.set_standin(fake_upstream.start())
+
+    # index opens its GeoIP database relative to the working directory
+    os.chdir(ROOT)
+    import index
+    from SQLiteCache import SqliteCache
+
+    logging.disable(logging.CRITICAL)
+    # Throwaway cache so every run starts cold and the real cache is untouched
+    index.db = index.db_handler.db = SqliteCache(os.path.join(tempfile.mkdtemp(), 'load_test.sqlite'))
+    omdb.configure(index.db)
+
+    if args.server == 'async':
+        port, stop_server = start_async_server()
+    else:
+        server = create_server(index.app, host='127.0.0.1', port=0, threads=args.server_threads)
+        threading.Thread(target=server.run, daemon=True).start()
+        port, stop_server = server.effective_port, server.close
+    load = LoadTest(f"http://127.0.0.1:{port}", args.provider)
+
+    rows = []
+    # The scrapers print as they go; keep that out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        load.warm()
+        for workload in args.workloads.split(','):
+            for threads in (int(n) for n in args.threads.split(',')):
+                rows.append((workload, threads, load.run(workload, threads, args.requests, args.hit_ratio)))
+
+    print(f"Profile: {args.profile}, provider: {args.provider}, server: {args.server}, {args.requests} requests per row")
+    print(f"{'workload':<10}{'threads':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}  errors")
+    for workload, threads, result in rows:
+        print(f"{workload:<10}{threads:>8}{result['throughput']:>10.1f}{result['p50'] * 1000:>10.1f}"
+              f"{result['p99'] * 1000:>10.1f}  {result['errors'] or '-'}")
+
+    print(f" * Stand-in served: {fake_upstream.counts}")
+    stop_server()
+    fake_upstream.stop()
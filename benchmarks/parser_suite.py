@@ -0,0 +1,170 @@
+#!/usr/bin/python
+
+"""
+    Offline benchmark suite for the provider parsers.
+
+    Runs every parse function over the recorded fixtures in benchmarks/fixtures
+    and reports ops/sec (from the median run), p95 latency and peak traced
+    memory per case. Results are compared with benchmarks/baseline.json: a case
+    fails when its ops/sec drops or its peak memory grows by more than
+    --tolerance, or when its output differs from the recorded one (a parse
+    regression). p95 is reported against the baseline but, being a tail
+    figure, is too noisy to fail on.
+
+    Timings are machine-specific, so record a baseline on the machine that runs
+    the comparison:
+
+        python benchmarks/parser_suite.py --save-baseline
+        python benchmarks/parser_suite.py            # exits 1 on a regression
+"""
+
+import argparse
+import contextlib
+import gc
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import commonsensemedia
+import cringMDB
+import dove
+import imdb
+import kidsinmind
+import movieguide
+import parentpreviews
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(BENCHMARKS, 'fixtures')
+BASELINE = os.path.join(BENCHMARKS, 'baseline.json')
+
+WARMUP_SECONDS = 0.2
+# Peak memory differences below this are allocator noise, not regressions
+MEMORY_SLACK_KIB = 64
+
+PG_URL = 'https://www.imdb.com/title/tt0000001/parentalguide'
+
+
+def kidsinmind_title(text):
+    imdbid, title, year = kidsinmind.parse_title_page(text)
+    return imdbid, title, year, kidsinmind.parse_review_items(text, title)
+
+
+# (case, provider, fixture, parse function)
+CASES = [
+    ('imdb new structure', 'imdb', 'imdb_new_structure.html', lambda text: imdb.parse_parentsguide(text, 'tt0000001', 'Sample', PG_URL)),
+    ('imdb old structure', 'imdb', 'imdb_old_structure.html', lambda text: imdb.parse_parentsguide(text, 'tt0000001', 'Sample', PG_URL)),
+    ('kidsinmind search', 'kidsinmind', 'kidsinmind_search.html', lambda text: kidsinmind.parse_search_results(text, 'fixture')),
+    ('kidsinmind title', 'kidsinmind', 'kidsinmind_title.html', kidsinmind_title),
+    ('dove search', 'dove', 'dove_search.html', dove.parse_search_results),
+    ('dove review', 'dove', 'dove_review.html', dove.parse_review),
+    ('commonsense review', 'commonsense', 'commonsense_review.html', lambda text: commonsensemedia.parse_review(text, 'tt0000001', 'fixture')),
+    ('cringmdb search', 'cring', 'cringmdb_search.json', lambda text: cringMDB.parse_search_results(text, 'Sample Title 1')),
+    ('cringmdb movie', 'cring', 'cringmdb_movie.html', cringMDB.parse_movie_page),
+    ('movieguide review', 'movieguide', 'movieguide_review.html', lambda text: movieguide.parse_review(text, 'fixture')),
+    ('parentpreviews review', 'parentpreviews', 'parentpreviews_review.html', parentpreviews.parse_review_items),
+]
+
+
+def digest(result):
+    return hashlib.sha256(json.dumps(result, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def run_case(fn, text, runs):
+    # Warm up for a while rather than once, the first cases otherwise run on a cold CPU
+    result = fn(text)
+    warm_until = time.perf_counter() + WARMUP_SECONDS
+    while time.perf_counter() < warm_until:
+        fn(text)
+
+    timings = []
+    # Like timeit, keep collector pauses from landing on random runs
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            fn(text)
+            timings.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+    timings.sort()
+
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'ops_per_sec': round(1 / timings[len(timings) // 2], 1),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        'peak_kib': round(peak / 1024, 1),
+        'digest': digest(result),
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Reasons this case regressed against its baseline entry (empty if it did not)."""
+    problems = []
+    if current['digest'] != baseline['digest']:
+        problems.append("output changed")
+    if current['ops_per_sec'] < baseline['ops_per_sec'] * (1 - tolerance):
+        problems.append(f"ops/sec {baseline['ops_per_sec']} -> {current['ops_per_sec']}")
+    if current['peak_kib'] > max(baseline['peak_kib'] * (1 + tolerance), baseline['peak_kib'] + MEMORY_SLACK_KIB):
+        problems.append(f"peak {baseline['peak_kib']}KiB -> {current['peak_kib']}KiB")
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=30, help="timed runs per case")
+    parser.add_argument('--provider', help="only run cases for this provider")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed ops/sec drop or memory growth as a fraction (default 0.5)")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="record the results as the new baseline")
+    args = parser.parse_args()
+
+    # The parsers log and print as they go; keep that out of the timings
+    logging.disable(logging.CRITICAL)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+
+    results = {}
+    failures = 0
+    print(f"{'case':<24}{'ops/sec':>10}{'p95 ms':>10}{'peak KiB':>10}  vs baseline")
+    for name, provider, fixture, fn in CASES:
+        if args.provider and args.provider != provider:
+            continue
+        with open(os.path.join(FIXTURES, fixture), encoding='utf-8') as f:
+            text = f.read()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            current = results[name] = run_case(fn, text, args.runs)
+
+        if args.save_baseline:
+            verdict = "saved"
+        elif name not in baseline:
+            verdict = "no baseline"
+        else:
+            problems = compare(current, baseline[name], args.tolerance)
+            verdict = "REGRESSED: " + ", ".join(problems) if problems else "ok"
+            verdict += f" (p95 {current['p95_ms'] / baseline[name]['p95_ms']:.2f}x baseline)"
+            failures += bool(problems)
+        print(f"{name:<24}{current['ops_per_sec']:>10.1f}{current['p95_ms']:>10.2f}{current['peak_kib']:>10.0f}  {verdict}")
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'runs': args.runs, 'cases': baseline}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f" * Baseline written to {args.baseline}")
+    elif failures:
+        print(f"[!] {failures} case(s) regressed")
+        sys.exit(1)
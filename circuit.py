@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 60))
+
+
+class CircuitBreaker:
+    """
+        Per-provider circuit breaker.
+
+        Opens after failure_threshold consecutive failures, so calls fail fast
+        instead of running a scrape that is bound to fail. After reset_timeout
+        it half-opens and lets up to half_open_probes requests through: a
+        success closes it again, a failure re-opens it for another timeout.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, half_open_probes=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.last_error = None
+        self.lock = threading.RLock()
+
+    def _set_state(self, state):
+        if state != self.state:
+            # Set first: logging may call back into this breaker (the Redis one, through the database log handler)
+            self.state = state
+            logger.warning(f"Circuit breaker for {self.name} is now {state}")
+            metrics.incr('breaker_transitions', provider=self.name, state=state)
+
+    def allow(self):
+        """Return True if a call may go ahead. Callers that get True must report back with record_*()."""
+        with self.lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    metrics.incr('breaker_rejections', provider=self.name)
+                    return False
+                self._set_state(HALF_OPEN)
+                self.probes_in_flight = 0
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    metrics.incr('breaker_rejections', provider=self.name)
+                    return False
+                self.probes_in_flight += 1
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.probes_in_flight = 0
+            self._set_state(CLOSED)
+
+    def record_failure(self, error):
+        with self.lock:
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self.probes_in_flight = 0
+                self._set_state(OPEN)
+
+    def retry_after(self):
+        with self.lock:
+            if self.state != OPEN:
+                return 0
+            return max(1, round(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def snapshot(self):
+        retry_after = self.retry_after()
+        with self.lock:
+            return {
+                'provider': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_after': retry_after,
+                'last_error': self.last_error,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def all_breakers():
+    with _breakers_lock:
+        breakers = sorted(_breakers.values(), key=lambda b: b.name)
+    return [breaker.snapshot() for breaker in breakers]
@@ -1,94 +1,129 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import json
+import parsing
+import titles
+import tracing
+import upstream
 
+CatsIDs = {
+    0: "Clean",
+    1: "Mild",
+    2: "Moderate",
+    3: "Moderate",
+    4: "Severe",
+    5: "Severe"
+}
 
-def CommonSenseScrapper(ID, videoName):
-    CatsIDs = {
-        0: "Clean",
-        1: "Mild",
-        2: "Moderate",
-        3: "Moderate",
-        4: "Severe",
-        5: "Severe"
+NamesMap = {
+    "Positive Messages" :"Positive Messages",
+    "Positive Role Models" :"Positive Role Models",
+    "Diverse Representations" : "Diverse Representations",
+    "Violence & Scariness" : "Violence",
+    "Sex, Romance & Nudity" : "Sex & Nudity",
+    "Language" : "Profanity",
+    "Products & Purchases" : "Products & Purchases",
+    "Drinking, Drugs & Smoking" : "Smoking, Alchohol & Drugs",
+    "Educational Value":"Educational Value"
     }
 
-    NamesMap = {
-        "Positive Messages" :"Positive Messages",
-        "Positive Role Models" :"Positive Role Models",
-        "Diverse Representations" : "Diverse Representations",
-        "Violence & Scariness" : "Violence",
-        "Sex, Romance & Nudity" : "Sex & Nudity",
-        "Language" : "Profanity",
-        "Products & Purchases" : "Products & Purchases",
-        "Drinking, Drugs & Smoking" : "Smoking, Alchohol & Drugs",
-        "Educational Value":"Educational Value"
-        }
-    movie_id = videoName.replace(":","").replace(" ","-")
-    movie_url = "https://www.commonsensemedia.org" + "/movie-reviews/" + str(movie_id)
-    print(movie_url)
-    response = requests.get(movie_url)
+IMDB_LINK_RE = re.compile(r"http.*imdb.*title.(.*?)\/")
+DATA_TEXT_RE = re.compile(r'data-text="(.*\n*?)')
 
-    if '200' in str(response):
-        soup = BeautifulSoup(response.text, "html.parser")
-        Cats = soup.find("div",{"id":"review-view-content-grid"}).find("div",{"class":"row"}).findAll("span",{"class":"rating__label"})
-        age = soup.find("div", {"class": "review-rating"}).find("span", {"class":"rating__age"}).text.strip()
-        review_summary = soup.find("div", {"class": "review-view-summary"})
-        jsonData = soup.find('script',{"type":"application/ld+json"}).string
-        #print(jsonData)
-        jsonload = json.loads(jsonData)
-        title = jsonload["@graph"][0]["itemReviewed"]["name"]
-        imdburl= jsonload["@graph"][0]["itemReviewed"]["sameAs"]
-        age2 = "age"+jsonload["@graph"][0]["typicalAgeRange"]
-        isFamilyFriendly = "age"+jsonload["@graph"][0]["isFamilyFriendly"]
-        datePublished = "age"+jsonload["@graph"][0]["datePublished"]
-        sPattern3 = r"http.*imdb.*title.(.*?)\/"
-        imdbid = str(re.compile(sPattern3).findall(str(imdburl))).replace("[","").replace("]","").replace("'","")
-        #print()
-        Details = []
-        namePattern = re.compile(r'data-text="(.*\n*?)')
-        CatData = []
-        for cat in Cats:
-            #print(cat.text)
-            descparenttag = cat.parent.parent
+# Only these subtrees are built; the rest of the page is skipped by the parser
+REVIEW_SECTIONS = parsing.AnyOf(
+    ("div", {"id": "review-view-content-grid"}),
+    ("div", {"class": parsing.has_class("review-rating")}),
+    ("script", {"type": "application/ld+json"}),
+)
+
+
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_review(html, ID, movie_url):
+    soup = parsing.make_soup(html, REVIEW_SECTIONS)
+    review_grid = soup.find("div",{"id":"review-view-content-grid"})
+    review_row = review_grid.find("div",{"class":"row"}) if review_grid else None
+    review_rating = soup.find("div", {"class": "review-rating"})
+    rating_age = review_rating.find("span", {"class":"rating__age"}) if review_rating else None
+    json_script = soup.find('script',{"type":"application/ld+json"})
+    if not review_row or not rating_age or not json_script:
+        raise upstream.ParseError(f"CommonSense review markup not found on {movie_url}")
+    Cats = review_row.findAll("span",{"class":"rating__label"})
+    age = rating_age.text.strip()
+    jsonData = json_script.string
+    #print(jsonData)
+    jsonload = json.loads(jsonData)
+    title = jsonload["@graph"][0]["itemReviewed"]["name"]
+    imdburl= jsonload["@graph"][0]["itemReviewed"]["sameAs"]
+    age2 = "age"+jsonload["@graph"][0]["typicalAgeRange"]
+    isFamilyFriendly = "age"+jsonload["@graph"][0]["isFamilyFriendly"]
+    datePublished = "age"+jsonload["@graph"][0]["datePublished"]
+    imdbid = str(IMDB_LINK_RE.findall(str(imdburl))).replace("[","").replace("]","").replace("'","")
+    #print()
+    Details = []
+    CatData = []
+    for cat in Cats:
+        #print(cat.text)
+        descparenttag = cat.parent.parent
+        try:
+            desc = DATA_TEXT_RE.findall(str(descparenttag))[0].strip().replace("&lt;","").replace("p&gt;","").replace("&lt;","").replace("/p&gt","").replace("/","").replace("&quot;","'")
+        except:
+            desc = ''
+        #print(desc)
+        cparent = cat.parent
+        #print(cparent)
+        subs = cparent.findAll("span",{"class":"rating__score"})
+
+        for sub in subs:
+            #print(sub)
             try:
-                desc = re.findall(namePattern,  str(descparenttag))[0].strip().replace("&lt;","").replace("p&gt;","").replace("&lt;","").replace("/p&gt","").replace("/","").replace("&quot;","'")
+                score = len(sub.findAll("i", {"class" : "icon-circle-solid active"}))
+                #print(score)
+                CatData = {
+                "name" : NamesMap[cat.text],
+                "score": score,
+                "description": desc,
+                "cat": CatsIDs[score],
+                "votes": None
+                }
+                #print(CatData)
             except:
-                desc = ''
-            #print(desc)
-            cparent = cat.parent
-            #print(cparent)
-            subs = cparent.findAll("span",{"class":"rating__score"})
-
-            for sub in subs:
-                #print(sub)
-                try:
-                    score = len(sub.findAll("i", {"class" : "icon-circle-solid active"}))
-                    #print(score)
-                    CatData = {
-                    "name" : NamesMap[cat.text],
-                    "score": score,
-                    "description": desc,
-                    "cat": CatsIDs[score],
-                    "votes": None
-                    }
-                    #print(CatData)
-                except:
-                    score = None
-            Details.append(CatData)
+                score = None
+        Details.append(CatData)
 
-        Review = {
-            "id": ID,
-            "status": "Sucess",
-            "title": title.title(),
-            "provider": "CommonSenseMedia",
-            "recommended-age": age,
-            "review-items": Details,
-            "review-link": movie_url,
-            "isFamilyFriendly": isFamilyFriendly,
-            "review-date": datePublished,
-                }
+    return {
+        "id": ID,
+        "status": "Sucess",
+        "title": title.title(),
+        "provider": "CommonSenseMedia",
+        "recommended-age": age,
+        "review-items": Details,
+        "review-link": movie_url,
+        "isFamilyFriendly": isFamilyFriendly,
+        "review-date": datePublished,
+            }
+
+
+def CommonSenseScrapper(ID, videoName, deadline=None):
+    movie_id = titles.slug(videoName)
+    movie_url = "https://www.commonsensemedia.org" + "/movie-reviews/" + str(movie_id)
+    print(movie_url)
+    response = upstream.get(movie_url, deadline=deadline)
+    return review_from(response, ID, videoName, movie_url)
+
+
+async def CommonSenseScrapper_async(ID, videoName, deadline=None):
+    """Coroutine version of CommonSenseScrapper()."""
+    movie_url = "https://www.commonsensemedia.org" + "/movie-reviews/" + str(titles.slug(videoName))
+    response = await upstream.get_async(movie_url, deadline=deadline)
+    return review_from(response, ID, videoName, movie_url)
+
+
+def review_from(response, ID, videoName, movie_url):
+    upstream.raise_for_outage(response)
+
+    if '200' in str(response):
+        Review = parse_review(response.text, ID, movie_url)
 
     else:
         print("Problem connecting to provider")
@@ -1,73 +1,124 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import json
+import parsing
+import titles
+import tracing
+import upstream
 
-def cringMDBScraper(ID,videoName):
-    Session = requests.Session()
+Cats = {
+    "no": "None",
+    "yes": "Moderate"
+    }
+
+NamesMap = {
+    "Nudity":"Sex & Nudity",
+    "Sexual Violence":"Sex & Nudity",
+    "Sex Scene":"Making Love",
+}
+
+YEAR_RE = re.compile(r'\(\d*\)')
+
+# Only these subtrees are built; the rest of the page is skipped by the parser
+MOVIE_SECTIONS = parsing.AnyOf(
+    ("div", {"class": parsing.has_class("content-warnings")}),
+    ("div", {"class": parsing.has_class("movie-info")}),
+)
+
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_movie_page(html):
+    advisory = []
+    Soup = parsing.make_soup(html, MOVIE_SECTIONS)
+    SectionsSoup = Soup.find("div", {"class":"content-warnings"})
+    Sections = SectionsSoup.findAll("div",{"class":"content-flag"})
+    print(Sections)
+    votesSoup = Soup.find("div",{"class":"movie-info"})
+    print(votesSoup)
+    votes = votesSoup.find("span",{"itemprop":"bestRating"}).text
+    print(votes)
+    for sec in Sections:
+        section = {
+            "name": NamesMap[sec.h3.text.strip()] if sec.h3.text.strip() in NamesMap else sec.h3.text.strip(),
+            "cat": Cats[sec.h4.text.lower().strip()],
+            "votes": votes.strip()
+        }
+        advisory.append(section)
+    return advisory
+
+@tracing.spanned('parse')
+def parse_search_results(text, videoName):
+    """(title, slug) of every search result that is the same title as videoName."""
+    matches = []
+    query = titles.Title(videoName)
+    for res in json.loads(text):
+        print("running for" + str(res))
+        moviename1 = YEAR_RE.sub('', res["movie"]).strip()
+        print("moviename : " + moviename1)
+        if titles.same_title(query, moviename1):
+            matches.append((moviename1, res["slug"]))
+    return matches
+
+def cringMDBScraper(ID,videoName,deadline=None):
+    Session = upstream.sync_session()
     strName = videoName.replace(":", "").replace(" ","+").replace("%3A","").lower()
     url = 'https://cringemdb.com/search?term=' + strName
     print(url)
-    r = Session.get(url)
-    Results = r.json()
-    print(Results)
+    r = upstream.get(url, session=Session, deadline=deadline)
+    upstream.raise_for_outage(r)
+    print(r.text)
     advisory,show_info = [],[]
-    Cats = {
-        "no": "None",
-        "yes": "Moderate"
-        }
-    
-    NamesMap = {
-        "Nudity":"Sex & Nudity",
-        "Sexual Violence":"Sex & Nudity",
-        "Sex Scene":"Making Love",
-    }
-    for res in Results:
-        print("running for" + str(res))
-        moviename = res["movie"]
-        moviename1 = re.sub(r'\(\d*\)','', moviename).strip()
-        moviename = moviename1.replace(":", "").replace("%3A","").replace(" ","+").lower()
-        print("moviename : " + moviename)
-        print("videoName : " + strName)
-        if strName == moviename:
-            slug = res["slug"]
-            movieURL = 'https://cringemdb.com/movie/' + slug
-            r = Session.get(movieURL)
-            if '200' in str(r):
-                Soup = BeautifulSoup(r.text, "html.parser")
-                SectionsSoup = Soup.find("div", {"class":"content-warnings"})
-                Sections = SectionsSoup.findAll("div",{"class":"content-flag"})
-                print(Sections)
-                votesSoup = Soup.find("div",{"class":"movie-info"})
-                print(votesSoup)
-                votes = votesSoup.find("span",{"itemprop":"bestRating"}).text
-                print(votes)
-                for sec in Sections:
-                    section = {
-                        "name": NamesMap[sec.h3.text.strip()] if sec.h3.text.strip() in NamesMap else sec.h3.text.strip(),
-                        "cat": Cats[sec.h4.text.lower().strip()],
-                        "votes": votes.strip()
+    for moviename1, slug in parse_search_results(r.text, videoName):
+        movieURL = 'https://cringemdb.com/movie/' + slug
+        r = upstream.get(movieURL, session=Session, deadline=deadline)
+        if '200' in str(r):
+            advisory.extend(parse_movie_page(r.text))
+
+            show_info = {
+                "id": ID,
+                "status": "Sucess",
+                "title": moviename1,
+                "provider": "cringMDB",
+                "recommended-age": None,
+                "review-items": advisory,
+                "review-link": movieURL
                     }
-                    advisory.append(section)
+            print(show_info)
+    if advisory in [None,""]:
+        show_info = failed_review(ID, videoName)
+    return show_info
 
-                show_info = {
-                    "id": ID,
-                    "status": "Sucess",
-                    "title": moviename1,
-                    "provider": "cringMDB",
-                    "recommended-age": None,
-                    "review-items": advisory,
-                    "review-link": movieURL
-                        }
-                print(show_info)
+async def cringMDBScraper_async(ID,videoName,deadline=None):
+    """Coroutine version of cringMDBScraper()."""
+    strName = videoName.replace(":", "").replace(" ","+").replace("%3A","").lower()
+    url = 'https://cringemdb.com/search?term=' + strName
+    r = await upstream.get_async(url, deadline=deadline)
+    upstream.raise_for_outage(r)
+    advisory,show_info = [],[]
+    for moviename1, slug in parse_search_results(r.text, videoName):
+        movieURL = 'https://cringemdb.com/movie/' + slug
+        r = await upstream.get_async(movieURL, deadline=deadline)
+        if '200' in str(r):
+            advisory.extend(parse_movie_page(r.text))
+            show_info = {
+                "id": ID,
+                "status": "Sucess",
+                "title": moviename1,
+                "provider": "cringMDB",
+                "recommended-age": None,
+                "review-items": advisory,
+                "review-link": movieURL
+                    }
     if advisory in [None,""]:
-        show_info = {
-            "id": ID,
-            "status": "Failed",
-            "title": videoName,
-            "provider": "cringMDB",
-            "recommended-age": None,
-            "review-items": None,
-            "review-link": None
-                }
+        show_info = failed_review(ID, videoName)
     return show_info
+
+def failed_review(ID, videoName):
+    return {
+        "id": ID,
+        "status": "Failed",
+        "title": videoName,
+        "provider": "cringMDB",
+        "recommended-age": None,
+        "review-items": None,
+        "review-link": None
+            }
@@ -1,18 +1,18 @@
-import requests
-from bs4 import BeautifulSoup
-import re
-from difflib import SequenceMatcher
-import os
-def getIMDBID(name):
-    omdb_api_key = os.environ.get('OMDB_API_KEY')
-    url = f"http://www.omdbapi.com/?t={name.strip()}&apikey={omdb_api_key}&plot=full&r=json"
-    res = requests.get(url).json()
-
-    if res.get("Response") != 'False':
-        return res.get("imdbID")
-    else:
-        print("Couldn't find IMDB ID")
-        return None
+from bs4 import SoupStrainer
+import omdb
+import parsing
+import titles
+import tracing
+import upstream
+
+Cats = {0: "None", 1: "Mild", 2: "Moderate", 3: "Severe"}
+
+# Only these subtrees are built; the rest of each page is skipped by the parser
+SEARCH_CARDS = SoupStrainer("div", attrs={"class": parsing.has_class("search-cards")})
+REVIEW_SECTIONS = parsing.AnyOf(
+    ("div", {"class": parsing.has_class("matrix-categories")}),
+    ("div", {"class": parsing.has_class("details-wrap")}),
+)
 
 def getDesc(soup, s):
     descs = soup.findAll("h5", {"class": "details-title"})
@@ -23,71 +23,137 @@ def getDesc(soup, s):
             return text.text.strip() if text else ""
     return ""
 
-def DoveFoundationScrapper(videoName):
-    sURL = f'https://dove.org/search/reviews/{videoName.replace(" ", "+")}'
-    s = requests.Session()
-    r = s.get(sURL)
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_search_results(html):
+    """Link to the first search result, or None when there are no results."""
+    res = parsing.make_soup(html, SEARCH_CARDS).find("div", {"class": "movie-cards search-cards"})
+    if not res or "Nothing matches your search term" in str(res):
+        return None
+    link = res.find("a")
+    return link["href"] if link else None
+
+
+def review_title(html):
+    """Title of a review page, "" when it has none."""
+    title = parsing.page_title(html)
+    return title.replace("- Dove.org", "").strip() if title else ""
+
+
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_review(html):
+    """(title, review items) of a review page."""
+    title = review_title(html)
+    soup = parsing.make_soup(html, REVIEW_SECTIONS)
+    table = soup.find("div", {"class": "matrix-categories"})
+    if not table:
+        raise upstream.ParseError("Dove review markup not found")
+    items = table.findAll("span", {"class": "item-text"})
+    sections = table.findAll("span", {"class": "categories-item"})
+    descs = soup.find("div", {"class": "main-content details-wrap"})
+
+    Details = []
+    for item, section in zip(items, sections):
+        try:
+            ID = int(section["class"][1].replace("categories-item--", "").strip())
+            CatData = {
+                "name": item.text.strip(),
+                "score": str(ID),
+                "description": getDesc(descs, item.text.strip()),
+                "cat": Cats[ID],
+                "votes": None
+            }
+            Details.append(CatData)
+        except (KeyError, ValueError):
+            print(f"Failed to process category: {item.text.strip()}")
+    return title, Details
 
-    Cats = {0: "None", 1: "Mild", 2: "Moderate", 3: "Severe"}
+
+def DoveFoundationScrapper(videoName, deadline=None):
+    sURL = f'https://dove.org/search/reviews/{videoName.replace(" ", "+")}'
+    s = upstream.sync_session()
+    r = upstream.get(sURL, session=s, deadline=deadline)
+    upstream.raise_for_outage(r)
 
     if r.status_code != 200:
         print(f"Failed to fetch search results. Status code: {r.status_code}")
         return create_failed_review(videoName)
 
-    sSoup = BeautifulSoup(r.text, "html.parser")
-    res = sSoup.find("div", {"class": "movie-cards search-cards"})
+    resURL = parse_search_results(r.text)
+    if not resURL:
+        print("No results found")
+        return create_failed_review(videoName)
 
-    if not res or "Nothing matches your search term" in str(res):
+    # Fetch and parse errors propagate, so the circuit breaker counts them
+    response = upstream.get(resURL, session=s, deadline=deadline)
+    upstream.raise_for_outage(response)
+
+    if response.status_code != 200:
+        print(f"Failed to fetch review page. Status code: {response.status_code}")
+        return create_failed_review(videoName)
+
+    # Checked before the review markup, so a search hit that is not a review
+    # of this title (an article, other media) is a miss rather than a parse error
+    title = review_title(response.text)
+    if not titles.contains(videoName, title):
+        print(f"Dove returned wrong media: {title}")
+        return create_failed_review(videoName)
+
+    _, Details = parse_review(response.text)
+
+    return {
+        "id": omdb.imdb_id_for(title, deadline=deadline, essential=False),
+        "status": "Success",
+        "title": title.title(),
+        "provider": "DoveFoundation",
+        "recommended-age": None,
+        "review-items": Details,
+        "review-link": resURL
+    }
+
+async def DoveFoundationScrapper_async(videoName, deadline=None):
+    """Coroutine version of DoveFoundationScrapper()."""
+    sURL = f'https://dove.org/search/reviews/{videoName.replace(" ", "+")}'
+    r = await upstream.get_async(sURL, deadline=deadline)
+    upstream.raise_for_outage(r)
+
+    if r.status_code != 200:
+        print(f"Failed to fetch search results. Status code: {r.status_code}")
+        return create_failed_review(videoName)
+
+    resURL = parse_search_results(r.text)
+    if not resURL:
         print("No results found")
         return create_failed_review(videoName)
 
-    try:
-        resURL = res.find("a")["href"]
-        response = s.get(resURL)
-        soup = BeautifulSoup(response.text, "html.parser")
-        title = soup.title.text.replace("- Dove.org", "").strip()
-
-        checktitle = re.sub(r'[^a-zA-Z0-9]', '', title.lower())
-        checkvideoName = re.sub(r'[^a-zA-Z0-9]', '', videoName.lower())
-
-        if checkvideoName not in checktitle:
-            print(f"Dove returned wrong media: {title}")
-            return create_failed_review(videoName)
-
-        table = soup.find("div", {"class": "matrix-categories"})
-        items = table.findAll("span", {"class": "item-text"})
-        sections = table.findAll("span", {"class": "categories-item"})
-        descs = soup.find("div", {"class": "main-content details-wrap"})
-
-        Details = []
-        for item, section in zip(items, sections):
-            try:
-                ID = int(section["class"][1].replace("categories-item--", "").strip())
-                CatData = {
-                    "name": item.text.strip(),
-                    "score": str(ID),
-                    "description": getDesc(descs, item.text.strip()),
-                    "cat": Cats[ID],
-                    "votes": None
-                }
-                Details.append(CatData)
-            except (KeyError, ValueError):
-                print(f"Failed to process category: {item.text.strip()}")
-
-        return {
-            "id": getIMDBID(title),
-            "status": "Success",
-            "title": title.title(),
-            "provider": "DoveFoundation",
-            "recommended-age": None,
-            "review-items": Details,
-            "review-link": resURL
-        }
-
-    except Exception as e:
-        print(f"Error processing Dove Foundation review: {str(e)}")
+    # Fetch and parse errors propagate, so the circuit breaker counts them
+    response = await upstream.get_async(resURL, deadline=deadline)
+    upstream.raise_for_outage(response)
+
+    if response.status_code != 200:
+        print(f"Failed to fetch review page. Status code: {response.status_code}")
         return create_failed_review(videoName)
 
+    # Checked before the review markup, so a search hit that is not a review
+    # of this title (an article, other media) is a miss rather than a parse error
+    title = review_title(response.text)
+    if not titles.contains(videoName, title):
+        print(f"Dove returned wrong media: {title}")
+        return create_failed_review(videoName)
+
+    _, Details = parse_review(response.text)
+
+    return {
+        "id": await omdb.imdb_id_for_async(title, deadline=deadline, essential=False),
+        "status": "Success",
+        "title": title.title(),
+        "provider": "DoveFoundation",
+        "recommended-age": None,
+        "review-items": Details,
+        "review-link": resURL
+    }
+
 def create_failed_review(videoName):
     return {
         "id": None,
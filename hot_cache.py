@@ -0,0 +1,125 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# The hottest cache entries, held in process memory as the encoded responses
+# cache hits are served with (response_cache.EncodedResponse), so a hit on one
+# of them skips the database altogether.
+#
+# Which entries are hot is decided from hit statistics: every cache hit is
+# counted per key (HitCounter) and the counts are added to the database's
+# `hits` statistics every HIT_FLUSH_SECONDS, summed across workers. Warm-up
+# (readiness.py) loads the hottest keys before a worker reports ready; those
+# keys then stay in memory, re-read from the database every HOT_CACHE_MAX_AGE
+# seconds so changes made by other workers (a re-scrape, a cleared cache) are
+# picked up.
+
+HIT_FLUSH_SECONDS = float(os.environ.get('HIT_FLUSH_SECONDS', 30))
+HOT_CACHE_MAX_AGE = float(os.environ.get('HOT_CACHE_MAX_AGE', 60))
+
+
+class HitCounter:
+    """
+        HitCounter
+
+        Cache hits per key, counted in memory and written to the database
+        (db.record_hits) at most every flush_seconds, so counting a hit
+        never costs a write of its own. Whatever is pending is written at
+        exit.
+    """
+
+    def __init__(self, db, flush_seconds=HIT_FLUSH_SECONDS):
+        self.db = db
+        self.flush_seconds = flush_seconds
+        self._counts = Counter()
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, key):
+        with self._lock:
+            self._counts[key] += 1
+            if time.monotonic() - self._flushed_at < self.flush_seconds:
+                return
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+        self._write(counts)
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+        self._write(counts)
+
+    def _write(self, counts):
+        if not counts:
+            return
+        try:
+            self.db.record_hits(counts)
+        except Exception as e:
+            logger.error(f"Error recording cache hits: {str(e)}")
+
+
+class HotCache:
+    """
+        HotCache
+
+        Encoded responses for the keys loaded into it, valid until their
+        cache entry expires or, at the latest, max_age seconds after they
+        were read from the database. Only keys that were loaded are kept
+        (refresh() does nothing for the rest), so its size is bounded by
+        what warm-up chose.
+    """
+
+    def __init__(self, max_age=HOT_CACHE_MAX_AGE):
+        self.max_age = max_age
+        self._entries = {}
+        self._keys = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key.lower() in self._keys
+
+    def get(self, key):
+        entry = self._entries.get(key.lower())
+        if entry is None:
+            return None
+        response, valid_until = entry
+        if valid_until <= time.time():
+            return None
+        metrics.incr('hot_cache_hits')
+        return response
+
+    def load(self, key, response, expires):
+        """Keep response for key (a cache entry expiring at expires, 0 for never)."""
+        key = key.lower()
+        valid_until = time.time() + self.max_age
+        if expires:
+            valid_until = min(valid_until, expires)
+        with self._lock:
+            self._keys.add(key)
+            self._entries[key] = (response, valid_until)
+
+    def refresh(self, key, response, expires):
+        """Replace the response of a key that was loaded before; other keys are left out."""
+        if key in self:
+            self.load(key, response, expires)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key.lower(), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
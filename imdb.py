@@ -1,7 +1,6 @@
 import aiohttp
-from bs4 import BeautifulSoup
+import asyncio
 import re
-from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor
 import logging
 import json
@@ -9,14 +8,20 @@ from curl_cffi import requests
 import random
 import time
 import os
-import traceback
+import threading
+from impersonation import BLOCKED_STATUSES, ProfileSelector
+import parsing
+import retry
+import tracing
+import upstream
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create a session object
-session = requests.Session()
+# The shared session, created on first use (see sync_session)
+_session = None
+_session_lock = threading.Lock()
 
 IMPERSONATE_OPTIONS = [
     "chrome110", "chrome107", "chrome104", "chrome99", "chrome100", 
@@ -36,6 +41,9 @@ USER_AGENTS = {
     "safari15_5": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.5 Safari/605.1.15"
 }
 
+# Learns which impersonation profiles IMDb currently accepts
+profile_selector = ProfileSelector(IMPERSONATE_OPTIONS)
+
 def get_scenes(section):
     logger.info(f"Getting scenes from section: {section.get('id', 'Unknown section')}")
     scenes_raw = section.find_all('li', class_='ipc-zebra-list__item')
@@ -50,7 +58,6 @@ def get_scenes(section):
     logger.info(f"Processed {len(scenes)} scenes")
     return scenes
 
-@lru_cache(maxsize=128)
 def get_cat(section):
     logger.info(f"Getting category for section: {section.get('id', 'Unknown section')}")
     vote_container = section.find(class_='advisory-severity-vote__container')
@@ -96,56 +103,179 @@ def get_episode_info(soup):
     logger.info("No episode info found")
     return None
 
-def fetch_url(url, max_retries=5):
-    for attempt in range(max_retries):
-        try:
-            impersonate_option = random.choice(IMPERSONATE_OPTIONS)
-            user_agent = USER_AGENTS[impersonate_option]
-            
-            response = session.get(url, impersonate=impersonate_option)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestsError as e:
-            if "impersonate" in str(e):
-                logger.warning(f"Impersonation failed for {impersonate_option}, falling back to standard request")
-                try:
-                    headers = {'User-Agent': user_agent}
-                    response = requests.get(url, headers=headers)
-                    response.raise_for_status()
-                    return response.text
-                except Exception as e:
-                    logger.error(f"Standard request failed: {e}")
-            logger.error(f"Attempt {attempt + 1} failed. Error: {e}")
-            if attempt < max_retries - 1:
-                sleep_time = 2 ** attempt
-                logger.info(f"Retrying in {sleep_time} seconds...")
-                time.sleep(sleep_time)
-            else:
-                logger.error(f"All attempts failed for URL: {url}")
-                raise
-
-def imdb_parentsguide(tid, videoName):
+def sync_session():
+    """The curl_cffi Session all synchronous fetches share, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = requests.Session()
+    return _session
+
+def _fetch_attempt(url, deadline, timeout, headers=None):
+    # Each attempt asks the selector for the profile most likely to get through
+    impersonate_option = profile_selector.choose()
+    if impersonate_option is None:
+        return _fetch_plain(url, deadline, timeout, headers, random.choice(IMPERSONATE_OPTIONS))
+
+    started = time.monotonic()
+    try:
+        response = upstream.fetch_once(url, session=sync_session(), deadline=deadline, timeout=timeout, impersonate=impersonate_option, headers=headers)
+    except requests.RequestsError as e:
+        if "impersonate" not in str(e):
+            profile_selector.record(impersonate_option, False, time.monotonic() - started)
+            raise
+        profile_selector.disable(impersonate_option, str(e))
+        logger.warning(f"Impersonation failed for {impersonate_option}, falling back to standard request")
+        return _fetch_plain(url, deadline, timeout, headers, impersonate_option)
+
+    profile_selector.record(impersonate_option, response.status_code not in BLOCKED_STATUSES, time.monotonic() - started)
+    return response
+
+def _fetch_plain(url, deadline, timeout, headers, impersonate_option):
+    # Stay on the shared session so cookies and pooled connections are kept
+    headers = dict(headers or {}, **{'User-Agent': USER_AGENTS[impersonate_option]})
+    return upstream.fetch_once(url, session=sync_session(), deadline=deadline, timeout=timeout, headers=headers)
+
+def fetch_response(url, deadline=None, headers=None, policy=None):
+    policy = policy or retry.DEFAULT_POLICY
+    return policy.call(lambda timeout: _fetch_attempt(url, deadline, timeout, headers), url, deadline)
+
+def fetch_url(url, deadline=None, policy=None):
+    response = fetch_response(url, deadline, policy=policy)
+    if response.status_code == 404:
+        logger.warning(f"Page not found: {url}")
+        return None
+    response.raise_for_status()
+    return response.text
+
+def imdb_parentsguide(tid, videoName, deadline=None):
     logger.info(f"Processing IMDB parents guide for {tid}: {videoName}")
     pg_url = f'https://www.imdb.com/title/{tid}/parentalguide'
     
-    html = fetch_url(pg_url)
+    html = fetch_url(pg_url, deadline)
     if html is None:
         logger.error(f"Failed to fetch URL: {pg_url}")
-        return {
-            "id": tid,
-            "status": "Failed",
-            "title": videoName,
-            "provider": "imdb",
-            "review-items": None,
-            "review-link": pg_url,
-            "is_episode": False,
-            "series_id": None
-        }
-    
+        return failed_result(tid, videoName, pg_url)
+
+    return parse_parentsguide(html, tid, videoName, pg_url)
+
+def failed_result(tid, videoName, pg_url):
+    return {
+        "id": tid,
+        "status": "Failed",
+        "title": videoName,
+        "provider": "imdb",
+        "review-items": None,
+        "review-link": pg_url,
+        "is_episode": False,
+        "series_id": None
+    }
+
+# Coroutine twins of the fetch path above, on one curl_cffi AsyncSession per
+# event loop; profile selection and the plain fallback work the same way.
+_async_sessions = {}
+
+def async_session():
+    """The curl_cffi AsyncSession of the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    async_session = _async_sessions.get(loop)
+    if async_session is None:
+        async_session = _async_sessions[loop] = requests.AsyncSession()
+    return async_session
+
+async def close_async_session():
+    async_session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if async_session is not None:
+        await async_session.close()
+
+async def _fetch_attempt_async(url, deadline, timeout, headers=None):
+    impersonate_option = profile_selector.choose()
+    if impersonate_option is None:
+        return await _fetch_plain_async(url, deadline, timeout, headers, random.choice(IMPERSONATE_OPTIONS))
+
+    started = time.monotonic()
+    try:
+        response = await upstream.fetch_once_async(url, session=async_session(), deadline=deadline, timeout=timeout, impersonate=impersonate_option, headers=headers)
+    except requests.RequestsError as e:
+        if "impersonate" not in str(e):
+            profile_selector.record(impersonate_option, False, time.monotonic() - started)
+            raise
+        profile_selector.disable(impersonate_option, str(e))
+        logger.warning(f"Impersonation failed for {impersonate_option}, falling back to standard request")
+        return await _fetch_plain_async(url, deadline, timeout, headers, impersonate_option)
+
+    profile_selector.record(impersonate_option, response.status_code not in BLOCKED_STATUSES, time.monotonic() - started)
+    return response
+
+async def _fetch_plain_async(url, deadline, timeout, headers, impersonate_option):
+    headers = dict(headers or {}, **{'User-Agent': USER_AGENTS[impersonate_option]})
+    return await upstream.fetch_once_async(url, session=async_session(), deadline=deadline, timeout=timeout, headers=headers)
+
+async def fetch_response_async(url, deadline=None, headers=None, policy=None):
+    policy = policy or retry.DEFAULT_POLICY
+    return await policy.call_async(lambda timeout: _fetch_attempt_async(url, deadline, timeout, headers), url, deadline)
+
+async def fetch_url_async(url, deadline=None, policy=None):
+    response = await fetch_response_async(url, deadline, policy=policy)
+    if response.status_code == 404:
+        logger.warning(f"Page not found: {url}")
+        return None
+    response.raise_for_status()
+    return response.text
+
+async def imdb_parentsguide_async(tid, videoName, deadline=None):
+    """Coroutine version of imdb_parentsguide()."""
+    logger.info(f"Processing IMDB parents guide for {tid}: {videoName}")
+    pg_url = f'https://www.imdb.com/title/{tid}/parentalguide'
+
+    html = await fetch_url_async(pg_url, deadline)
+    if html is None:
+        logger.error(f"Failed to fetch URL: {pg_url}")
+        return failed_result(tid, videoName, pg_url)
+
+    return parse_parentsguide(html, tid, videoName, pg_url)
+
+def extract_next_data(html):
+    """
+    Locate and decode the <script id="__NEXT_DATA__"> payload with plain string
+    scanning, without building a DOM. Returns None if the page has no such script.
+    """
+    marker = html.find('id="__NEXT_DATA__"')
+    if marker == -1:
+        return None
+    tag_start = html.rfind('<script', 0, marker)
+    tag_end = html.find('>', marker)
+    if tag_start == -1 or tag_end == -1:
+        return None
+    start = tag_end + 1
+    while start < len(html) and html[start].isspace():
+        start += 1
     try:
-        soup = BeautifulSoup(html, 'lxml')
-    except:
-        soup = BeautifulSoup(html, 'html.parser')
+        # raw_decode stops at the end of the JSON value, so the closing tag never needs to be found
+        json_data, _ = _json_decoder.raw_decode(html, start)
+    except json.JSONDecodeError as e:
+        logger.warning(f"Could not decode __NEXT_DATA__ payload: {str(e)}")
+        return None
+    return json_data
+
+_json_decoder = json.JSONDecoder()
+
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_parentsguide(html, tid, videoName, pg_url):
+    # Fast path: new-structure pages carry everything in the __NEXT_DATA__ JSON
+    json_data = extract_next_data(html)
+    if json_data is not None:
+        try:
+            result = process_next_data(json_data, tid, videoName, pg_url)
+        except Exception as e:
+            raise upstream.ParseError(f"IMDb __NEXT_DATA__ not understood on {pg_url}: {str(e)}") from e
+        if result is not None:
+            return result
+        logger.warning("__NEXT_DATA__ has no contentData, falling back to full page parse")
+
+    soup = parsing.make_soup(html)
 
     # Check if it's the new page structure
     new_structure = soup.find("main", role="main")
@@ -167,19 +297,11 @@ def imdb_parentsguide(tid, videoName):
             # with open(f"default_structure_{tid}.html", "w", encoding="utf-8") as file:
             #     file.write(html)
             return process_old_structure(soup, tid, videoName, pg_url)
+    except upstream.ParseError:
+        raise
     except Exception as e:
-        logger.error(f"Error processing IMDB parents guide: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        return {
-            "id": tid,
-            "status": "Failed",
-            "title": videoName,
-            "provider": "imdb",
-            "review-items": None,
-            "review-link": pg_url,
-            "is_episode": False,
-            "series_id": None
-        }
+        # A markup change, not a title without a guide: let the circuit breaker count it
+        raise upstream.ParseError(f"IMDb parents guide markup not understood on {pg_url}: {str(e)}") from e
 
 def process_new_structure(soup, tid, videoName, pg_url):
     logger.info("Processing new page structure")
@@ -187,16 +309,26 @@ def process_new_structure(soup, tid, videoName, pg_url):
     # Find the script tag containing the JSON data
     script_tag = soup.find('script', {'id': '__NEXT_DATA__', 'type': 'application/json'})
     if not script_tag:
-        logger.warning("JSON data not found in script tag")
-        return create_error_result(tid, videoName, pg_url)
+        raise upstream.ParseError(f"IMDb __NEXT_DATA__ script not found on {pg_url}")
 
     # Parse the JSON data
     try:
         json_data = json.loads(script_tag.string)
+    except json.JSONDecodeError as e:
+        raise upstream.ParseError(f"IMDb __NEXT_DATA__ on {pg_url} is not valid JSON: {str(e)}") from e
+
+    result = process_next_data(json_data, tid, videoName, pg_url)
+    if result is None:
+        raise upstream.ParseError(f"IMDb __NEXT_DATA__ on {pg_url} has no contentData")
+    return result
+
+def process_next_data(json_data, tid, videoName, pg_url):
+    """Build the result from a decoded __NEXT_DATA__ payload. Returns None if it has no contentData."""
+    try:
         content_data = json_data['props']['pageProps']['contentData']
-    except (json.JSONDecodeError, KeyError) as e:
+    except (KeyError, TypeError) as e:
         logger.error(f"Error parsing JSON data: {str(e)}")
-        return create_error_result(tid, videoName, pg_url)
+        return None
 
     # Extract title
     videoName = content_data.get('entityMetadata', {}).get('titleText', {}).get('text', videoName)
@@ -299,17 +431,7 @@ def process_old_structure(soup, tid, videoName, pg_url):
     
     main_content = soup.find("div", id="main")
     if not main_content:
-        logger.warning("Main content section not found in old structure")
-        return {
-            "id": tid,
-            "status": "Failed",
-            "title": videoName,
-            "provider": "imdb",
-            "review-items": None,
-            "review-link": pg_url,
-            "is_episode": False,
-            "series_id": None
-        }
+        raise upstream.ParseError(f"IMDb main content section not found on {pg_url}")
 
     # Extract title
     title_elem = soup.find("h3", itemprop="name")
@@ -0,0 +1,102 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean the upstream rejected this client fingerprint rather than the request
+BLOCKED_STATUSES = frozenset([403, 429, 503])
+
+
+class ProfileStats:
+    def __init__(self, window):
+        self.outcomes = deque(maxlen=window)  # (ok, latency) of the most recent attempts
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.disabled = None  # reason, once the profile is known not to work at all
+
+    def successes(self):
+        return sum(1 for ok, _ in self.outcomes if ok)
+
+    def mean_latency(self):
+        latencies = [latency for ok, latency in self.outcomes if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+
+class ProfileSelector:
+    """
+        Picks a curl_cffi impersonation profile per request.
+
+        Each profile keeps a rolling window of outcomes. choose() draws from a
+        Beta(successes + 1, failures + 1) per profile (Thompson sampling), scaled
+        down for slow profiles, so profiles that currently work get most of the
+        traffic while the others are still occasionally explored. A profile that
+        fails failure_threshold times in a row is cooled off for cooldown seconds.
+    """
+
+    def __init__(self, profiles, window=50, cooldown=300, failure_threshold=3, latency_scale=5.0):
+        self.profiles = list(profiles)
+        self.cooldown = cooldown
+        self.failure_threshold = failure_threshold
+        self.latency_scale = latency_scale
+        self.stats = {profile: ProfileStats(window) for profile in self.profiles}
+        self.lock = threading.Lock()
+
+    def _score(self, stats):
+        successes = stats.successes()
+        failures = len(stats.outcomes) - successes
+        score = random.betavariate(successes + 1, failures + 1)
+        latency = stats.mean_latency()
+        if latency is not None:
+            score /= 1 + latency / self.latency_scale
+        return score
+
+    def choose(self):
+        now = time.monotonic()
+        with self.lock:
+            usable = [p for p in self.profiles if not self.stats[p].disabled]
+            if not usable:
+                return None
+            available = [p for p in usable if self.stats[p].cooldown_until <= now]
+            if not available:
+                # Everything is cooling off: use the profile that comes back first
+                return min(usable, key=lambda p: self.stats[p].cooldown_until)
+            return max(available, key=lambda p: self._score(self.stats[p]))
+
+    def record(self, profile, ok, latency):
+        with self.lock:
+            stats = self.stats[profile]
+            stats.outcomes.append((ok, latency))
+            if ok:
+                stats.consecutive_failures = 0
+                return
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.failure_threshold:
+                stats.cooldown_until = time.monotonic() + self.cooldown
+                stats.consecutive_failures = 0
+                logger.warning(f"Impersonation profile {profile} failed {self.failure_threshold} times in a row, cooling off for {self.cooldown}s")
+
+    def disable(self, profile, reason):
+        with self.lock:
+            self.stats[profile].disabled = reason
+        logger.warning(f"Impersonation profile {profile} disabled: {reason}")
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            rows = []
+            for profile in self.profiles:
+                stats = self.stats[profile]
+                attempts = len(stats.outcomes)
+                latency = stats.mean_latency()
+                rows.append({
+                    'profile': profile,
+                    'attempts': attempts,
+                    'success_rate': round(stats.successes() / attempts, 2) if attempts else None,
+                    'mean_latency': round(latency, 2) if latency is not None else None,
+                    'cooldown_remaining': max(0, round(stats.cooldown_until - now)),
+                    'disabled': stats.disabled,
+                })
+            return rows
@@ -1,25 +1,15 @@
-from flask import Flask, request, jsonify, render_template_string, Response, render_template, redirect, url_for, session
-from bs4 import BeautifulSoup
-import requests
+from flask import Flask, request, jsonify, make_response, render_template_string, Response, render_template, redirect, url_for, session, send_from_directory
 import json
 import re
-import time
 from datetime import datetime
 import logging
-import imdb
-from kidsinmind import KidsInMindScraper
-import dove
-import parentpreviews
-import cringMDB
-import commonsensemedia
-import movieguide
+import providers
+import circuit
 from SQLiteCache import SqliteCache
-from waitress import serve
-from paste.translogger import TransLogger
 import traceback
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 import sqlite3
-import geoip2.database
 import ipaddress
 import atexit
 import os
@@ -28,7 +18,14 @@ import calendar
 import sys
 from functools import wraps
 import asyncio
-from vercel_kv import VercelKV
+import memtrace
+import metrics
+import omdb
+import profiling
+import readiness
+import response_cache
+import tracing
+from service import ParentalGuideService
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
@@ -42,15 +39,25 @@ class DatabaseHandler(logging.Handler):
     def __init__(self, db):
         super().__init__()
         self.db = db
+        self._writing = threading.local()
 
     def emit(self, record):
+        # Whatever the database logs while writing a log row (VercelKV does,
+        # and so does its circuit breaker) is not written back into it
+        if getattr(self._writing, 'active', False):
+            return
+        self._writing.active = True
         try:
-            self.db.add_log(record.levelname, self.format(record))
+            with tracing.span('log'):
+                self.db.add_log(record.levelname, self.format(record))
         except Exception as e:
             print(f"Error in DatabaseHandler: {str(e)}")  # Use print for error reporting
+        finally:
+            self._writing.active = False
 
 # Initialize the database
 if os.environ.get('VERCEL_ENV'):
+    from vercel_kv import VercelKV
     try:
         db = VercelKV()
     except ValueError as e:
@@ -59,9 +66,15 @@ if os.environ.get('VERCEL_ENV'):
         db_path = '/tmp/cache.sqlite'
         db = SqliteCache(db_path)
 else:
-    db_path = 'cache.sqlite'
+    db_path = os.environ.get('CACHE_DB_PATH', 'cache.sqlite')
     db = SqliteCache(db_path)
 
+# OMDB lookups share the omdb_cache table (and the API quota count) of this backend
+omdb.configure(db)
+
+# The /get_data pipeline, shared by the routes below and async_server
+service = ParentalGuideService(db)
+
 # Set up the logger to use the database handler
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -109,7 +122,13 @@ def admin_panel():
         'cache': db.get_cached_records_count()
     }
     message = request.args.get('message')
-    return render_template('admin_panel.html', api_status=api_status, env_vars=env_vars, record_counts=record_counts, message=message)
+    # Only if IMDb has been scraped in this process; importing it just for this would load curl_cffi
+    imdb = sys.modules.get('imdb')
+    impersonation_stats = imdb.profile_selector.snapshot() if imdb else []
+    return render_template('admin_panel.html', api_status=api_status, env_vars=env_vars, record_counts=record_counts, message=message,
+                           impersonation_stats=impersonation_stats, memtrace_enabled=memtrace.enabled(),
+                           profiling_run=profiling.status(), profiles=profiling.saved(), profiling_modes=profiling.MODES,
+                           provider_names=providers.PROVIDER_NAMES)
 
 @app.route('/admin/clear_logs')
 @admin_required
@@ -127,69 +146,87 @@ def clear_stats():
 @admin_required
 def clear_cache():
     db.clear()
+    service.hot.clear()
     return redirect(url_for('admin_panel', message='Cache cleared successfully'))
 
-@app.route('/admin/update_env', methods=['POST'])
+@app.route('/admin/memory')
 @admin_required
-def update_env():
-    omdb_api_key = request.form.get('OMDB_API_KEY')
-    os.environ['OMDB_API_KEY'] = omdb_api_key
-    return redirect(url_for('admin_panel', message='Environment variables updated successfully'))
+def memory_report():
+    return jsonify(memtrace.report(int(request.args.get('top', memtrace.TOP_SITES))))
 
-# Update the update_stats function
-def update_stats(is_cached, sex_nudity_category, country):
-    try:
-        stats = db.get_all_stats()
-        current_year = datetime.now().year
-        current_month = datetime.now().strftime('%Y-%m')
-        current_day = datetime.now().strftime('%Y-%m-%d')
+@app.route('/admin/memory/start')
+@admin_required
+def start_memory_trace():
+    memtrace.start()
+    return redirect(url_for('admin_panel', message='Allocation tracing started'))
 
-        # Initialize stats if they don't exist
-        stats['total_hits'] = stats.get('total_hits', 0) + 1
-        stats['cached_hits'] = stats.get('cached_hits', 0)
-        stats['fresh_hits'] = stats.get('fresh_hits', 0)
+@app.route('/admin/memory/stop')
+@admin_required
+def stop_memory_trace():
+    memtrace.stop()
+    return redirect(url_for('admin_panel', message='Allocation tracing stopped'))
 
-        if is_cached:
-            stats['cached_hits'] += 1
-        else:
-            stats['fresh_hits'] += 1
+@app.route('/admin/profile/start', methods=['POST'])
+@admin_required
+def start_profiling():
+    try:
+        profiling.start(request.form.get('mode', profiling.SAMPLING), int(request.form.get('requests', 10)), request.form.get('provider') or None)
+    except (ValueError, providers.UnknownProviderError) as e:
+        return redirect(url_for('admin_panel', message=f'Profiling not started: {e}'))
+    return redirect(url_for('admin_panel', message='Profiling started'))
 
-        # Update This Year's Statistics
-        hits_by_year = stats.get('hits_by_year', {})
-        hits_by_year[str(current_year)] = hits_by_year.get(str(current_year), 0) + 1
-        stats['hits_by_year'] = hits_by_year
+@app.route('/admin/profile/stop')
+@admin_required
+def stop_profiling():
+    name = profiling.stop()
+    return redirect(url_for('admin_panel', message=f'Profiling stopped, saved {name}' if name else 'Profiling stopped, nothing profiled'))
 
-        # Update This Month's Statistics
-        hits_by_month = stats.get('hits_by_month', {})
-        hits_by_month[current_month] = hits_by_month.get(current_month, 0) + 1
-        stats['hits_by_month'] = hits_by_month
+@app.route('/admin/profile/<name>')
+@admin_required
+def download_profile(name):
+    return send_from_directory(profiling.PROFILE_DIR, name, as_attachment=True)
 
-        # Update daily hits
-        hits_by_day = stats.get('hits_by_day', {})
-        hits_by_day[current_day] = hits_by_day.get(current_day, 0) + 1
-        stats['hits_by_day'] = hits_by_day
-
-        # Update Sex & Nudity Categories
-        if sex_nudity_category:
-            sex_nudity_categories = stats.get('sex_nudity_categories', {})
-            sex_nudity_categories[sex_nudity_category] = sex_nudity_categories.get(sex_nudity_category, 0) + 1
-            stats['sex_nudity_categories'] = sex_nudity_categories
-
-        # Update Countries Using the API
-        if country:
-            countries = stats.get('countries', {})
-            countries[country] = countries.get(country, 0) + 1
-            stats['countries'] = countries
-
-        # Save all stats
-        db.set_stat('stats', stats)
-        logger.info(f"Updated stats: Total Hits: {stats['total_hits']}, Cached Hits: {stats['cached_hits']}, Fresh Hits: {stats['fresh_hits']}")
-    except Exception as e:
-        logger.error(f"Error updating stats: {str(e)}")
+@app.route('/admin/profile/<name>/summary')
+@admin_required
+def profile_summary(name):
+    if not name.endswith(profiling.EXTENSIONS[profiling.CPROFILE]):
+        return jsonify({"error": "Only cProfile profiles have a summary"}), 400
+    try:
+        return Response(profiling.summary(name), mimetype='text/plain')
+    except FileNotFoundError:
+        return jsonify({"error": "Profile not found"}), 404
 
-# Initialize the GeoIP reader
-geoip_reader = geoip2.database.Reader('GeoLite2-Country.mmdb')
+@app.route('/admin/update_env', methods=['POST'])
+@admin_required
+def update_env():
+    omdb_api_key = request.form.get('OMDB_API_KEY')
+    os.environ['OMDB_API_KEY'] = omdb_api_key
+    return redirect(url_for('admin_panel', message='Environment variables updated successfully'))
 
+# The GeoIP reader is opened by the first request that needs it, not at import,
+# so a process that never looks up a country never pays for geoip2 or the
+# database file. get_geoip_reader() is safe to call from any thread.
+GEOIP_DB_PATH = os.environ.get('GEOIP_DB_PATH', 'GeoLite2-Country.mmdb')
+_geoip_reader = None
+_geoip_lock = threading.Lock()
+# geoip2.errors.AddressNotFoundError once the reader is open; matches nothing before
+_address_not_found = ()
+
+def get_geoip_reader():
+    global _geoip_reader, _address_not_found
+    if _geoip_reader is None:
+        with _geoip_lock:
+            if _geoip_reader is None:
+                import geoip2.database
+                import geoip2.errors
+                _address_not_found = geoip2.errors.AddressNotFoundError
+                reader = geoip2.database.Reader(GEOIP_DB_PATH)
+                # Close the reader when the application exits
+                atexit.register(reader.close)
+                _geoip_reader = reader
+    return _geoip_reader
+
+@tracing.spanned('geoip')
 def get_country_from_ip(ip):
     try:
         # Check if the IP is a private address
@@ -197,212 +234,177 @@ def get_country_from_ip(ip):
             return "Private IP"
         
         # Look up the IP
-        response = geoip_reader.country(ip)
+        response = get_geoip_reader().country(ip)
         return response.country.name or "Unknown"
-    except geoip2.errors.AddressNotFoundError:
+    except _address_not_found:
         return "Unknown"
     except ValueError:
         return "Invalid IP"
 
-# Don't forget to close the reader when your application exits
-# You can do this in your main block or use atexit to ensure it's called
-atexit.register(geoip_reader.close)
+# What /status checks, and what a worker does before it reports ready (see readiness.py)
+def database_status():
+    return db.ping(), type(db).__name__
 
-# Add this function to get movie/TV show name from OMDB API
-def get_title_from_omdb(imdb_id):
-    omdb_api_key = os.environ.get('OMDB_API_KEY')
-    if not omdb_api_key:
-        app.logger.error("OMDB API key not found in environment variables")
-        return None
+def redis_status():
+    snapshot = db.breaker.snapshot()
+    return db.redis is not None and snapshot['state'] != circuit.OPEN, snapshot
 
-    cache_key = f"omdb_title_{imdb_id}"
-    cached_data = db.get_omdb_cache(cache_key)
-    if cached_data:
-        app.logger.info(f"Retrieved title for {imdb_id} from OMDB cache")
-        return cached_data.get('Title')
+def geoip_status():
+    get_geoip_reader()
+    return True, GEOIP_DB_PATH
 
-    url = f"http://www.omdbapi.com/?i={imdb_id}&apikey={omdb_api_key}"
-    
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('Response') == 'True':
-            db.set_omdb_cache(cache_key, data)
-            return data.get('Title')
-        else:
-            app.logger.warning(f"No title found for IMDb ID: {imdb_id}")
-            return None
-    except requests.RequestException as e:
-        app.logger.error(f"Error fetching data from OMDB: {str(e)}")
-        return None
-
-def get_imdb_id_from_omdb(video_name, release_year=None):
-    omdb_api_key = os.environ.get('OMDB_API_KEY')
-    if not omdb_api_key:
-        app.logger.error("OMDB API key not found in environment variables")
-        return None
-
-    cache_key = f"omdb_id_{video_name}_{release_year}"
-    cached_data = db.get_omdb_cache(cache_key)
-    if cached_data:
-        app.logger.info(f"Retrieved data for {video_name} ({release_year}) from OMDB cache")
-        return cached_data
-
-    url = f"http://www.omdbapi.com/?t={video_name}&y={release_year}&apikey={omdb_api_key}"
-    
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('Response') == 'True':
-            db.set_omdb_cache(cache_key, data)
-            return data
-        else:
-            app.logger.warning(f"No IMDB data found for: {video_name}")
-            return None
-    except requests.RequestException as e:
-        app.logger.error(f"Error fetching data from OMDB: {str(e)}")
-        return None
+def preload_hot_keys():
+    loaded = service.preload(readiness.WARMUP_KEYS)
+    return f"{loaded} of the {readiness.WARMUP_KEYS} most hit entries loaded"
+
+readiness.add_check('database', database_status)
+if not isinstance(db, SqliteCache):
+    readiness.add_check('redis', redis_status)
+readiness.add_check('geoip', geoip_status)
+
+readiness.add_step('database', lambda: database_status()[1])
+readiness.add_step('geoip', lambda: geoip_status()[1])
+readiness.add_step('hot_keys', preload_hot_keys)
+readiness.add_step('connections', readiness.preconnect, readiness.preconnect_async)
+
+def normalize_video_name(video_name):
+    return (video_name or '').replace("+"," ").replace("%20"," ").replace(":","").replace("%3A", "")
 
 @app.route('/get_data', methods=['GET'])
 def get_data():
+    with tracing.trace('get_data') as trace:
+        with profiling.profile(request.args.get('provider', '').lower()):
+            response = make_response(lookup_response(trace))
+        tracing.respond(trace, response.headers, response.status_code)
+        return response
+
+def lookup_response(trace):
     try:
         app.logger.info("Received request for /get_data")
-        starttime = time.time()
 
         # Get parameters from the query string
         imdb_id = request.args.get('imdb_id')
-        video_name = request.args.get('video_name', '').replace("+"," ").replace("%20"," ").replace(":","").replace("%3A", "")
+        video_name = normalize_video_name(request.args.get('video_name', ''))
         release_year = request.args.get('release_year')
         provider = request.args.get('provider', '').lower()
 
         app.logger.info(f"Request parameters: imdb_id={imdb_id}, video_name={video_name}, release_year={release_year}, provider={provider}")
 
-        if not provider:
-            return jsonify({"error": "Provider parameter is required"}), 400
-
-        # If IMDB ID is not provided, try to get it from OMDB
-        if not imdb_id and video_name:
-            omdb_data = get_imdb_id_from_omdb(video_name, release_year)
-            if omdb_data:
-                imdb_id = omdb_data.get('imdbID')
-                if not release_year:
-                    release_year = omdb_data.get('Year')
-            app.logger.info(f"Retrieved IMDB ID from OMDB: {imdb_id}, Release Year: {release_year}")
-
-        key = f"{provider}:{imdb_id or video_name}"
-        cached_result = db.get(key)
-        if cached_result:
-            logger.info(f"Cache hit for key: {key}")
-        else:
-            logger.info(f"Cache miss for key: {key}")
-
-        if cached_result:
-            app.logger.info(f"Cached result structure: {json.dumps(cached_result, indent=2)}")
-            app.logger.info(f"Returning cached result for {cached_result.get('title', 'Unknown title')} from {provider}")
-            
-            # Check if review-items exist and are not empty
-            review_items = cached_result.get('review-items')
-            if not review_items:
-                app.logger.warning(f"No review items found in cached result for {cached_result.get('title', 'Unknown title')} from {provider}")
-                sex_nudity_category = None
-            else:
-                sex_nudity_category = next((item.get('cat') for item in review_items if item.get('name') == 'Sex & Nudity'), None)
-            
-            # Get country from IP
-            ip_address = request.remote_addr
-            country = get_country_from_ip(ip_address)
-
-            # When calling update_stats, include the country
-            update_stats(True, sex_nudity_category, country)
-            cached_result['is_cached'] = True
-            return jsonify(cached_result)
-        
-        # Get video name from OMDB if not provided
-        if not video_name:
-            video_name = get_title_from_omdb(imdb_id)
-            if not video_name:
-                return jsonify({"error": "Could not retrieve video name from OMDB"}), 400
-        
-        app.logger.info(f"Fetching fresh data for {video_name or imdb_id} from {provider}")
-        
-        # Provider-specific logic
-        if "imdb" in provider:
-            result = imdb.imdb_parentsguide(imdb_id, video_name)
-        elif "kidsinmind" in provider:
-            result = KidsInMindScraper(imdb_id, video_name, release_year)
-        elif "dove" in provider:
-            result = dove.DoveFoundationScrapper(video_name)
-        elif "dovefoundation" in provider:
-            result = dove.DoveFoundationScrapper(video_name)
-        elif "parentpreview" in provider:
-            result = parentpreviews.ParentPreviewsScraper(imdb_id, video_name)
-        elif "parentpreviews" in provider:
-            result = parentpreviews.ParentPreviewsScraper(imdb_id, video_name)
-        elif "cring" in provider:
-            result = cringMDB.cringMDBScraper(imdb_id, video_name)
-        elif "commonsense" in provider:
-            result = commonsensemedia.CommonSenseScrapper(imdb_id, video_name)
-        elif "csm" in provider:
-            result = commonsensemedia.CommonSenseScrapper(imdb_id, video_name)
-        elif "movieguide" in provider:
-            result = movieguide.MovieGuideOrgScrapper(imdb_id, video_name)
-        elif "movieguideorg" in provider:
-            result = movieguide.MovieGuideOrgScrapper(imdb_id, video_name)
-        else:
-            return jsonify({"error": f"Unknown provider: {provider}"}), 400
-
-        if result:
-            if not isinstance(result, dict):
-                app.logger.error(f"Invalid result format for {video_name or imdb_id} from {provider}")
-                return jsonify({"error": "Invalid result format"}), 500
-            
-            if 'title' not in result or 'provider' not in result:
-                app.logger.error(f"Missing required keys in result for {video_name or imdb_id} from {provider}")
-                return jsonify({"error": "Invalid result format"}), 500
-            
-            # Check if review-items exist and are not empty
-            review_items = result.get('review-items')
-            if not review_items:
-                app.logger.warning(f"No review items found for {video_name or imdb_id} from {provider}")
-                sex_nudity_category = None
-            else:
-                sex_nudity_category = next((item.get('cat') for item in review_items if item.get('name') == 'Sex & Nudity'), None)
-            
-            # Get country from IP
-            ip_address = request.remote_addr
-            country = get_country_from_ip(ip_address)
-
-            # When calling update_stats, include the country
-            update_stats(False, sex_nudity_category, country)
-            
-            # Only store in cache if review-items are not null
-            if review_items:
-                try:
-                    db.set(key, result)
-                    logger.info(f"Storing result in cache for {result['title']} from {provider}")
-                except Exception as e:
-                    logger.error(f"Error storing result in cache: {str(e)}", exc_info=True)
-            else:
-                app.logger.info(f"Not storing result in cache due to null review-items for {result['title']} from {provider}")
-            
-            result['is_cached'] = False
-            return jsonify(result)
-        else:
-            app.logger.info(f"No data found for {video_name or imdb_id} from {provider}")
-            return jsonify({"error": "No data found"}), 404
+        # Get country from IP
+        country = get_country_from_ip(request.remote_addr)
+
+        lookup = service.lookup(imdb_id, video_name, release_year, provider, country, encoded=True)
+        if trace is not None:
+            trace.note(provider=provider, key=lookup.key, source=lookup.source)
+        if isinstance(lookup.payload, response_cache.EncodedResponse):
+            status_code, headers, body = response_cache.respond(lookup.payload, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+            response = Response(body, status=status_code, headers=headers)
+            if status_code == 304:
+                # Not the default text/html of an empty Response
+                del response.headers['Content-Type']
+            return response
+        response = jsonify(lookup.payload)
+        if lookup.retry_after:
+            response.headers['Retry-After'] = str(lookup.retry_after)
+        return response, lookup.status_code
 
     except Exception as e:
         logger.error(f"Error in get_data: {str(e)}", exc_info=True)
         return jsonify({"error": "An internal server error occurred"}), 500
 
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 5000))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+BATCH_CACHE_CHUNK = 200
+
+def _batch_line(index, item, payload, status_code):
+    return json.dumps({
+        "index": index,
+        "imdb_id": item.get('imdb_id'),
+        "video_name": item.get('video_name'),
+        "provider": item.get('provider'),
+        "status": status_code,
+        "result": payload,
+    }) + "\n"
+
+def _run_batch_item(index, item, country):
+    try:
+        lookup = service.lookup(item['imdb_id'], item['video_name'], item['release_year'], item['provider'], country)
+        payload, status_code = lookup.payload, lookup.status_code
+    except Exception as e:
+        logger.error(f"Error in batch item {index}: {str(e)}", exc_info=True)
+        payload, status_code = {"error": "An internal server error occurred"}, 500
+    return _batch_line(index, item, payload, status_code)
+
+def stream_batch(items, country):
+    """Yield one NDJSON line per item: cache hits first, then misses as they complete."""
+    misses = []
+
+    # Serve items with a known IMDb ID straight from the cache, in bulk
+    keyed = [(index, item) for index, item in enumerate(items) if item['imdb_id'] and item['provider']]
+    for start in range(0, len(keyed), BATCH_CACHE_CHUNK):
+        chunk = keyed[start:start + BATCH_CACHE_CHUNK]
+        cached = db.get_many([f"{item['provider']}:{item['imdb_id']}" for _, item in chunk])
+        for index, item in chunk:
+            key = f"{item['provider']}:{item['imdb_id']}"
+            cached_result = cached.get(key.lower())
+            if cached_result:
+                # Counted like single lookups, so titles fetched in batches are preloaded as hot too
+                service.hits.record(key)
+                payload, sex_nudity_category = service.serve_cached(cached_result, item['provider'])
+                service.update_stats(True, sex_nudity_category, country)
+                yield _batch_line(index, item, payload, 200)
+            else:
+                misses.append(index)
+        del cached
+
+    keyed_indexes = {index for index, _ in keyed}
+    misses.extend(index for index in range(len(items)) if index not in keyed_indexes)
+    logger.info(f"Batch of {len(items)} items: {len(items) - len(misses)} cache hits, {len(misses)} to fetch")
+
+    # Run the misses on a bounded pool, keeping only a small window in flight
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+        pending = set()
+        for index in misses:
+            pending.add(executor.submit(_run_batch_item, index, items[index], country))
+            if len(pending) >= BATCH_MAX_WORKERS * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+@app.route('/get_data/batch', methods=['POST'])
+def get_data_batch():
+    app.logger.info("Received request for /get_data/batch")
+    body = request.get_json(silent=True)
+    raw_items = body.get('items') if isinstance(body, dict) else body
+    if not isinstance(raw_items, list) or not raw_items:
+        return jsonify({"error": "Request body must be a non-empty list of items"}), 400
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Batch is limited to {BATCH_MAX_ITEMS} items"}), 400
+
+    items = []
+    for index, raw_item in enumerate(raw_items):
+        if not isinstance(raw_item, dict) or not (raw_item.get('imdb_id') or raw_item.get('video_name')):
+            return jsonify({"error": f"Item {index} needs an imdb_id or a video_name"}), 400
+        items.append({
+            'imdb_id': raw_item.get('imdb_id'),
+            'video_name': normalize_video_name(raw_item.get('video_name')),
+            'release_year': raw_item.get('release_year'),
+            'provider': (raw_item.get('provider') or '').lower(),
+        })
+
+    country = get_country_from_ip(request.remote_addr)
+    return Response(stream_batch(items, country), mimetype='application/x-ndjson')
+
 # Add this function to check the API status
 def is_api_running():
-    # You can implement a more sophisticated check here if needed
-    return True
+    return readiness.is_ready()
+
+@app.route('/status', methods=['GET'])
+def readiness_status():
+    report, ready = readiness.status()
+    return jsonify(report), 200 if ready else 503
 
 # Modify the api_documentation function
 @app.route('/', methods=['GET'])
@@ -459,6 +461,7 @@ def show_stats():
         
         cached_records_count = db.get_cached_records_count()
         stats = db.get_all_stats()
+        breakers = [circuit.get_breaker(name).snapshot() for name in providers.PROVIDER_NAMES]
         
         logger.info(f"Retrieved stats: {stats}")
         
@@ -496,11 +499,16 @@ def show_stats():
                                current_month=current_month,
                                cached_records_count=cached_records_count,
                                sex_nudity_categories=stats.get('sex_nudity_categories', {}),
-                               countries=stats.get('countries', {}))
+                               countries=stats.get('countries', {}),
+                               breakers=breakers)
     except Exception as e:
         logger.error(f"Error in show_stats: {str(e)}", exc_info=True)
         return jsonify({"error": "An error occurred while fetching stats"}), 500
 
+@app.route('/metrics', methods=['GET'])
+def show_metrics():
+    return jsonify(metrics.snapshot())
+
 @app.route('/tryout', methods=['GET', 'POST'])
 def tryout():
     api_status = "green" if is_api_running() else "red"
@@ -509,6 +517,7 @@ def tryout():
     error = None
     is_cached = None
     process_time = None
+    timings = None
 
     if request.method == 'POST':
         imdb_id = request.form.get('imdb_id')
@@ -522,53 +531,32 @@ def tryout():
             error = "Provider is a required field."
         else:
             try:
-                start_time = time.time()
-                params = {
-                    'imdb_id': imdb_id,
-                    'provider': provider,
-                    'video_name': video_name,
-                    'release_year': release_year
-                }
-                # Use the current request's host for the API call
-                api_url = f"{request.scheme}://{request.host}/get_data"
-                
-                # Use the same session as the current request
-                with requests.Session() as session:
-                    session.cookies.update(request.cookies)
-                    response = session.get(api_url, params=params)
-                
-                if response.status_code == 200:
-                    try:
-                        result = response.json()
-                        process_time = round(time.time() - start_time, 2)
-                        
-                        # Check if the result was cached
-                        is_cached = result.get('is_cached', False)
-                        
-                        # If the result is empty or contains only 'NA' values, set result to None
-                        if not result.get('review-items') or all(item.get('Description', '').lower() == 'na' for item in result.get('review-items', [])):
-                            result = None
-                            error = "No meaningful data found for the given input."
-                    except json.JSONDecodeError:
-                        error = f"Invalid JSON response received. Response content: {response.text[:100]}..."
+                # The same lookup /get_data runs, made in-process rather than through a second request to this server
+                lookup = service.lookup(imdb_id, normalize_video_name(video_name), release_year, provider.lower(), get_country_from_ip(request.remote_addr))
+
+                if lookup.ok:
+                    result = lookup.payload
+                    process_time = round(lookup.total_seconds, 2)
+                    timings = {stage: round(seconds * 1000) for stage, seconds in lookup.timings.items()}
+
+                    # Check if the result was cached
+                    is_cached = lookup.is_cached
+
+                    # If the result is empty or contains only 'NA' values, set result to None
+                    if not result.get('review-items') or all(item.get('Description', '').lower() == 'na' for item in result.get('review-items', [])):
+                        result = None
+                        error = "No meaningful data found for the given input."
                 else:
-                    error = f"API request failed with status code: {response.status_code}. Response: {response.text[:100]}..."
-                
-            except requests.RequestException as e:
-                error = f"An error occurred while making the API request: {str(e)}"
+                    error = f"API request failed with status code: {lookup.status_code}. Response: {json.dumps(lookup.payload)[:100]}..."
+
+            except Exception as e:
+                logger.error(f"Error in tryout: {str(e)}", exc_info=True)
+                error = f"An error occurred while looking up the title: {str(e)}"
 
-    return render_template('tryout.html', api_status=api_status, providers=providers, result=result, error=error, is_cached=is_cached, process_time=process_time)
+    return render_template('tryout.html', api_status=api_status, providers=providers, result=result, error=error, is_cached=is_cached, process_time=process_time, timings=timings)
 
 # Run the Flask app
 if __name__ == '__main__':
-    # Log some initial information
-    print("Application started")
-    
-    host = "0.0.0.0"
-    port = 8080
-    print(f"Server starting on http://{host}:{port}")
-    print(f"API documentation available at http://{host}:{port}/")
-    print(f"API endpoint: http://{host}:{port}/get_data")
-    print(f"Status endpoint: http://{host}:{port}/status")
-    print(f"Stats dashboard: http://{host}:{port}/stats")
-    serve(TransLogger(app, setup_console_handler=False), host=host, port=port)
\ No newline at end of file
+    # Production serving (pre-forked workers, graceful drain) lives in server.py
+    import server
+    server.main()
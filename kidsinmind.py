@@ -1,199 +1,406 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+from bs4 import SoupStrainer
 import re
-from difflib import SequenceMatcher
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import contextvars
 import logging
+import os
+import threading
+import time
+import parsing
+import titles
+import tracing
+import upstream
+from retry import DeadlineExceeded
 
 logger = logging.getLogger(__name__)
 
-def string_similarity(a, b):
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
-
-def KidsInMindScraper(ID, videoName, release_year=None):
-    Session = requests.Session()
-    videoName = videoName.replace(":", "%3A").replace(" ","+")
-    sURL = 'https://kids-in-mind.com/search-desktop.htm?fwp_keyword=' + videoName
-    url = sURL
-    r = Session.get(url)
-    Cats = {
-        0: "None",
-        1: "Clean",
-        2: "Mild",
-        3: "Mild",
-        4: "Mild",
-        5: "Moderate",
-        6: "Moderate",
-        7: "Moderate",
-        8: "Severe",
-        9: "Severe",
-        10: "Severe",
-    }
-    NamesMap = {
-        "SEX/NUDITY" : "Sex & Nudity",
-        "VIOLENCE/GORE": "Violence",
-        "LANGUAGE":"Profanity",
-        "SUBSTANCE USE":"Smoking, Alchohol & Drugs",
-        "DISCUSSION TOPICS": "Discussion Topics",
-        "MESSAGE":"Message",
-    }
-    AcceptedNames = ['SEX/NUDITY','VIOLENCE/GORE','LANGUAGE','SUBSTANCE USE','DISCUSSION TOPICS','MESSAGE']
-    Details = []
-    CatData = []
-    sURLs = []
-    if '200' in str(r):
-        sSoup = BeautifulSoup(r.text, "html.parser")
-        res = sSoup.find("div", {"class":"facetwp-template"})
-        sResults = res.findAll("a")
-        print("found " + str(len(sResults)) + " results for " + videoName)
-        for sRes in sResults:
-            sURLs.append(sRes["href"])
-        print(sURLs[0])
-        NoRes = re.compile("Nothing matches your search term").findall(str(res))
-        print(NoRes)
-        if len(NoRes) == 0:
-            logger.info("Skipped No Results Phase")
-            for k in range(0,len(sURLs)):
-                if 'https://kids-in-mind.com' not in sURLs[k]:
-                    sURLs[k] = 'https://kids-in-mind.com' + sURLs[k]
-
-                resURL = sURLs[k]
-                logger.info(f"KidsInMind trying .. {resURL}")
-                response = Session.get(resURL)
-                soup = BeautifulSoup(response.text, "html.parser")
-
-                sPattern3 = r"href.*imdb.*title.(.*?)\/"
-                imdbid = str(re.compile(sPattern3).findall(str(soup)))
-
-                # Extract title from the <title> tag
-                title_tag = soup.find('title')
-                if title_tag:
-                    full_title = title_tag.text.strip()
-                    # The title now follows the format: "Movie Title [Year] [Rating] - 7.7.7"
-                    title_parts = full_title.split('[')
-                    page_title = title_parts[0].strip()
-                    page_year = title_parts[1].strip(']').strip() if len(title_parts) > 1 else None
-                    # Clean page_year to remove any non-digit characters
-                    page_year = ''.join(filter(str.isdigit, page_year)) if page_year else None
-                    logger.info(f"Extracted title: '{page_title}', year: '{page_year}'")
-                else:
-                    page_title = None
-                    page_year = None
-                    logger.warning("Failed to extract title from the page")
-
-                # Check if IMDB ID matches
-                if ID and ID in imdbid:
-                    logger.info(f"IMDB ID match found: {ID}")
-                    match_found = True
-                else:
-                    # Fallback to string similarity
-                    if page_title:
-                        similarity = string_similarity(videoName.replace("+", " "), page_title)
-                        logger.info(f"String similarity: {similarity:.2f} for '{videoName.replace('+', ' ')}' vs '{page_title}'")
-                        
-                        # If release year is provided, check if it matches
-                        if release_year and page_year:
-                            try:
-                                if str(release_year) == page_year:
-                                    similarity += 0.2
-                                    logger.info(f"Year exact match. Boosted similarity: {similarity:.2f}")
-                                elif abs(int(release_year) - int(page_year)) <= 1:
-                                    similarity += 0.1
-                                    logger.info(f"Year off by 1. Boosted similarity: {similarity:.2f}")
-                                else:
-                                    logger.info(f"Year mismatch. Release year: {release_year}, Page year: {page_year}")
-                            except ValueError:
-                                logger.warning(f"Could not compare years. Release year: {release_year}, Page year: {page_year}")
-                        
-                        if similarity > 0.8:  # You can adjust this threshold
-                            logger.info(f"Match found based on title similarity: {page_title} ({page_year})")
-                            match_found = True
-                        else:
-                            logger.info(f"No match found. Similarity {similarity:.2f} below threshold 0.8")
-                            match_found = False
-                    else:
-                        logger.warning("No page title found for similarity check")
-                        match_found = False
+Cats = {
+    0: "None",
+    1: "Clean",
+    2: "Mild",
+    3: "Mild",
+    4: "Mild",
+    5: "Moderate",
+    6: "Moderate",
+    7: "Moderate",
+    8: "Severe",
+    9: "Severe",
+    10: "Severe",
+}
+NamesMap = {
+    "SEX/NUDITY" : "Sex & Nudity",
+    "VIOLENCE/GORE": "Violence",
+    "LANGUAGE":"Profanity",
+    "SUBSTANCE USE":"Smoking, Alchohol & Drugs",
+    "DISCUSSION TOPICS": "Discussion Topics",
+    "MESSAGE":"Message",
+}
+AcceptedNames = ['SEX/NUDITY','VIOLENCE/GORE','LANGUAGE','SUBSTANCE USE','DISCUSSION TOPICS','MESSAGE']
+
+IMDB_LINK_RE = re.compile(r"href.*imdb.*title.(.*?)\/")
+NO_RESULTS = "Nothing matches your search term"
+MATCH_THRESHOLD = titles.MATCH_THRESHOLD
+
+# Candidate pages fetched at once while resolving a search
+CANDIDATE_WORKERS = int(os.environ.get('KIDSINMIND_CANDIDATE_WORKERS', 3))
+# How long a resolved search term -> title page mapping is reused
+RESOLVED_TTL = float(os.environ.get('KIDSINMIND_RESOLVED_TTL', 24 * 3600))
+RESOLVED_MAX_ENTRIES = 1024
 
-                if match_found:
-                    logger.info(f"Processing match: {page_title}")
-                    title = page_title
+# Only these subtrees are built; the rest of each page is skipped by the parser
+SEARCH_RESULTS = SoupStrainer("div", attrs={"class": parsing.has_class("facetwp-template")})
+REVIEW_BLOCKS = SoupStrainer("div", attrs={"class": parsing.has_class("et_pb_text_inner")})
 
-                    ratingstr = soup.title.string
-                    sPattern =  r"(\d)\.(\d)\.(\d)"
-                    aMatches = re.compile(sPattern).findall(ratingstr)
+def split_title(full_title):
+    """(title, year) from "Movie Title [Year] [Rating] - 7.7.7"."""
+    title_parts = full_title.split('[')
+    title = title_parts[0].strip()
+    year = title_parts[1].strip(']').strip() if len(title_parts) > 1 else None
+    # Clean year to remove any non-digit characters
+    year = ''.join(filter(str.isdigit, year)) if year else None
+    return title, year
 
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_search_results(html, url):
+    """(link, link text) of each search result, or None when the site reports no matches."""
+    res = parsing.make_soup(html, SEARCH_RESULTS).find("div", {"class":"facetwp-template"})
+    if res is None:
+        raise upstream.ParseError(f"KidsInMind search results markup not found on {url}")
+    if NO_RESULTS in str(res):
+        return None
+    return [(a["href"], a.get_text(" ", strip=True)) for a in res.findAll("a")]
+
+def rank_candidates(results, videoName, release_year=None):
+    """Result URLs, most promising first, judged on the link text alone."""
+    query = titles.Title(videoName)
+    scored = []
+    for href, text in results:
+        if 'https://kids-in-mind.com' not in href:
+            href = 'https://kids-in-mind.com' + href
+        scored.append((titles.score(query, titles.Title(*split_title(text)), release_year), href))
+    # sorted() is stable, so equally scored results keep the site's order
+    return [href for _, href in sorted(scored, key=lambda pair: -pair[0])]
+
+
+@tracing.spanned('parse')
+def parse_title_page(html):
+    """(imdb ids, page title, page year) of a title page, without building a tree."""
+    imdbid = str(IMDB_LINK_RE.findall(html))
+    full_title = parsing.page_title(html)
+    if full_title is None:
+        return imdbid, None, None
+    page_title, page_year = split_title(full_title)
+    return imdbid, page_title, page_year
+
+
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_review_items(html, title):
+    Details = []
+    soup = parsing.make_soup(html, REVIEW_BLOCKS)
+    blocks = soup.findAll("div",{"class":"et_pb_text_inner"})
+    i=1
+    for block in blocks:
+        if block.p is not None and i <=7:
+            items = block.findAll("h2")
+            if len(items) < 1:
+                items = block.findAll("span")
+
+            for item in items:
+                xitem = item.text.replace(title,"").strip()
+                itemtxt = ''.join((x for x in xitem if not x.isdigit())).strip()
+                if itemtxt in AcceptedNames:
+                    for x in xitem:
+                        if x.isdigit():
+                            ratetxt= int(''.join(x))
+                        else:
+                            ratetxt = 0
+                    parent = item.parent
                     try:
-                        NudeRating = round(int(aMatches[0][0])/2)
+                        desc = parent.p.text
                     except:
-                        NudeRating = 0
-
-                    blocks = soup.findAll("div",{"class":"et_pb_text_inner"})
-                    i=1
-                    for block in blocks:
-                        if block.p is not None and i <=7:
-                            items = block.findAll("h2")
-                            if len(items) < 1:
-                                items = block.findAll("span")
-
-                            for item in items:
-                                xitem = item.text.replace(title,"").strip()
-                                itemtxt = ''.join((x for x in xitem if not x.isdigit())).strip()
-                                if itemtxt in AcceptedNames:
-                                    for x in xitem:
-                                        if x.isdigit():
-                                            ratetxt= int(''.join(x))
-                                        else:
-                                            ratetxt = 0
-                                    parent = item.parent
-                                    try:
-                                        desc = parent.p.text
-                                    except:
-                                        desc = parent.text
-
-                                    if block:
-                                        CatData = {
-                                                "name" : NamesMap[itemtxt],
-                                                "score": int(ratetxt)/2,
-                                                "description": desc,
-                                                "cat": Cats[ratetxt],
-                                                "votes": None
-                                            }
-                                        Details.append(CatData)
-                        i = i +1
-
-                    Review = {
-                        "id": ID or imdbid.replace("['","").replace("']",""),
-                        "title": title,
-                        "provider": "KidsInMind",
-                        "recommended-age": None,
-                        "review-items": Details,
-                        "review-link": resURL,
-                    }
-                    break
+                        desc = parent.text
+
+                    CatData = {
+                            "name" : NamesMap[itemtxt],
+                            "score": int(ratetxt)/2,
+                            "description": desc,
+                            "cat": Cats[ratetxt],
+                            "votes": None
+                        }
+                    Details.append(CatData)
+        i = i +1
+    return Details
+
+
+_resolved = OrderedDict()  # (ID, search term, release year) -> (title page URL, expires at)
+_resolved_lock = threading.Lock()
+
+def _cached_page_url(key):
+    with _resolved_lock:
+        entry = _resolved.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del _resolved[key]
+            return None
+        _resolved.move_to_end(key)
+        return entry[0]
+
+def _remember_page_url(key, url):
+    with _resolved_lock:
+        _resolved[key] = (url, time.monotonic() + RESOLVED_TTL)
+        _resolved.move_to_end(key)
+        while len(_resolved) > RESOLVED_MAX_ENTRIES:
+            _resolved.popitem(last=False)
+
+def fetch_candidate(url, session, deadline=None):
+    logger.info(f"KidsInMind trying .. {url}")
+    # Captured apart: only the winning candidate's fetches are validators of the result
+    with upstream.capture() as fetches:
+        response = upstream.get(url, session=session, deadline=deadline)
+    imdbid, page_title, page_year = parse_title_page(response.text)
+    return url, response.text, imdbid, page_title, page_year, fetches
+
+def match_kind(ID, videoName, release_year, imdbid, page_title, page_year):
+    """'id' for an IMDb ID match, 'title' for a title match above MATCH_THRESHOLD, else None."""
+    if ID and ID in imdbid:
+        logger.info(f"IMDB ID match found: {ID}")
+        return 'id'
+    if not page_title:
+        logger.warning("No page title found for similarity check")
+        return None
+    similarity = titles.score(videoName, titles.Title(page_title, page_year), release_year)
+    if similarity > MATCH_THRESHOLD:
+        logger.info(f"Match found based on title similarity ({similarity:.2f}): {page_title} ({page_year})")
+        return 'title'
+    logger.info(f"No match found. Similarity {similarity:.2f} below threshold {MATCH_THRESHOLD} for '{page_title}' ({page_year})")
+    return None
+
+class CandidateRace:
+    """
+        CandidateRace
+
+        Bookkeeping shared by resolve_candidate() and resolve_candidate_async():
+        which ranked candidates have come back, and whether one of them has
+        won yet. Each candidate's fetches are captured on their own, and only
+        the winner's are passed on to the caller's upstream.capture(), so
+        pages that lost the race are not revalidated with the result.
+    """
+
+    def __init__(self, ID, videoName, release_year, urls):
+        self.ID = ID
+        self.query = titles.Title(videoName)
+        self.release_year = release_year
+        self.urls = urls
+        self.queue = iter(enumerate(urls))
+        self.finished = set()
+        self.title_matches = {}
+        self.fetches = {}
+        self.errors = []
+
+    def settle(self, rank, fetch):
+        """Record the outcome of candidate rank (fetch() returns its page or raises); an IMDb ID match is returned at once."""
+        self.finished.add(rank)
+        try:
+            url, html, imdbid, page_title, page_year, fetches = fetch()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"KidsInMind candidate {self.urls[rank]} failed: {str(e)}")
+            self.errors.append(e)
+            return None
+
+        kind = match_kind(self.ID, self.query, self.release_year, imdbid, page_title, page_year)
+        if kind == 'id':
+            upstream.add_captured(fetches)
+            return url, html, imdbid, page_title
+        if kind == 'title':
+            self.title_matches[rank] = (url, html, imdbid, page_title)
+            self.fetches[rank] = fetches
+        return None
+
+    def winner(self):
+        """The best title match, once every higher-ranked candidate has been ruled out."""
+        if self.title_matches:
+            best = min(self.title_matches)
+            if all(r in self.finished for r in range(best)):
+                upstream.add_captured(self.fetches[best])
+                return self.title_matches[best]
+        return None
+
+    def outcome(self):
+        """None when nothing matched, raising the first error when every candidate failed."""
+        if self.errors and len(self.errors) == len(self.urls):
+            raise self.errors[0]
+        return None
+
+def resolve_candidate(ID, videoName, release_year, urls, session, deadline=None):
+    """
+    Fetch the ranked candidate pages on a bounded pool and return the first
+    match as (url, html, imdbid, page title), or None.
+
+    An IMDb ID match wins as soon as it arrives. A title match wins once every
+    higher-ranked candidate has been ruled out, so the ranking decides between
+    several similar titles. Candidates not yet requested by then never are.
+    """
+    race = CandidateRace(ID, videoName, release_year, urls)
+    executor = ThreadPoolExecutor(max_workers=CANDIDATE_WORKERS, thread_name_prefix='kidsinmind')
+    pending = {}
+
+    def refill():
+        # Only CANDIDATE_WORKERS pages are in flight, so nothing past a match is ever requested
+        for rank, url in race.queue:
+            # copy_context() carries the request's trace into the worker threads
+            pending[executor.submit(contextvars.copy_context().run, fetch_candidate, url, session, deadline)] = rank
+            if len(pending) >= CANDIDATE_WORKERS:
+                break
+
+    try:
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=pending.get):
+                match = race.settle(pending.pop(future), future.result)
+                if match:
+                    return match
+            match = race.winner()
+            if match:
+                return match
+            refill()
+        return race.outcome()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+async def fetch_candidate_async(url, deadline=None):
+    logger.info(f"KidsInMind trying .. {url}")
+    with upstream.capture() as fetches:
+        response = await upstream.get_async(url, deadline=deadline)
+    imdbid, page_title, page_year = parse_title_page(response.text)
+    return url, response.text, imdbid, page_title, page_year, fetches
+
+async def resolve_candidate_async(ID, videoName, release_year, urls, deadline=None):
+    """Coroutine version of resolve_candidate(), with the same window of candidates in flight as tasks."""
+    race = CandidateRace(ID, videoName, release_year, urls)
+    pending = {}
+
+    def refill():
+        for rank, url in race.queue:
+            pending[asyncio.ensure_future(fetch_candidate_async(url, deadline))] = rank
+            if len(pending) >= CANDIDATE_WORKERS:
+                break
+
+    try:
+        refill()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=pending.get):
+                match = race.settle(pending.pop(task), task.result)
+                if match:
+                    return match
+            match = race.winner()
+            if match:
+                return match
+            refill()
+        return race.outcome()
+    finally:
+        for task in pending:
+            task.cancel()
+
+def build_review(ID, imdbid, title, html, resURL):
+    logger.info(f"Processing match: {title}")
+    return {
+        "id": ID or imdbid.replace("['","").replace("']",""),
+        "title": title,
+        "provider": "KidsInMind",
+        "recommended-age": None,
+        "review-items": parse_review_items(html, title),
+        "review-link": resURL,
+    }
+
+def KidsInMindScraper(ID, videoName, release_year=None, deadline=None):
+    Session = upstream.sync_session()
+    searchName = videoName.replace(":", "%3A").replace(" ","+")
+    cache_key = (ID, videoName.lower(), str(release_year or ''))
+
+    resURL = _cached_page_url(cache_key)
+    if resURL:
+        logger.info(f"KidsInMind reusing resolved page {resURL}")
+        response = upstream.get(resURL, session=Session, deadline=deadline)
+        upstream.raise_for_outage(response)
+        if response.status_code == 200:
+            imdbid, page_title, _ = parse_title_page(response.text)
+            if page_title:
+                return build_review(ID, imdbid, page_title, response.text, resURL)
+
+    url = 'https://kids-in-mind.com/search-desktop.htm?fwp_keyword=' + searchName
+    r = upstream.get(url, session=Session, deadline=deadline)
+    upstream.raise_for_outage(r)
+    if '200' in str(r):
+        results = parse_search_results(r.text, url)
+        print("found " + str(len(results or [])) + " results for " + searchName)
+        if results is not None:
+            candidates = rank_candidates(results, videoName, release_year)
+            match = resolve_candidate(ID, videoName, release_year, candidates, Session, deadline)
+            if match:
+                resURL, html, imdbid, title = match
+                _remember_page_url(cache_key, resURL)
+                Review = build_review(ID, imdbid, title, html, resURL)
             else:
                 logger.warning("No match found in any of the search results")
                 Review = None
         else:
             logger.warning("No search results found")
-            Review = {
-                "id": ID,
-                "status": "Failed",
-                "title": videoName.replace("+", " "),
-                "provider": "KidsInMind",
-                "recommended-age": None,
-                "review-items": None,
-                "review-link": None,
-            }
+            Review = failed_review(ID, videoName)
     else:
         logger.error(f"Failed to fetch search results. Status code: {r.status_code}")
-        Review = {
-            "id": ID,
-            "status": "Failed",
-            "title": videoName.replace("+", " "),
-            "provider": "KidsInMind",
-            "recommended-age": None,
-            "review-items": None,
-            "review-link": None,
-        }
-
-    return Review
\ No newline at end of file
+        Review = failed_review(ID, videoName)
+
+    return Review
+
+async def KidsInMindScraper_async(ID, videoName, release_year=None, deadline=None):
+    """Coroutine version of KidsInMindScraper()."""
+    searchName = videoName.replace(":", "%3A").replace(" ","+")
+    cache_key = (ID, videoName.lower(), str(release_year or ''))
+
+    resURL = _cached_page_url(cache_key)
+    if resURL:
+        logger.info(f"KidsInMind reusing resolved page {resURL}")
+        response = await upstream.get_async(resURL, deadline=deadline)
+        upstream.raise_for_outage(response)
+        if response.status_code == 200:
+            imdbid, page_title, _ = parse_title_page(response.text)
+            if page_title:
+                return build_review(ID, imdbid, page_title, response.text, resURL)
+
+    url = 'https://kids-in-mind.com/search-desktop.htm?fwp_keyword=' + searchName
+    r = await upstream.get_async(url, deadline=deadline)
+    upstream.raise_for_outage(r)
+    if '200' not in str(r):
+        logger.error(f"Failed to fetch search results. Status code: {r.status_code}")
+        return failed_review(ID, videoName)
+    results = parse_search_results(r.text, url)
+    if results is None:
+        logger.warning("No search results found")
+        return failed_review(ID, videoName)
+    match = await resolve_candidate_async(ID, videoName, release_year, rank_candidates(results, videoName, release_year), deadline)
+    if not match:
+        logger.warning("No match found in any of the search results")
+        return None
+    resURL, html, imdbid, title = match
+    _remember_page_url(cache_key, resURL)
+    return build_review(ID, imdbid, title, html, resURL)
+
+def failed_review(ID, videoName):
+    return {
+        "id": ID,
+        "status": "Failed",
+        "title": videoName,
+        "provider": "KidsInMind",
+        "recommended-age": None,
+        "review-items": None,
+        "review-link": None,
+    }
@@ -0,0 +1,190 @@
+#!/usr/bin/python
+
+import argparse
+import contextlib
+import gc
+import linecache
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Opt-in allocation tracing per provider scrape, for tracking memory growth in
+# long-running server processes. Off by default: track() is then a flag check.
+# Turn it on with MEMTRACE=1, from the admin panel, or run this module to
+# drive scrapes against the stand-in upstream and print the report.
+#
+# While on, each scrape takes a tracemalloc snapshot before and after (with a
+# full collection first) and the net allocations still held are added up per
+# provider and source line. Snapshots are process-wide, so scrapes running at
+# the same time show up in each other's figures; the totals over many scrapes
+# are what to look at.
+
+MEMTRACE_FRAMES = int(os.environ.get('MEMTRACE_FRAMES', 1))
+TOP_SITES = 10
+
+# tracemalloc's own bookkeeping and import machinery are never what leaks
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+_lock = threading.Lock()
+_enabled = False
+_providers = {}
+
+
+def enabled():
+    return _enabled
+
+
+def start(frames=MEMTRACE_FRAMES):
+    global _enabled
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _providers.clear()
+        _enabled = True
+    logger.info(f"Allocation tracing started ({frames} frame(s) per allocation)")
+
+
+def stop():
+    global _enabled
+    with _lock:
+        _enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+    logger.info("Allocation tracing stopped")
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+@contextmanager
+def track(provider):
+    """Add the allocations made inside the block to provider's totals, when tracing is on."""
+    if not _enabled:
+        yield
+        return
+    before = _snapshot()
+    try:
+        yield
+    finally:
+        if tracemalloc.is_tracing():
+            # Count what the scrape kept, not garbage the collector has yet to reach
+            gc.collect()
+            _record(provider, _snapshot().compare_to(before, 'lineno'))
+
+
+def _record(provider, differences):
+    with _lock:
+        totals = _providers.setdefault(provider, {'scrapes': 0, 'net_bytes': 0, 'sites': {}})
+        totals['scrapes'] += 1
+        for stat in differences:
+            if not stat.size_diff:
+                continue
+            frame = stat.traceback[0]
+            site = f"{frame.filename}:{frame.lineno}"
+            size, count = totals['sites'].get(site, (0, 0))
+            totals['sites'][site] = (size + stat.size_diff, count + stat.count_diff)
+            totals['net_bytes'] += stat.size_diff
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current, and in bytes on macOS but KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def report(top=TOP_SITES):
+    """Tracing state, process memory and, per provider, the top sites by net allocated bytes."""
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    with _lock:
+        providers = {
+            name: {
+                'scrapes': totals['scrapes'],
+                'net_kib': round(totals['net_bytes'] / 1024, 1),
+                'net_kib_per_scrape': round(totals['net_bytes'] / 1024 / totals['scrapes'], 1),
+                'top_sites': [
+                    {'site': site, 'net_kib': round(size / 1024, 1), 'net_blocks': count}
+                    for site, (size, count) in sorted(totals['sites'].items(), key=lambda item: -item[1][0])[:top]
+                ],
+            }
+            for name, totals in sorted(_providers.items())
+        }
+    rss = rss_bytes()
+    return {
+        'enabled': _enabled,
+        'rss_mib': round(rss / (1 << 20), 1) if rss is not None else None,
+        'traced_kib': round(current / 1024, 1),
+        'traced_peak_kib': round(peak / 1024, 1),
+        'providers': providers,
+    }
+
+
+if os.environ.get('MEMTRACE') == '1':
+    start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scrape repeatedly against the stand-in upstream and report where memory goes")
+    parser.add_argument('--provider', action='append', help="provider to scrape (repeatable, default: all)")
+    parser.add_argument('--scrapes', type=int, default=50, help="scrapes per provider")
+    parser.add_argument('--top', type=int, default=TOP_SITES)
+    parser.add_argument('--frames', type=int, default=MEMTRACE_FRAMES)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    import providers
+    import standin
+    import upstream
+
+    stand_in = standin.StandInServer('instant')
+    upstream.set_standin(stand_in.start())
+    os.environ.setdefault('OMDB_API_KEY', 'standin')
+
+    def scrape(provider, n):
+        try:
+            providers.scrape(provider, 'tt0000001', f"Sample Title {n}")
+        except Exception as e:
+            logger.warning(f"{provider} scrape failed: {str(e)}")
+
+    names = args.provider or providers.PROVIDER_NAMES
+    # The scrapers print as they go; keep that out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # One untraced round first, so one-off caches (fixtures, regexes, sessions) are not reported
+        for provider in names:
+            scrape(provider, 0)
+        start(args.frames)
+        for provider in names:
+            for n in range(args.scrapes):
+                with track(provider):
+                    scrape(provider, n)
+    result = report(args.top)
+    stop()
+    stand_in.stop()
+
+    print(f" * RSS {result['rss_mib']} MiB, traced {result['traced_kib']} KiB (peak {result['traced_peak_kib']} KiB)")
+    for name, totals in result['providers'].items():
+        print(f"\n{name}: {totals['scrapes']} scrapes, net {totals['net_kib']} KiB ({totals['net_kib_per_scrape']} KiB per scrape)")
+        for site in totals['top_sites']:
+            print(f"    {site['net_kib']:>10.1f} KiB {site['net_blocks']:>8} blocks  {site['site']}")
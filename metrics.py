@@ -0,0 +1,65 @@
+import threading
+from collections import defaultdict
+
+# In-process metrics registry, exposed as JSON by the /metrics endpoint.
+# Each metric is keyed by name and an optional set of labels (host, provider, ...).
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_timings = {}
+
+
+def _label_key(labels):
+    return ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+
+
+def incr(name, value=1, **labels):
+    with _lock:
+        _counters[(name, _label_key(labels))] += value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, _label_key(labels))] = value
+
+
+def observe(name, seconds, **labels):
+    key = (name, _label_key(labels))
+    with _lock:
+        timing = _timings.get(key)
+        if timing is None:
+            timing = _timings[key] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        timing['count'] += 1
+        timing['total'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+
+
+def get_counter(name, **labels):
+    with _lock:
+        return _counters.get((name, _label_key(labels)), 0)
+
+
+def snapshot():
+    """Return all metrics as {'counters': {name: {labels: value}}, 'gauges': ..., 'timings': ...}"""
+    result = {'counters': defaultdict(dict), 'gauges': defaultdict(dict), 'timings': defaultdict(dict)}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            result['counters'][name][labels] = value
+        for (name, labels), value in _gauges.items():
+            result['gauges'][name][labels] = value
+        for (name, labels), timing in _timings.items():
+            result['timings'][name][labels] = {
+                'count': timing['count'],
+                'total': round(timing['total'], 6),
+                'avg': round(timing['total'] / timing['count'], 6) if timing['count'] else 0.0,
+                'max': round(timing['max'], 6),
+            }
+    return {kind: dict(values) for kind, values in result.items()}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
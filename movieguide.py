@@ -1,108 +1,145 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import json
-import os
+import omdb
+import parsing
+import titles
+import tracing
+import upstream
 
-def getIMDBID(name):
-    omdb_api_key = os.environ.get('OMDB_API_KEY')
-    url = f"http://www.omdbapi.com/?t={name.strip()}&apikey={omdb_api_key}&plot=full&r=json"
-    res = requests.get(url).json()
+Cats = {
+    0: "None",
+    1: "Mild",
+    2: "Moderate",
+    3: "Severe"
+}
 
-    if res.get("Response") != 'False':
-        return res.get("imdbID")
-    else:
-        print("Couldn't find IMDB ID")
-        return None
+NamesMap = {
+    "Dominant Worldview and Other Worldview Content/Elements:": "Dominant Worldview",
+    "Foul Language": "Language",
+    "Language": "Profanity",
+    "Violence" : "Violence",
+    "Nudity" : "Sex & Nudity",
+    "Sex": "Sex & Nudity",
+    "Alcohol Use" : "Smoking, Alchohol & Drugs",
+    "Smoking and/or Drug Use and Abuse" : "Smoking, & Alchohol & Drugs",
+    "Miscellaneous Immorality" : "Miscellaneous Immorality",
+    "Making Love":"Sex & Nudity",
+    "Nudity":"Sex & Nudity"
+    }
 
-def MovieGuideOrgScrapper(ID, videoName):
-    moviename = videoName.lower().strip().replace(" ","-").replace(":","").strip()
+CIRCLE_RED_RE = re.compile("movieguide_circle_red")
+CIRCLE_GREEN_RE = re.compile("movieguide_circle_green")
 
-    ##search for the movie 1st
-    URL = 'https://www.movieguide.org/reviews/' + moviename + '.html'
-    print(URL)
-    s = requests.Session()
-    r = s.get(URL)
-
-    Cats = {
-        0: "None",
-        1: "Mild",
-        2: "Moderate",
-        3: "Severe"
-    }
+# Only these subtrees are built; the rest of the page is skipped by the parser
+REVIEW_SECTIONS = parsing.AnyOf(
+    ("div", {"class": parsing.has_class("movieguide_review_content")}),
+    ("table", {"class": parsing.has_class("movieguide_content_summary")}),
+)
+
+def getMGDesc(descs, s):
+    for i in range(0,len(descs)):
+    #for desc in descriptions:
+        if str(s) in [descs[i].text.replace(":","").strip()]:
+            #print("found : requiring " + s + ", match with" + str(i) + "," + descs[i].text.replace(":","").strip())
+            return descs[i].next_sibling.strip()
+        #else:
+           # print("Not found : requiring " + s + ", match with"  + str(i) + "," +  descs[i].text.replace(":","").strip())
 
-    NamesMap = {
-        "Dominant Worldview and Other Worldview Content/Elements:": "Dominant Worldview",
-        "Foul Language": "Language",
-        "Language": "Profanity",
-        "Violence" : "Violence",
-        "Nudity" : "Sex & Nudity",
-        "Sex": "Sex & Nudity",
-        "Alcohol Use" : "Smoking, Alchohol & Drugs",
-        "Smoking and/or Drug Use and Abuse" : "Smoking, & Alchohol & Drugs",
-        "Miscellaneous Immorality" : "Miscellaneous Immorality",
-        "Making Love":"Sex & Nudity",
-        "Nudity":"Sex & Nudity"
-        }
 
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_review(html, URL):
+    """(title, review items) of a review page."""
     Details = []
     CatData = []
+    Soup = parsing.make_soup(html, REVIEW_SECTIONS)
+    review_content = Soup.find("div",{"class":"movieguide_review_content"})
+    classifications = Soup.find("table", {"class":"movieguide_content_summary"})
+    if not review_content or not classifications:
+        raise upstream.ParseError(f"MovieGuide review markup not found on {URL}")
+    descriptions = review_content.findAll("div",{"class":"movieguide_subheading"})
+    title = parsing.page_title(html).split("|")[0].split("-")[0].strip()
+    #print(sSoup)
+    matches = classifications.findAll("tr")
+    #print(matches)
+    for match in matches:
+        #print(match.text)
+        #if match.text.strip() in ["Nudity"]:
+        if match.text.replace("\n","").strip() != 'NoneLightModerateHeavy':
+            #print(match.text)
+            ele = match.findAll("div")
+            #print(ele)
+            for i in range(0,4):
+                aMatches = CIRCLE_RED_RE.findall(str(ele[i]))
+                bMatches = CIRCLE_GREEN_RE.findall(str(ele[i]))
+
+                if aMatches or bMatches:
+                    CatData = {
+                    "name" : NamesMap[str(match.text.replace("\n","").strip())],
+                    "score": i,
+                    "description": getMGDesc(descriptions, match.text.replace("\n","").strip()),
+                    "cat": Cats.get(i),
+                    "votes": None
+                    }
+                #print(CatData)
+            Details.append(CatData)
+                #print(Cats[i])
+                #print("-------------------------------------------------------")
+
+    #print(Details)
+    return title, Details
 
-    def getMGDesc(descs, s):
-        for i in range(0,len(descs)):
-        #for desc in descriptions:
-            if str(s) in [descs[i].text.replace(":","").strip()]:
-                #print("found : requiring " + s + ", match with" + str(i) + "," + descs[i].text.replace(":","").strip())
-                return descs[i].next_sibling.strip()
-            #else:
-               # print("Not found : requiring " + s + ", match with"  + str(i) + "," +  descs[i].text.replace(":","").strip())
 
+def MovieGuideOrgScrapper(ID, videoName, deadline=None):
+    moviename = titles.slug(videoName)
 
+    ##search for the movie 1st
+    URL = 'https://www.movieguide.org/reviews/' + moviename + '.html'
+    print(URL)
+    s = upstream.sync_session()
+    r = upstream.get(URL, session=s, deadline=deadline)
+    upstream.raise_for_outage(r)
 
     if '200' in str(r):
-        Soup = BeautifulSoup(r.text, "html.parser")
-        descriptions = Soup.find("div",{"class":"movieguide_review_content"}).findAll("div",{"class":"movieguide_subheading"})
-        title = Soup.title.text.split("|")[0].split("-")[0].strip()
-        #print(sSoup)
-        classifications = Soup.find("table", {"class":"movieguide_content_summary"})
-        matches = classifications.findAll("tr")
-        #print(matches)
-        for match in matches:
-            #print(match.text)
-            #if match.text.strip() in ["Nudity"]:
-            if match.text.replace("\n","").strip() != 'NoneLightModerateHeavy':
-                #print(match.text)
-                ele = match.findAll("div")
-                #print(ele)
-                for i in range(0,4):
-                    sPattern =  "movieguide_circle_red"
-                    aMatches = re.compile(sPattern).findall(str(ele[i]))
-                    sPattern2 =  "movieguide_circle_green"
-                    bMatches = re.compile(sPattern2).findall(str(ele[i]))
-
-                    if aMatches or bMatches:
-                        CatData = {
-                        "name" : NamesMap[str(match.text.replace("\n","").strip())],
-                        "score": i,
-                        "description": getMGDesc(descriptions, match.text.replace("\n","").strip()),
-                        "cat": Cats.get(i),
-                        "votes": None
-                        }
-                    #print(CatData)
-                Details.append(CatData)
-                    #print(Cats[i])
-                    #print("-------------------------------------------------------")
-
-        #print(Details)
-
-        Review = {
-            "id": getIMDBID(videoName),
-            "status" : "Sucess",
-            "title": title.title(),
-            "provider": "MovieGuide",
-            "recommended-age": None,
-            "review-items": Details,
-            "review-link": URL
-        }
-    return Review
+        title, Details = parse_review(r.text, URL)
+        return success_review(title, Details, URL, omdb.imdb_id_for(videoName, deadline=deadline, essential=False))
+    print(f"Failed to fetch review page. Status code: {r.status_code}")
+    return failed_review(ID, videoName)
+
+
+async def MovieGuideOrgScrapper_async(ID, videoName, deadline=None):
+    """Coroutine version of MovieGuideOrgScrapper()."""
+    URL = 'https://www.movieguide.org/reviews/' + titles.slug(videoName) + '.html'
+    r = await upstream.get_async(URL, deadline=deadline)
+    upstream.raise_for_outage(r)
+
+    if '200' in str(r):
+        title, Details = parse_review(r.text, URL)
+        return success_review(title, Details, URL, await omdb.imdb_id_for_async(videoName, deadline=deadline, essential=False))
+    print(f"Failed to fetch review page. Status code: {r.status_code}")
+    return failed_review(ID, videoName)
+
+
+def success_review(title, Details, URL, imdb_id):
+    return {
+        "id": imdb_id,
+        "status" : "Sucess",
+        "title": title.title(),
+        "provider": "MovieGuide",
+        "recommended-age": None,
+        "review-items": Details,
+        "review-link": URL
+    }
+
+
+def failed_review(ID, videoName):
+    return {
+        "id": ID,
+        "status": "Failed",
+        "title": videoName,
+        "provider": "MovieGuide",
+        "recommended-age": None,
+        "review-items": None,
+        "review-link": None
+    }
 
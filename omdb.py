@@ -0,0 +1,359 @@
+import asyncio
+import datetime
+import logging
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from urllib.parse import urlencode
+
+import requests
+
+import metrics
+import page_store
+import retry
+import title_index
+import upstream
+from retry import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# The one way into OMDB. Every lookup is answered from the local title index
+# when one has been imported (see title_index.py), then from the omdb_cache
+# table of the configured cache backend; concurrent misses for the same key
+# share a single upstream call; and each call is counted against the API key's
+# daily quota. Once the quota runs low only essential lookups (the ones a
+# scrape cannot start without) still reach OMDB, the rest are answered from the
+# cache alone. When it is used up every lookup is cache-only until the next
+# UTC day.
+
+OMDB_URL = 'http://www.omdbapi.com/'
+
+OMDB_DAILY_LIMIT = int(os.environ.get('OMDB_DAILY_LIMIT', 1000))
+# Calls kept back for essential lookups once the rest of the quota is spent
+OMDB_QUOTA_RESERVE = int(os.environ.get('OMDB_QUOTA_RESERVE', 100))
+OMDB_TIMEOUT = float(os.environ.get('OMDB_TIMEOUT', 5))
+
+# OMDB answers quickly or not at all; don't let it eat the scrape's deadline
+POLICY = retry.RetryPolicy(max_attempts=2, attempt_timeout=OMDB_TIMEOUT)
+
+
+def _today():
+    return datetime.datetime.utcnow().strftime('%Y-%m-%d')
+
+
+class Quota:
+    """
+        Quota
+
+        Calls made today with the OMDB API key. The count is kept in the
+        cache backend under omdb_quota_<day> so that restarts and other
+        worker processes sharing the backend see the same figure.
+    """
+
+    def __init__(self, daily_limit=OMDB_DAILY_LIMIT, reserve=OMDB_QUOTA_RESERVE):
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+        self.cache = None
+        self.day = None
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def _key(self):
+        return f"omdb_quota_{self.day}"
+
+    def _stored_used(self):
+        if self.cache is None:
+            return 0
+        try:
+            stored = self.cache.get_omdb_cache(self._key())
+        except Exception as e:
+            logger.error(f"Could not read the OMDB quota: {str(e)}")
+            return 0
+        return (stored or {}).get('used', 0)
+
+    def _roll_over(self):
+        today = _today()
+        if today != self.day:
+            self.day = today
+            self.used = self._stored_used()
+
+    def _publish(self):
+        metrics.set_gauge('omdb_quota_remaining', max(0, self.daily_limit - self.used))
+
+    def remaining(self):
+        with self.lock:
+            self._roll_over()
+            self._publish()
+            return max(0, self.daily_limit - self.used)
+
+    def allow(self, essential=True):
+        """True if a call may be made now; non-essential calls stop once only the reserve is left."""
+        floor = 0 if essential else self.reserve
+        return self.remaining() > floor
+
+    def spend(self):
+        with self.lock:
+            self._roll_over()
+            self.used = max(self.used, self._stored_used()) + 1
+            self._store()
+            self._publish()
+
+    def exhaust(self):
+        """OMDB says the limit is reached, whatever our count says."""
+        with self.lock:
+            self._roll_over()
+            self.used = max(self.used, self.daily_limit)
+            self._store()
+            self._publish()
+
+    def _store(self):
+        if self.cache is None:
+            return
+        try:
+            self.cache.set_omdb_cache(self._key(), {'used': self.used})
+        except Exception as e:
+            logger.error(f"Could not store the OMDB quota: {str(e)}")
+
+
+class OmdbClient:
+    """
+        OmdbClient
+
+        Cached, coalesced and quota-aware OMDB lookups. cache is any backend
+        with get_omdb_cache/set_omdb_cache (SqliteCache, VercelKV); without
+        one lookups always go upstream.
+    """
+
+    def __init__(self, cache=None, quota=None, api_key=None):
+        self.quota = quota or Quota()
+        self.api_key = api_key
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.configure(cache)
+
+    def configure(self, cache):
+        self.cache = cache
+        self.quota.cache = cache
+        self.quota.day = None
+
+    def by_id(self, imdb_id, deadline=None, essential=True):
+        """OMDB record for an IMDb id, or None."""
+        index = title_index.get_index()
+        data = index and self._from_index(index.by_id, imdb_id)
+        if data:
+            return data
+        return self._lookup(f"omdb_title_{imdb_id}", {'i': imdb_id}, deadline, essential)
+
+    def by_title(self, title, year=None, deadline=None, essential=True):
+        """OMDB record for a title (and release year, when known), or None."""
+        title = title.strip()
+        index = title_index.get_index()
+        data = index and self._from_index(index.by_title, title, year)
+        if data:
+            return data
+        params = {'t': title, 'y': year} if year else {'t': title}
+        return self._lookup(f"omdb_id_{title}_{year}", params, deadline, essential)
+
+    async def by_id_async(self, imdb_id, deadline=None, essential=True):
+        """Coroutine version of by_id()."""
+        index = title_index.get_index()
+        data = index and self._from_index(index.by_id, imdb_id)
+        if data:
+            return data
+        return await self._lookup_async(f"omdb_title_{imdb_id}", {'i': imdb_id}, deadline, essential)
+
+    async def by_title_async(self, title, year=None, deadline=None, essential=True):
+        """Coroutine version of by_title()."""
+        title = title.strip()
+        index = title_index.get_index()
+        data = index and self._from_index(index.by_title, title, year)
+        if data:
+            return data
+        params = {'t': title, 'y': year} if year else {'t': title}
+        return await self._lookup_async(f"omdb_id_{title}_{year}", params, deadline, essential)
+
+    def _from_index(self, lookup, *args):
+        try:
+            data = lookup(*args)
+        except Exception as e:
+            logger.error(f"Error reading the title index: {str(e)}")
+            return None
+        if data:
+            metrics.incr('omdb_lookups', outcome='title_index')
+        return data
+
+    def _cached(self, cache_key):
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get_omdb_cache(cache_key)
+        except Exception as e:
+            logger.error(f"Error reading OMDB cache: {str(e)}")
+            return None
+
+    def _claim(self, cache_key):
+        """(future, leader): the in-flight lookup for cache_key, and whether the caller has to make it."""
+        with self.lock:
+            future = self.inflight.get(cache_key)
+            leader = future is None
+            if leader:
+                future = self.inflight[cache_key] = Future()
+        if not leader:
+            metrics.incr('omdb_lookups', outcome='coalesced')
+        return future, leader
+
+    def _settle(self, cache_key, future, data=None, error=None):
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(data)
+        with self.lock:
+            self.inflight.pop(cache_key, None)
+
+    def _lookup(self, cache_key, params, deadline, essential):
+        data = self._cached(cache_key)
+        if data:
+            metrics.incr('omdb_lookups', outcome='cache')
+            return data
+
+        future, leader = self._claim(cache_key)
+        if not leader:
+            try:
+                return future.result(timeout=deadline.remaining() if deadline else None)
+            except FutureTimeout:
+                logger.warning(f"Gave up waiting for the OMDB lookup of {cache_key}")
+                return None
+
+        try:
+            data = self._fetch(cache_key, params, deadline, essential)
+        except BaseException as e:
+            self._settle(cache_key, future, error=e)
+            raise
+        self._settle(cache_key, future, data)
+        return data
+
+    async def _lookup_async(self, cache_key, params, deadline, essential):
+        # The cache backend may be a network round trip (VercelKV); keep it off the event loop
+        data = await asyncio.to_thread(self._cached, cache_key)
+        if data:
+            metrics.incr('omdb_lookups', outcome='cache')
+            return data
+
+        # Coroutines and threads coalesce on the same in-flight futures
+        future, leader = self._claim(cache_key)
+        if not leader:
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), deadline.remaining() if deadline else None)
+            except asyncio.TimeoutError:
+                logger.warning(f"Gave up waiting for the OMDB lookup of {cache_key}")
+                return None
+
+        try:
+            data = await self._fetch_async(cache_key, params, deadline, essential)
+        except BaseException as e:
+            self._settle(cache_key, future, error=e)
+            raise
+        self._settle(cache_key, future, data)
+        return data
+
+    def _request_url(self, cache_key, params, essential, replaying):
+        """URL of the OMDB call for cache_key, or None when no call may be made."""
+        api_key = self.api_key or os.environ.get('OMDB_API_KEY')
+        if not api_key and not replaying:
+            logger.error("OMDB API key not found in environment variables")
+            return None
+        if not replaying and not self.quota.allow(essential):
+            metrics.incr('omdb_lookups', outcome='cache_only')
+            logger.warning(f"OMDB quota low ({self.quota.remaining()} left), not looking up {cache_key}")
+            return None
+        return f"{OMDB_URL}?{urlencode(dict(params, apikey=api_key or ''))}"
+
+    def _fetch(self, cache_key, params, deadline, essential):
+        replaying = upstream.replaying()
+        url = self._request_url(cache_key, params, essential, replaying)
+        if url is None:
+            return None
+        try:
+            response = POLICY.call(lambda timeout: self._attempt(url, deadline, timeout, replaying), url, deadline)
+            data = _reply(response)
+        except (requests.RequestException, DeadlineExceeded, page_store.PageNotStored, ValueError) as e:
+            metrics.incr('omdb_lookups', outcome='error')
+            logger.error(f"Error fetching data from OMDB: {str(e)}")
+            return None
+        return self._accept(cache_key, data)
+
+    async def _fetch_async(self, cache_key, params, deadline, essential):
+        import aiohttp
+
+        replaying = upstream.replaying()
+        url = await asyncio.to_thread(self._request_url, cache_key, params, essential, replaying)
+        if url is None:
+            return None
+        try:
+            response = await POLICY.call_async(lambda timeout: self._attempt_async(url, deadline, timeout, replaying), url, deadline)
+            data = _reply(response)
+        except (requests.RequestException, aiohttp.ClientError, asyncio.TimeoutError, DeadlineExceeded, page_store.PageNotStored, ValueError) as e:
+            metrics.incr('omdb_lookups', outcome='error')
+            logger.error(f"Error fetching data from OMDB: {str(e)}")
+            return None
+        return await asyncio.to_thread(self._accept, cache_key, data)
+
+    def _accept(self, cache_key, data):
+        """The record in an OMDB reply, cached; None (with the quota updated) for an error reply."""
+        if data.get('Response') == 'True':
+            metrics.incr('omdb_lookups', outcome='fetched')
+            if self.cache is not None:
+                self.cache.set_omdb_cache(cache_key, data)
+            return data
+        if 'limit' in (data.get('Error') or '').lower():
+            self.quota.exhaust()
+            logger.warning(f"OMDB request limit reached: {data.get('Error')}")
+        else:
+            logger.warning(f"No OMDB data found for {cache_key}")
+        metrics.incr('omdb_lookups', outcome='not_found')
+        return None
+
+    def _attempt(self, url, deadline, timeout, replaying):
+        if not replaying:
+            self.quota.spend()
+        return upstream.fetch_once(url, deadline=deadline, timeout=timeout)
+
+    async def _attempt_async(self, url, deadline, timeout, replaying):
+        if not replaying:
+            await asyncio.to_thread(self.quota.spend)
+        return await upstream.fetch_once_async(url, deadline=deadline, timeout=timeout)
+
+
+def _reply(response):
+    # A spent or invalid key is answered with 401 and a JSON error
+    if response.status_code != 401 and not 200 <= response.status_code < 300:
+        raise requests.HTTPError(f"OMDB answered with status {response.status_code}")
+    return response.json()
+
+
+client = OmdbClient()
+
+
+def configure(cache):
+    """Share cache's omdb_cache table (and quota count) with every lookup in this process."""
+    client.configure(cache)
+
+
+def title_for(imdb_id, deadline=None):
+    data = client.by_id(imdb_id, deadline)
+    return data.get('Title') if data else None
+
+
+def imdb_id_for(title, year=None, deadline=None, essential=True):
+    data = client.by_title(title, year, deadline, essential)
+    return data.get('imdbID') if data else None
+
+
+async def title_for_async(imdb_id, deadline=None):
+    data = await client.by_id_async(imdb_id, deadline)
+    return data.get('Title') if data else None
+
+
+async def imdb_id_for_async(title, year=None, deadline=None, essential=True):
+    data = await client.by_title_async(title, year, deadline, essential)
+    return data.get('imdbID') if data else None
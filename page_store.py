@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+from time import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that must never end up in the store (e.g. the OMDB key)
+SECRET_PARAMS = {'apikey'}
+
+
+class PageNotStored(LookupError):
+    pass
+
+
+def normalize_url(url):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+
+class StoredResponse:
+    """Minimal requests-style response rebuilt from a stored page, used when replaying."""
+
+    def __init__(self, url, content, status_code=200, content_type=None):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type} if content_type else {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise PageNotStored(f"{self.status_code} for {self.url}")
+
+    def __repr__(self):
+        return f"<Response [{self.status_code}]>"
+
+
+class PageStore:
+    """
+        PageStore
+
+        Raw upstream responses on disk, decoupled from parsing. Bodies are
+        gzip-compressed and stored once per content hash under
+        objects/ab/cd/<sha256>.gz; an SQLite index maps (url, fetched_at)
+        to the body's digest, so refetching an unchanged page costs one
+        index row and no extra disk space.
+    """
+
+    _create_sql = (
+        'CREATE TABLE IF NOT EXISTS pages '
+        '(url TEXT, fetched_at REAL, digest TEXT, status INTEGER, content_type TEXT, size INTEGER, '
+        'PRIMARY KEY (url, fetched_at))'
+    )
+    _latest_sql = 'SELECT url, fetched_at, digest, status, content_type, size FROM pages WHERE url = ? ORDER BY fetched_at DESC LIMIT 1'
+    _insert_sql = 'INSERT OR REPLACE INTO pages (url, fetched_at, digest, status, content_type, size) VALUES (?, ?, ?, ?, ?, ?)'
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.db_path = os.path.join(root, 'index.sqlite')
+        with self._get_conn() as conn:
+            conn.execute(self._create_sql)
+
+    def _get_conn(self):
+        return sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:4], f"{digest}.gz")
+
+    def put(self, url, content, status=200, content_type=None, fetched_at=None):
+        """Store a response body and return its digest."""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial object
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(gzip.compress(content))
+            os.replace(tmp_path, path)
+        with self._get_conn() as conn:
+            conn.execute(self._insert_sql, (normalize_url(url), fetched_at or time(), digest, status, content_type, len(content)))
+        return digest
+
+    def read(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def latest(self, url):
+        """Return the newest index row for url as a dict, or None."""
+        with self._get_conn() as conn:
+            row = conn.execute(self._latest_sql, (normalize_url(url),)).fetchone()
+        if not row:
+            return None
+        return dict(zip(('url', 'fetched_at', 'digest', 'status', 'content_type', 'size'), row))
+
+    def response_for(self, url):
+        page = self.latest(url)
+        if page is None:
+            raise PageNotStored(f"No stored page for {normalize_url(url)}")
+        return StoredResponse(url, self.read(page['digest']), page['status'], page['content_type'])
+
+    def stats(self):
+        with self._get_conn() as conn:
+            pages, urls, objects, size = conn.execute(
+                'SELECT COUNT(*), COUNT(DISTINCT url), COUNT(DISTINCT digest), COALESCE(SUM(size), 0) FROM pages'
+            ).fetchone()
+        return {'pages': pages, 'urls': urls, 'objects': objects, 'raw_bytes': size}
+
+
+def default_root():
+    # Serverless instances only get a throwaway /tmp, so the store is opt-in there
+    if os.environ.get('PAGE_STORE_DIR'):
+        return os.environ['PAGE_STORE_DIR']
+    if os.environ.get('VERCEL_ENV'):
+        return None
+    return 'page_store'
+
+
+_store = None
+
+
+def get_store():
+    """Return the process-wide store, or None when page storing is disabled."""
+    global _store
+    if _store is None:
+        root = default_root()
+        if root:
+            _store = PageStore(root)
+    return _store
+
+
+def set_store(store):
+    global _store
+    _store = store
@@ -1,75 +1,100 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
+import html as html_lib
 import re
+import parsing
+import titles
+import tracing
+import upstream
 
+Cats = {
+    "A": "None",
+    "B": "Mild",
+    "C": "Moderate",
+    "D": "Severe"
+}
+NamesMap = {
+    "Sexual Content" : "Sex & Nudity",
+    "Violence": "Violence",
+    "Language":"Profanity",
+    "Substance Use":"Smoking, Alchohol & Drugs",
+    "Sexual Violence":"Sex & Nudity"
+}
 
-def ParentPreviewsScraper(ID,videoName):
-    Session = requests.Session()
-    strName = videoName.replace(":", "").replace(" ","-")
-    url = 'https://parentpreviews.com/movie-reviews/' + strName
-    r = Session.get(url)
-    Cats = {
-        "A": "None",
-        "B": "Mild",
-        "C": "Moderate",
-        "D": "Severe"
-    }
-    NamesMap = {
-        "Sexual Content" : "Sex & Nudity",
-        "Violence": "Violence",
-        "Language":"Profanity",
-        "Substance Use":"Smoking, Alchohol & Drugs",
-        "Sexual Violence":"Sex & Nudity"
-    }
-
-    Details, CatData, Reviews, cats = [] ,[], [] ,[]
+namePattern = re.compile(r'<b>(.*?): ?<\/b>(.*?)[\n]')
+# Markup left in the descriptions, as found in the raw page
+DESC_TAGS_RE = re.compile(r'</?(?:p|b)>|<br\s*/?>|</br>')
+
+# Only the ratings summary is built as a tree; the descriptions are read from the raw page
+CRITERIA = SoupStrainer("a", attrs={"href": "#content-details"})
+
+
+@tracing.spanned('parse')
+@parsing.releases_soups
+def parse_review_items(html):
+    Details = []
     Review = {}
+    res = parsing.make_soup(html, CRITERIA).find("a", {"href":"#content-details"})
+    blocks = res.findAll("div",{"class":"criteria_row theme_field"})
+    Desc = namePattern.findall(html)
 
-    namePattern = re.compile(r'<b>(.*?): ?<\/b>(.*?)[\n]')
+    for item in Desc:
+        Review.update({item[0] : item[1]})
 
-    if '200' in str(r):
-        Soup = BeautifulSoup(r.text, "html.parser")
-        res = Soup.find("a", {"href":"#content-details"})
-        blocks = res.findAll("div",{"class":"criteria_row theme_field"})
-        DescSoup = Soup#.find("div",{"class":"post_text_area"})
-        Desc = re.findall(namePattern,  str(DescSoup))
-
-        for item in Desc:
-            Review.update({item[0] : item[1]})
-
-        for block in blocks:
-            score = block.find("span", {"class":"criteria_mark theme_accent_bg"}).text.replace("-","").strip()
-
-            # Handle 'plus' scores
-            if '+' in score:
-                base_score = score[0]
-                score_category = Cats.get(base_score, "Unknown")
-                if score_category != "Severe":
-                    # Move to the next higher category
-                    categories = list(Cats.values())
-                    next_category_index = categories.index(score_category) + 1
-                    score_category = categories[min(next_category_index, len(categories) - 1)]
+    for block in blocks:
+        score = block.find("span", {"class":"criteria_mark theme_accent_bg"}).text.replace("-","").strip()
+
+        # Handle 'plus' scores
+        if '+' in score:
+            base_score = score[0]
+            score_category = Cats.get(base_score, "Unknown")
+            if score_category != "Severe":
+                # Move to the next higher category
+                categories = list(Cats.values())
+                next_category_index = categories.index(score_category) + 1
+                score_category = categories[min(next_category_index, len(categories) - 1)]
+        else:
+            score_category = Cats.get(score, "Unknown")
+
+        try:
+            if Review[block.span.text.strip()]:
+                x = Review[block.span.text.strip()]
             else:
-                score_category = Cats.get(score, "Unknown")
-
-            try:
-                if Review[block.span.text.strip()]:
-                    x = Review[block.span.text.strip()]
-                else:
-                    x = ''
-            except:
                 x = ''
-                pass
+        except:
+            x = ''
+            pass
+
+        CatData = {
+            "name" : NamesMap[block.span.text],
+            "score": score,
+            "description": html_lib.unescape(DESC_TAGS_RE.sub('', x)).strip(),
+            "cat": score_category,
+            "votes": None
+        }
+
+        Details.append(CatData)
+    return Details
+
+
+def ParentPreviewsScraper(ID,videoName,deadline=None):
+    Session = upstream.sync_session()
+    strName = titles.slug(videoName)
+    url = 'https://parentpreviews.com/movie-reviews/' + strName
+    r = upstream.get(url, session=Session, deadline=deadline)
+    return review_from(r, ID, videoName, url)
+
 
-            CatData = {
-                "name" : NamesMap[block.span.text],
-                "score": score,
-                "description": x.replace("<p>","").replace("<br/>","").replace("</br>","").replace("</p>","").replace("<b>","").replace("</b>","").replace("<p>","").strip(),
-                "cat": score_category,
-                "votes": None
-            }
+async def ParentPreviewsScraper_async(ID, videoName, deadline=None):
+    """Coroutine version of ParentPreviewsScraper()."""
+    url = 'https://parentpreviews.com/movie-reviews/' + titles.slug(videoName)
+    r = await upstream.get_async(url, deadline=deadline)
+    return review_from(r, ID, videoName, url)
 
-            Details.append(CatData)
+
+def review_from(r, ID, videoName, url):
+    upstream.raise_for_outage(r)
+    if '200' in str(r):
+        Details = parse_review_items(r.text)
 
         Review = {
             "id": ID,
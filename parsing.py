@@ -0,0 +1,102 @@
+import contextvars
+import html as html_lib
+import logging
+import re
+from functools import wraps
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import Tag
+
+logger = logging.getLogger(__name__)
+
+# lxml is several times faster than the pure-Python html.parser; fall back if it is missing
+try:
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:
+    logger.warning("lxml is not installed, falling back to html.parser")
+    PARSER = 'html.parser'
+
+TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+
+def has_class(css_class):
+    """Attribute matcher for a tag whose raw class attribute contains css_class."""
+    return lambda value: value is not None and css_class in (value.split() if isinstance(value, str) else value)
+
+
+class AnyOf(SoupStrainer):
+    """
+        SoupStrainer that keeps every subtree whose root matches at least one
+        of several (name, attrs) targets, e.g. a results <div> and a <script>.
+    """
+
+    def __init__(self, *targets):
+        super().__init__()
+        self.targets = [SoupStrainer(name, attrs or {}) for name, attrs in targets]
+
+    # Beautiful Soup >= 4.13
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return any(target.allow_tag_creation(nsprefix, name, attrs) for target in self.targets)
+
+    def allow_string_creation(self, string):
+        return False
+
+    # Beautiful Soup < 4.13
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return any(target.search_tag(markup_name, markup_attrs) for target in self.targets)
+
+
+# Soups made inside the current releases_soups() call, decomposed when it returns
+_open_soups = contextvars.ContextVar('open_soups', default=None)
+
+
+def make_soup(markup, only=None):
+    """
+    Parse markup with lxml, building only the subtrees matched by `only`
+    (a SoupStrainer) when given. Everything else on the page is skipped
+    during tree construction.
+    """
+    soup = BeautifulSoup(markup, PARSER, parse_only=only)
+    soups = _open_soups.get()
+    if soups is not None:
+        soups.append(soup)
+    return soup
+
+
+def releases_soups(fn):
+    """
+    Decompose every soup fn made with make_soup() once it returns. A parsed
+    tree is a web of parent/child reference cycles, so without this it stays
+    in memory until the cyclic GC gets round to it. fn must return plain
+    values (str, not Tag or NavigableString).
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        soups = []
+        token = _open_soups.set(soups)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _open_soups.reset(token)
+            for soup in soups:
+                teardown(soup)
+    return wrapper
+
+
+def teardown(soup):
+    """Break up a parsed document so it is freed by refcounting alone."""
+    # BeautifulSoup.decompose() stops at the root object, whose next_element is
+    # never set; the document underneath has to be decomposed on its own
+    for child in list(soup.contents):
+        if isinstance(child, Tag):
+            child.decompose()
+        else:
+            child.extract()
+    soup.decompose()
+
+
+def page_title(markup):
+    """Text of the <title> tag, read straight from the markup so the head never needs parsing."""
+    match = TITLE_RE.search(markup)
+    return html_lib.unescape(match.group(1)).strip() if match else None
@@ -0,0 +1,248 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import providers
+
+logger = logging.getLogger(__name__)
+
+# Profiling /get_data in place, started from the admin panel. start() arms a
+# run for the next `requests` lookups, optionally of one provider only; when
+# they are done the aggregated result is written to PROFILE_DIR, where the
+# admin panel lists it for download. Off by default: profile() is then a
+# check of one module variable.
+#
+# Two modes:
+#   cprofile  deterministic cProfile of the handling thread (of every thread
+#             from Python 3.12 on), one profiled request at a time: requests
+#             arriving meanwhile are left out and do not count. Saved as
+#             .pstats, for pstats, snakeviz and the like.
+#   sampling  the handling thread's stack read every PROFILE_SAMPLE_INTERVAL
+#             seconds by a sampler thread, with much less slowdown than
+#             cProfile. Saved as collapsed stacks (.collapsed.txt), one
+#             "frame;frame;... count" line per stack, for flamegraph.pl or
+#             speedscope.
+#
+# Only the thread handling the request is profiled, not the provider thread
+# pools. Under async_server that thread is the event loop, so whatever else
+# the loop runs while a profiled request is in flight is included, and the
+# cache and stats work it hands to threads is not. Each server worker is
+# armed separately (the one that served the admin page), but they all save
+# to PROFILE_DIR.
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+MAX_REQUESTS = 1000
+
+CPROFILE = 'cprofile'
+SAMPLING = 'sampling'
+MODES = (CPROFILE, SAMPLING)
+EXTENSIONS = {CPROFILE: '.pstats', SAMPLING: '.collapsed.txt'}
+
+_lock = threading.Lock()
+_run = None
+
+
+class Run:
+    """
+        Run
+
+        One armed profiling run: which requests it takes (provider, the
+        canonical name, or None for any) and how many are left, and the
+        results aggregated so far, a pstats.Stats or a Counter of collapsed
+        stacks depending on the mode.
+    """
+
+    def __init__(self, mode, requests, provider=None):
+        self.mode = mode
+        self.requests = requests
+        self.provider = provider
+        self.started_at = time.time()
+        self.claimed = 0
+        self.profiled = 0
+        self.in_flight = 0
+        self.stats = None
+        self.stacks = Counter()
+
+    def claim(self, provider):
+        """Take a request for provider (a provider parameter) if the run still wants it."""
+        with _lock:
+            if self.claimed >= self.requests or (self.mode == CPROFILE and self.in_flight):
+                return False
+            if self.provider and _canonical(provider) != self.provider:
+                return False
+            self.claimed += 1
+            self.in_flight += 1
+            return True
+
+    def add(self, profiler=None, stacks=None):
+        """Aggregate one request's results; True once the run has all of its requests."""
+        with _lock:
+            if profiler is not None:
+                profiler.create_stats()
+                if self.stats is None:
+                    self.stats = pstats.Stats(profiler)
+                else:
+                    self.stats.add(profiler)
+            if stacks:
+                self.stacks.update(stacks)
+            self.profiled += 1
+            self.in_flight -= 1
+            return self.claimed >= self.requests and not self.in_flight
+
+    @property
+    def name(self):
+        started = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+        return f"{started}-{self.mode}-{self.provider or 'all'}-{os.getpid()}{EXTENSIONS[self.mode]}"
+
+    def save(self):
+        """Write the results to PROFILE_DIR; returns the file name, None when nothing was profiled."""
+        if not self.profiled:
+            return None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, self.name)
+        # Requests still in flight when a run is stopped may add to it meanwhile
+        with _lock:
+            if self.mode == CPROFILE:
+                self.stats.dump_stats(path)
+            else:
+                with open(path, 'w') as f:
+                    for stack, count in self.stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+        logger.info(f"Profile of {self.profiled} request(s) saved to {path}")
+        return self.name
+
+    def status(self):
+        return {'mode': self.mode, 'provider': self.provider, 'requests': self.requests,
+                'profiled': self.profiled, 'in_flight': self.in_flight,
+                'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))}
+
+
+class Sampler(threading.Thread):
+    """
+        Sampler
+
+        Reads one thread's stack every interval seconds until stopped and
+        counts the stacks seen, collapsed into "frame;frame;..." strings
+        from the outermost frame in.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+
+def _collapse(frame):
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+def _canonical(provider):
+    try:
+        return providers.canonical_name(provider)
+    except providers.UnknownProviderError:
+        return None
+
+
+def start(mode, requests, provider=None):
+    """Arm a run over the next requests lookups (of provider only, when given), replacing one that is armed."""
+    global _run
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    if not 0 < requests <= MAX_REQUESTS:
+        raise ValueError(f"Requests to profile must be between 1 and {MAX_REQUESTS}")
+    name = providers.canonical_name(provider) if provider else None
+    stop()
+    _run = Run(mode, requests, name)
+    logger.info(f"Profiling ({mode}) the next {requests} request(s){f' for {name}' if name else ''}")
+
+
+def stop():
+    """Disarm the current run, saving what it has profiled; returns the file name or None."""
+    global _run
+    with _lock:
+        run, _run = _run, None
+    return run.save() if run is not None else None
+
+
+def status():
+    run = _run
+    return run.status() if run is not None else None
+
+
+def _finish(run):
+    global _run
+    with _lock:
+        if _run is not run:
+            return  # stopped (and saved) meanwhile
+        _run = None
+    run.save()
+
+
+@contextmanager
+def profile(provider):
+    """Profile the lookup inside the block when a run is armed and takes it."""
+    run = _run
+    if run is None or not run.claim(provider):
+        yield
+        return
+    profiler = sampler = None
+    try:
+        if run.mode == CPROFILE:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = Sampler(threading.get_ident())
+            sampler.start()
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        done = run.add(profiler, sampler.stop() if sampler is not None else None)
+        if done:
+            _finish(run)
+
+
+def saved():
+    """[{name, size_kib, saved_at}] of the profiles in PROFILE_DIR, newest first."""
+    try:
+        names = [name for name in os.listdir(PROFILE_DIR) if name.endswith(tuple(EXTENSIONS.values()))]
+    except FileNotFoundError:
+        return []
+    stats = sorted(((name, os.stat(os.path.join(PROFILE_DIR, name))) for name in names), key=lambda item: -item[1].st_mtime)
+    return [{'name': name, 'size_kib': round(stat.st_size / 1024, 1),
+             'saved_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime))}
+            for name, stat in stats]
+
+
+def summary(name, top=30):
+    """The top functions of a saved .pstats profile by cumulative time, as pstats prints them."""
+    out = io.StringIO()
+    pstats.Stats(os.path.join(PROFILE_DIR, os.path.basename(name)), stream=out).sort_stats('cumulative').print_stats(top)
+    return out.getvalue()
@@ -0,0 +1,148 @@
+import importlib
+import os
+
+# Registry of the scrapers behind /get_data. Each provider is declared once,
+# with everything the rest of the app needs to know about it: the aliases
+# clients may pass as ?provider=, the module and functions that scrape it
+# (sync and async), how long its results are cached, and its upstream hosts
+# with their rate limits (ratelimit builds its limiters from these).
+#
+# Resolving a provider parameter is a dict lookup. A scraper module is only
+# imported the first time its provider is used, so a process serving one
+# provider never loads the other six (or curl_cffi, unless it serves IMDb).
+#
+# Cache TTLs can be overridden with CACHE_TTL_<PROVIDER>=<seconds>, e.g.
+# CACHE_TTL_IMDB=604800.
+
+# Same as SqliteCache's default caching period
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+# Parameters a scraper may take, in the order scrape() is called with them
+SCRAPE_PARAMS = ('imdb_id', 'video_name', 'release_year', 'deadline')
+
+# Provider parameters resolved by substring match, remembered up to this many
+MAX_REMEMBERED_ALIASES = 1024
+
+
+class UnknownProviderError(ValueError):
+    pass
+
+
+class Provider:
+    """
+        Provider
+
+        One scraper as the rest of the app sees it. module is imported on
+        first use; fetch and fetch_async name its scraper functions, which
+        take the SCRAPE_PARAMS listed in params. page_fetcher names a
+        function for re-fetching the provider's pages when the default
+        upstream client will not do (revalidate.py); session and
+        async_session name the functions returning the sessions its
+        scraper fetches with, when they are its own rather than upstream's.
+        origin is where its pages are fetched from, for warm-up to connect to.
+    """
+
+    def __init__(self, name, module, fetch, fetch_async, hosts, origin, aliases=(), params=('imdb_id', 'video_name', 'deadline'),
+                 ttl=DEFAULT_TTL, rate=2.0, burst=4, max_concurrency=4, page_fetcher=None, session=None, async_session=None):
+        self.name = name
+        self.module = module
+        self.fetch = fetch
+        self.fetch_async = fetch_async
+        self.hosts = list(hosts)
+        self.origin = origin
+        self.aliases = list(aliases)
+        self.params = params
+        self.ttl = int(os.environ.get(f"CACHE_TTL_{name.upper()}", ttl))
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.page_fetcher = page_fetcher
+        self.session = session
+        self.async_session = async_session
+
+    def load(self):
+        """The scraper module, imported on first use (importlib serialises concurrent first imports)."""
+        return importlib.import_module(self.module)
+
+    def _args(self, imdb_id, video_name, release_year, deadline):
+        values = dict(zip(SCRAPE_PARAMS, (imdb_id, video_name, release_year, deadline)))
+        return [values[param] for param in self.params]
+
+    def scrape(self, imdb_id, video_name, release_year=None, deadline=None):
+        return getattr(self.load(), self.fetch)(*self._args(imdb_id, video_name, release_year, deadline))
+
+    async def scrape_async(self, imdb_id, video_name, release_year=None, deadline=None):
+        return await getattr(self.load(), self.fetch_async)(*self._args(imdb_id, video_name, release_year, deadline))
+
+    def __repr__(self):
+        return f"<Provider {self.name}>"
+
+
+PROVIDERS = [
+    Provider('imdb', 'imdb', 'imdb_parentsguide', 'imdb_parentsguide_async',
+             hosts=['imdb.com'], origin='https://www.imdb.com/', page_fetcher='fetch_response',
+             session='sync_session', async_session='async_session'),
+    Provider('kidsinmind', 'kidsinmind', 'KidsInMindScraper', 'KidsInMindScraper_async',
+             hosts=['kids-in-mind.com'], origin='https://kids-in-mind.com/', aliases=['kids-in-mind'],
+             params=('imdb_id', 'video_name', 'release_year', 'deadline')),
+    Provider('dove', 'dove', 'DoveFoundationScrapper', 'DoveFoundationScrapper_async',
+             hosts=['dove.org'], origin='https://dove.org/', aliases=['dovefoundation'], params=('video_name', 'deadline')),
+    Provider('parentpreviews', 'parentpreviews', 'ParentPreviewsScraper', 'ParentPreviewsScraper_async',
+             hosts=['parentpreviews.com'], origin='https://parentpreviews.com/', aliases=['parentpreview']),
+    Provider('cring', 'cringMDB', 'cringMDBScraper', 'cringMDBScraper_async',
+             hosts=['cringemdb.com'], origin='https://cringemdb.com/', aliases=['cringmdb', 'cringemdb']),
+    Provider('commonsense', 'commonsensemedia', 'CommonSenseScrapper', 'CommonSenseScrapper_async',
+             hosts=['commonsensemedia.org'], origin='https://www.commonsensemedia.org/', aliases=['csm', 'commonsensemedia']),
+    Provider('movieguide', 'movieguide', 'MovieGuideOrgScrapper', 'MovieGuideOrgScrapper_async',
+             hosts=['movieguide.org'], origin='https://www.movieguide.org/', aliases=['movieguideorg']),
+]
+
+PROVIDER_NAMES = [provider.name for provider in PROVIDERS]
+
+_by_alias = {alias: provider for provider in PROVIDERS for alias in (provider.name, *provider.aliases)}
+# Substring rules, in the order get_data has always applied them ("imdb" wins over everything else)
+_substrings = [(alias, provider) for provider in PROVIDERS for alias in (provider.name, *provider.aliases)]
+
+
+def get(provider):
+    """The Provider for a provider parameter (a name or alias, e.g. csm, or a string containing one, e.g. dove.org)."""
+    found = _by_alias.get(provider)
+    if found is not None:
+        return found
+    found = next((candidate for alias, candidate in _substrings if alias in provider), None)
+    if found is None:
+        raise UnknownProviderError(f"Unknown provider: {provider}")
+    if len(_by_alias) < MAX_REMEMBERED_ALIASES:
+        _by_alias[provider] = found
+    return found
+
+
+def canonical_name(provider):
+    """Map a provider parameter (e.g. csm, dovefoundation) to one of PROVIDER_NAMES."""
+    return get(provider).name
+
+
+def ttl_for(provider):
+    """Seconds results from provider stay cached, DEFAULT_TTL for a provider parameter that names none."""
+    try:
+        return get(provider).ttl
+    except UnknownProviderError:
+        return DEFAULT_TTL
+
+
+def page_fetcher(name):
+    """The provider's own page fetcher (see Provider), or None when upstream.get will do."""
+    provider = _by_alias.get(name)
+    if provider is None or not provider.page_fetcher:
+        return None
+    return getattr(provider.load(), provider.page_fetcher)
+
+
+def scrape(provider, imdb_id, video_name, release_year=None, deadline=None):
+    """Run the scraper matching provider and return its raw result dict."""
+    return get(provider).scrape(imdb_id, video_name, release_year, deadline)
+
+
+async def scrape_async(provider, imdb_id, video_name, release_year=None, deadline=None):
+    """Coroutine version of scrape(), for callers running on an event loop."""
+    return await get(provider).scrape_async(imdb_id, video_name, release_year, deadline)
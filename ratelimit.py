@@ -0,0 +1,206 @@
+import asyncio
+import collections
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+
+import metrics
+import providers
+from retry import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Default limits per upstream: sustained requests/second, burst size and
+# maximum number of requests in flight to its hosts. Providers declare theirs
+# in the providers registry.
+# Override with RATE_LIMIT_<PROVIDER>="rate,burst,max_concurrency", e.g. RATE_LIMIT_IMDB="1,2,2"
+PROVIDER_LIMITS = {
+    **{
+        provider.name: {'hosts': provider.hosts, 'rate': provider.rate, 'burst': provider.burst, 'max_concurrency': provider.max_concurrency}
+        for provider in providers.PROVIDERS
+    },
+    'omdb': {'hosts': ['omdbapi.com'], 'rate': 5.0, 'burst': 10, 'max_concurrency': 8},
+}
+
+# Longest a coroutine waiting for a connection slot sleeps before checking again
+ASYNC_WAKE_INTERVAL = 0.25
+
+
+class TokenBucket:
+    """Thread-safe token bucket. reserve() takes a token and returns how long the caller must wait for it."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens may go negative: later callers queue up behind earlier reservations
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class HostLimiter:
+    """Token bucket plus a max-concurrency semaphore for one provider's upstream hosts."""
+
+    def __init__(self, name, rate, burst, max_concurrency):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = int(max_concurrency)
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        # (loop, future) of coroutines parked in acquire_async(), woken as slots free up
+        self.async_waiters = collections.deque()
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        metrics.observe('upstream_wait_seconds', waited, provider=self.name)
+        if waited > 1:
+            logger.info(f"Waited {waited:.2f}s for an upstream slot to {self.name}")
+
+    @contextmanager
+    def acquire(self, deadline=None):
+        started = time.monotonic()
+        if not self.semaphore.acquire(timeout=deadline.remaining() if deadline else None):
+            raise DeadlineExceeded(f"Deadline exceeded waiting for a {self.name} connection slot")
+        try:
+            delay = self.bucket.reserve()
+            if deadline and delay >= deadline.remaining():
+                raise DeadlineExceeded(f"Deadline exceeded waiting for the {self.name} rate limit")
+            if delay:
+                time.sleep(delay)
+            self._record_wait(started)
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self.semaphore.release()
+        while self.async_waiters:
+            try:
+                loop, waiter = self.async_waiters.popleft()
+            except IndexError:
+                break
+            if not waiter.done():
+                loop.call_soon_threadsafe(_wake, waiter)
+                break
+
+    @asynccontextmanager
+    async def acquire_async(self, deadline=None):
+        # Shares the same semaphore and bucket as the sync path, so threads and
+        # coroutines are governed together; the event loop is never blocked.
+        # A waiting coroutine sleeps until a release wakes it rather than
+        # polling, so thousands of them cost nothing while they wait. The
+        # short timeout only covers a release racing the wait being queued.
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        while not self.semaphore.acquire(blocking=False):
+            if deadline and deadline.expired():
+                raise DeadlineExceeded(f"Deadline exceeded waiting for a {self.name} connection slot")
+            waiter = loop.create_future()
+            self.async_waiters.append((loop, waiter))
+            timeout = min(ASYNC_WAKE_INTERVAL, deadline.remaining()) if deadline else ASYNC_WAKE_INTERVAL
+            try:
+                await asyncio.wait_for(waiter, max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+        try:
+            delay = self.bucket.reserve()
+            if deadline and delay >= deadline.remaining():
+                raise DeadlineExceeded(f"Deadline exceeded waiting for the {self.name} rate limit")
+            if delay:
+                await asyncio.sleep(delay)
+            self._record_wait(started)
+            yield
+        finally:
+            self._release()
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _parse_override(value, defaults):
+    try:
+        rate, burst, max_concurrency = (float(part) for part in value.split(','))
+        return {'rate': rate, 'burst': burst, 'max_concurrency': int(max_concurrency)}
+    except ValueError:
+        logger.error(f"Invalid rate limit override '{value}', expected 'rate,burst,max_concurrency'")
+        return defaults
+
+
+def _share(limits, share):
+    if share >= 1:
+        return limits
+    return {
+        'rate': limits['rate'] * share,
+        'burst': max(1.0, limits['burst'] * share),
+        'max_concurrency': max(1, round(limits['max_concurrency'] * share)),
+    }
+
+
+def _build_limiters(share=1.0):
+    limiters = {}
+    for provider, config in PROVIDER_LIMITS.items():
+        limits = {k: config[k] for k in ('rate', 'burst', 'max_concurrency')}
+        override = os.environ.get(f"RATE_LIMIT_{provider.upper()}")
+        if override:
+            limits = _parse_override(override, limits)
+        limiter = HostLimiter(provider, **_share(limits, share))
+        for host in config['hosts']:
+            limiters[host] = limiter
+    return limiters
+
+
+_limiters = _build_limiters()
+
+
+def set_share(share):
+    """
+    Take only share of every limit in this process. Limits are per process,
+    so each of N server workers sets 1/N (see server.py).
+    """
+    global _limiters
+    _limiters = _build_limiters(share)
+
+
+def limiter_for(url):
+    host = (urlparse(url).hostname or '').lower()
+    while host:
+        limiter = _limiters.get(host)
+        if limiter:
+            return limiter
+        # Walk up the domain so www.imdb.com matches imdb.com
+        host = host.partition('.')[2]
+    return None
+
+
+@contextmanager
+def throttle(url, deadline=None):
+    limiter = limiter_for(url)
+    if limiter is None:
+        yield
+        return
+    with limiter.acquire(deadline):
+        yield
+
+
+@asynccontextmanager
+async def throttle_async(url, deadline=None):
+    limiter = limiter_for(url)
+    if limiter is None:
+        yield
+        return
+    async with limiter.acquire_async(deadline):
+        yield
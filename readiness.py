@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import omdb
+import providers
+import upstream
+
+logger = logging.getLogger(__name__)
+
+# Readiness of this worker, reported by GET /status: 200 once its warm-up has
+# finished and every registered check passes (the database answers, the
+# Redis breaker is closed, the GeoIP database opens), 503 before that.
+#
+# Warm-up runs the registered steps in order as a worker starts (server.py
+# and async_server start it), doing up front what would otherwise fall on the
+# first requests: index registers opening the database and the GeoIP reader,
+# loading the WARMUP_KEYS hottest cache entries into memory (hot_cache.py)
+# and preconnect(), which opens a connection to OMDB and to each provider in
+# WARMUP_PROVIDERS. A step that fails is logged and reported but does not
+# hold the worker back, and a warm-up still running after
+# WARMUP_TIMEOUT_SECONDS no longer does either. A process that never starts a
+# warm-up (the Flask dev server, Vercel) is ready as soon as its checks pass.
+
+WARMUP_KEYS = int(os.environ.get('WARMUP_KEYS', 100))
+# Comma-separated names (omdb or a provider) to connect to during warm-up; "all" for every one of them
+WARMUP_PROVIDERS = os.environ.get('WARMUP_PROVIDERS', 'all')
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get('WARMUP_TIMEOUT_SECONDS', 30))
+PRECONNECT_TIMEOUT_SECONDS = float(os.environ.get('PRECONNECT_TIMEOUT_SECONDS', 5))
+
+NOT_STARTED = 'not started'
+WARMING = 'warming'
+WARM = 'warm'
+
+_lock = threading.Lock()
+_checks = {}
+_steps = {}
+_warmup = {'state': NOT_STARTED, 'started_at': None, 'seconds': None, 'steps': {}}
+
+
+def add_check(name, check):
+    """Register check, a callable returning (ok, detail); raising counts as not ok."""
+    _checks[name] = check
+
+
+def add_step(name, step, step_async=None):
+    """
+    Register a warm-up step: a callable returning a short summary of what it
+    did, and optionally a coroutine function doing the same on the event
+    loop, for async_server (whose upstream sessions belong to its loop).
+    """
+    _steps[name] = (step, step_async)
+
+
+def _begin():
+    with _lock:
+        if _warmup['state'] != NOT_STARTED:
+            return False
+        _warmup.update(state=WARMING, started_at=time.time())
+    logger.info(f"Warming up: {', '.join(_steps)}")
+    return True
+
+
+def _step_done(name, started, detail=None, error=None):
+    outcome = {'ok': error is None, 'detail': detail if error is None else f"{type(error).__name__}: {error}",
+               'seconds': round(time.perf_counter() - started, 3)}
+    if error is not None:
+        logger.warning(f"Warm-up step {name} failed: {outcome['detail']}")
+    with _lock:
+        _warmup['steps'][name] = outcome
+
+
+def _end(started):
+    with _lock:
+        _warmup.update(state=WARM, seconds=round(time.perf_counter() - started, 3))
+    metrics.observe('warmup', _warmup['seconds'])
+    logger.info(f"Warm-up finished in {_warmup['seconds']}s")
+
+
+def warm_up():
+    """Run the warm-up steps in this thread (once per process)."""
+    if not _begin():
+        return
+    started = time.perf_counter()
+    for name, (step, _) in list(_steps.items()):
+        step_started = time.perf_counter()
+        try:
+            _step_done(name, step_started, step())
+        except Exception as e:
+            _step_done(name, step_started, error=e)
+    _end(started)
+
+
+async def warm_up_async():
+    """Coroutine version of warm_up(): coroutine steps run on the loop, the others in threads."""
+    if not _begin():
+        return
+    started = time.perf_counter()
+    for name, (step, step_async) in list(_steps.items()):
+        step_started = time.perf_counter()
+        try:
+            _step_done(name, step_started, await step_async() if step_async else await asyncio.to_thread(step))
+        except Exception as e:
+            _step_done(name, step_started, error=e)
+    _end(started)
+
+
+def start_warm_up():
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def status():
+    """(report, ready): the outcome of every check and the warm-up's progress."""
+    checks = {}
+    for name, check in list(_checks.items()):
+        try:
+            ok, detail = check()
+        except Exception as e:
+            ok, detail = False, f"{type(e).__name__}: {e}"
+        checks[name] = {'ok': bool(ok), 'detail': detail}
+
+    with _lock:
+        warmup = dict(_warmup, steps=dict(_warmup['steps']))
+    timed_out = warmup['state'] == WARMING and time.time() - warmup['started_at'] > WARMUP_TIMEOUT_SECONDS
+    warmup['timed_out'] = timed_out
+    warm = warmup['state'] != WARMING or timed_out
+
+    ready = warm and all(check['ok'] for check in checks.values())
+    metrics.set_gauge('ready', int(ready))
+    state = 'ready' if ready else 'unavailable' if warm else WARMING
+    return {'status': state, 'checks': checks, 'warmup': warmup}, ready
+
+
+def is_ready():
+    return status()[1]
+
+
+# Opening upstream connections ahead of the first requests. Every target is
+# connected to in the pool its fetches will use: upstream's shared sessions,
+# or the provider's own (IMDb's curl_cffi sessions, which loads the scraper
+# module and curl_cffi here rather than on the first IMDb request).
+
+def _targets():
+    """[(name, origin, provider or None)] for WARMUP_PROVIDERS."""
+    names = ['omdb', *providers.PROVIDER_NAMES] if WARMUP_PROVIDERS.strip() == 'all' else \
+        [name.strip() for name in WARMUP_PROVIDERS.split(',') if name.strip()]
+    targets = []
+    for name in names:
+        if name == 'omdb':
+            targets.append((name, omdb.OMDB_URL, None))
+        else:
+            provider = providers.get(name)
+            targets.append((provider.name, provider.origin, provider))
+    return targets
+
+
+def _session(provider, attribute):
+    session = getattr(provider, attribute) if provider else None
+    return getattr(provider.load(), session)() if session else None
+
+
+def _connect(target):
+    name, origin, provider = target
+    try:
+        upstream.preconnect(origin, _session(provider, 'session'), PRECONNECT_TIMEOUT_SECONDS)
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+async def _connect_async(target):
+    name, origin, provider = target
+    try:
+        await upstream.preconnect_async(origin, _session(provider, 'async_session'), PRECONNECT_TIMEOUT_SECONDS)
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def _summary(targets, errors):
+    failed = {name: error for (name, _, _), error in zip(targets, errors) if error}
+    summary = f"connected to {len(targets) - len(failed)} of {len(targets)}"
+    if not failed:
+        return summary
+    if len(failed) == len(targets):
+        raise ConnectionError(f"no upstream reachable: {failed}")
+    return f"{summary}, failed: {failed}"
+
+
+def preconnect():
+    """Warm-up step: open a connection to each of WARMUP_PROVIDERS, all at once."""
+    targets = _targets()
+    if not targets:
+        return "none configured"
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        errors = list(pool.map(_connect, targets))
+    return _summary(targets, errors)
+
+
+async def preconnect_async():
+    targets = _targets()
+    if not targets:
+        return "none configured"
+    errors = await asyncio.gather(*(_connect_async(target) for target in targets))
+    return _summary(targets, errors)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+"""
+    Rebuild cached provider results from the raw page store, without any network I/O.
+
+    Every cache entry is re-run through its provider's scraper with upstream in
+    replay mode, so fetches are answered from the pages stored when the title was
+    first scraped. Use it after fixing a parser or changing a field mapping.
+
+    Usage: python reparse.py [--provider imdb] [--workers 4] [--dry-run]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import page_store
+import providers
+import upstream
+from SQLiteCache import SqliteCache
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker(store_root):
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    upstream.set_replay(page_store.PageStore(store_root))
+
+
+def _stored_omdb_title(imdb_id):
+    # get_data names IMDb-keyed lookups after the OMDB title, so reuse the stored OMDB reply
+    try:
+        data = upstream.get(f"http://www.omdbapi.com/?i={imdb_id}&apikey=").json()
+        return data.get('Title')
+    except (page_store.PageNotStored, ValueError):
+        return None
+
+
+def reparse_entry(key, cached):
+    """Regenerate one cache entry in a worker process. Returns (key, result, error)."""
+    provider, _, ident = key.partition(':')
+    if ident.startswith('tt'):
+        imdb_id = ident
+        video_name = _stored_omdb_title(imdb_id) or cached.get('title')
+    else:
+        imdb_id = cached.get('id')
+        video_name = ident
+    try:
+        result = providers.scrape(provider, imdb_id, video_name)
+    except Exception as e:
+        return key, None, f"{type(e).__name__}: {e}"
+    return key, result, None
+
+
+def _remaining_ttl(key, expires):
+    # Reparsing changes how a page is read, not how old it is: keep the entry's expiry
+    if expires:
+        return expires - time.time()
+    return providers.ttl_for(key.partition(':')[0])
+
+
+def reparse(db, store_root, provider=None, workers=None, dry_run=False):
+    counts = {'updated': 0, 'failed': 0, 'empty': 0}
+    workers = workers or os.cpu_count() or 1
+    expiries = {}
+
+    def handle(future):
+        key, result, error = future.result()
+        expires = expiries.pop(key)
+        if error:
+            counts['failed'] += 1
+            logger.warning(f"Could not reparse {key}: {error}")
+        elif not isinstance(result, dict) or not result.get('review-items'):
+            counts['empty'] += 1
+            logger.warning(f"Reparse of {key} produced no review items, keeping the cached result")
+        else:
+            counts['updated'] += 1
+            if not dry_run:
+                db.set(key, result, _remaining_ttl(key, expires))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(store_root,)) as executor:
+        pending = set()
+        for key in db.keys():
+            if provider and not key.startswith(f"{provider}:"):
+                continue
+            # get_entry() rather than get(), which would drop expired entries still kept for revalidation
+            cached, expires = db.get_entry(key)
+            if not cached or (expires and expires <= time.time()):
+                continue
+            expiries[key] = expires
+            pending.add(executor.submit(reparse_entry, key, cached))
+            # Keep a bounded window in flight so memory stays flat on large caches
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future)
+        for future in pending:
+            handle(future)
+
+    return counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    parser = argparse.ArgumentParser(description="Rebuild cached provider results from stored raw pages")
+    parser.add_argument('--db', default=os.environ.get('CACHE_DB_PATH', 'cache.sqlite'))
+    parser.add_argument('--store', default=page_store.default_root())
+    parser.add_argument('--provider', help="only reparse entries for this provider key prefix, e.g. imdb")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--dry-run', action='store_true', help="parse everything but leave the cache untouched")
+    args = parser.parse_args()
+
+    if not args.store or not os.path.isdir(args.store):
+        print(f'[!] Page store not found: {args.store}')
+        sys.exit(1)
+
+    counts = reparse(SqliteCache(args.db), args.store, args.provider, args.workers, args.dry_run)
+    print(f" * Reparse finished: {counts['updated']} updated, {counts['empty']} empty, {counts['failed']} failed"
+          + (" (dry run)" if args.dry_run else ""))
@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# brotli is optional; without it clients are offered gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Cache hits on /get_data are answered with bytes prepared when the result was
+# cached: the JSON body exactly as jsonify() writes it (with is_cached set),
+# its gzip and brotli encodings, and a strong ETag per encoding derived from
+# the body. Serving a hit is then a row read and a write of the stored bytes,
+# with no unpickling, JSON encoding or compression, and a request whose
+# If-None-Match still matches gets a 304 with no body at all.
+#
+# The backends keep these next to the cache entry (SqliteCache.set_response,
+# VercelKV.set_response) and drop them whenever the entry is rewritten.
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ['br', 'gzip', 'identity']
+
+
+def json_body(payload):
+    """payload encoded the way Flask's jsonify() does: sorted keys, compact, trailing newline."""
+    return (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+class EncodedResponse:
+    """
+        EncodedResponse
+
+        The stored form of one cached /get_data result: the body in every
+        encoding, the ETag of the identity body and what a cache hit needs
+        to know about the result without decoding it (meta: title,
+        sex_nudity_category, has_review_items).
+    """
+
+    __slots__ = ('etag', 'meta', 'identity', 'gzip', 'br')
+
+    def __init__(self, etag, meta, identity, gzip, br=None):
+        self.etag = etag
+        self.meta = meta
+        self.identity = identity
+        self.gzip = gzip
+        self.br = br
+
+    def as_record(self):
+        """Plain dict for the cache backends."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def body(self, encoding):
+        return getattr(self, encoding)
+
+    def tag(self, encoding):
+        # Each encoding is a different representation, so it gets its own strong ETag
+        return f'"{self.etag}"' if encoding == 'identity' else f'"{self.etag}-{encoding}"'
+
+
+def encode(payload, sex_nudity_category=None):
+    body = json_body(payload)
+    meta = {
+        'title': payload.get('title'),
+        'sex_nudity_category': sex_nudity_category,
+        'has_review_items': bool(payload.get('review-items')),
+    }
+    return EncodedResponse(
+        etag=hashlib.sha256(body).hexdigest()[:32],
+        meta=meta,
+        identity=body,
+        gzip=gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+        br=brotli.compress(body, quality=BROTLI_QUALITY) if brotli is not None else None,
+    )
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(response, accept_encoding):
+    """The encoding of response the client rates highest, ties going to the order of ENCODINGS."""
+    accepted = accepted_encodings(accept_encoding)
+    best, best_q = 'identity', 0.0
+    for encoding in ENCODINGS:
+        if response.body(encoding) is None:
+            continue
+        q = accepted.get(encoding, accepted.get('*'))
+        if q is None:
+            # identity is acceptable unless the client rules it out
+            q = 1.0 if encoding == 'identity' else 0.0
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def not_modified(response, if_none_match):
+    """True when If-None-Match names any representation of response (weak comparison, as RFC 7232 asks)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    current = {response.tag(encoding) for encoding in ENCODINGS}
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in current:
+            return True
+    return False
+
+
+def respond(response, accept_encoding=None, if_none_match=None):
+    """(status, headers, body) for serving response to a request with these headers."""
+    encoding = negotiate(response, accept_encoding)
+    headers = [('ETag', response.tag(encoding)), ('Vary', 'Accept-Encoding')]
+    if not_modified(response, if_none_match):
+        return 304, headers, b''
+    headers.append(('Content-Type', 'application/json'))
+    if encoding != 'identity':
+        headers.append(('Content-Encoding', encoding))
+    return 200, headers, response.body(encoding)
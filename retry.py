@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import random
+import sys
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Transport-level errors worth another attempt. HTTP status codes are judged
+# separately from the response, so a 404 comes back to the caller straight away.
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError, ConnectionError)
+
+RETRYABLE_STATUSES = frozenset([408, 425, 429, 500, 502, 503, 504])
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Overall time budget for one request, passed down from get_data to every upstream call."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, what="request"):
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.seconds}s exceeded before {what}")
+
+
+class RetryPolicy:
+    """
+        Retries an upstream call with full-jitter exponential backoff.
+
+        Only transport errors and RETRYABLE_STATUSES are retried, a Retry-After
+        header replaces the computed backoff, and no sleep is started that would
+        run past the caller's deadline.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=8.0, attempt_timeout=15.0, max_retry_after=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.max_retry_after = max_retry_after
+
+    def is_retryable_error(self, error):
+        if isinstance(error, RETRYABLE_ERRORS):
+            return True
+        # curl_cffi is only imported along with the IMDb provider and aiohttp by
+        # the async paths, and only then can their errors occur
+        curl = sys.modules.get('curl_cffi.requests')
+        if curl is not None and isinstance(error, curl.RequestsError):
+            return True
+        aiohttp = sys.modules.get('aiohttp')
+        return aiohttp is not None and isinstance(error, aiohttp.ClientConnectionError)
+
+    def is_retryable_response(self, response):
+        return _status(response) in RETRYABLE_STATUSES
+
+    def backoff(self, attempt, response=None):
+        retry_after = _retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def timeout(self, deadline):
+        if deadline is None:
+            return self.attempt_timeout
+        return min(self.attempt_timeout, deadline.remaining())
+
+    def _next_delay(self, attempt, url, deadline, response=None, error=None):
+        """Return the delay before the next attempt, or None if the call should give up."""
+        if error is not None and not self.is_retryable_error(error):
+            return None
+        if response is not None and not self.is_retryable_response(response):
+            return None
+        if attempt + 1 >= self.max_attempts:
+            logger.error(f"All {self.max_attempts} attempts failed for URL: {url}")
+            return None
+        delay = self.backoff(attempt, response)
+        if deadline is not None and delay >= deadline.remaining():
+            logger.warning(f"Not retrying {url}: {delay:.2f}s backoff would exceed the deadline")
+            return None
+        reason = f"status {_status(response)}" if response is not None else f"error {error}"
+        logger.info(f"Attempt {attempt + 1} for {url} failed with {reason}, retrying in {delay:.2f} seconds...")
+        metrics.incr('upstream_retries')
+        return delay
+
+    def call(self, attempt_fn, url, deadline=None):
+        """Run attempt_fn(timeout) until it returns a final response. Transport errors are re-raised once retries are exhausted."""
+        for attempt in range(self.max_attempts):
+            if deadline is not None:
+                deadline.check(f"fetching {url}")
+            try:
+                response = attempt_fn(self.timeout(deadline))
+            except Exception as e:
+                delay = self._next_delay(attempt, url, deadline, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._next_delay(attempt, url, deadline, response=response)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+
+    async def call_async(self, attempt_fn, url, deadline=None):
+        """Coroutine version of call(); backoff is awaited so the event loop keeps serving other requests."""
+        for attempt in range(self.max_attempts):
+            if deadline is not None:
+                deadline.check(f"fetching {url}")
+            try:
+                response = await attempt_fn(self.timeout(deadline))
+            except Exception as e:
+                delay = self._next_delay(attempt, url, deadline, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._next_delay(attempt, url, deadline, response=response)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+
+def _status(response):
+    return getattr(response, 'status_code', None) or getattr(response, 'status', None)
+
+
+def _retry_after(response):
+    value = (getattr(response, 'headers', None) or {}).get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Shared by every provider through upstream.get() / upstream.get_async()
+DEFAULT_POLICY = RetryPolicy()
@@ -0,0 +1,71 @@
+import hashlib
+import logging
+
+import metrics
+import providers
+import ratelimit
+import upstream
+
+logger = logging.getLogger(__name__)
+
+def page_validators(fetches):
+    """Keep the validators of provider pages, dropping OMDB lookups made during the scrape."""
+    return [fetch for fetch in fetches if _provider_of(fetch['url']) != 'omdb']
+
+
+def _provider_of(url):
+    limiter = ratelimit.limiter_for(url)
+    return limiter.name if limiter else None
+
+
+def _conditional_get(fetch, deadline):
+    headers = {}
+    if fetch.get('etag'):
+        headers['If-None-Match'] = fetch['etag']
+    if fetch.get('last_modified'):
+        headers['If-Modified-Since'] = fetch['last_modified']
+    # Some providers need their own fetcher (IMDb only answers impersonated clients)
+    fetcher = providers.page_fetcher(_provider_of(fetch['url']))
+    if fetcher:
+        return fetcher(fetch['url'], deadline, headers=headers)
+    return upstream.get(fetch['url'], deadline=deadline, headers=headers)
+
+
+def revalidate_entry(db, key, provider, deadline=None):
+    """
+        Check whether the pages behind an expired cache entry have changed.
+
+        Each page is requested with If-None-Match / If-Modified-Since. A 304, or a
+        200 whose body hashes the same as before, counts as unchanged. If every
+        page is unchanged the entry's TTL is extended and True is returned, so the
+        cached result is served without re-parsing; otherwise the caller scrapes.
+    """
+    validators = db.get_validators(key)
+    if not validators:
+        return False
+
+    refreshed = []
+    bytes_saved = 0
+    for fetch in validators:
+        try:
+            response = _conditional_get(fetch, deadline)
+        except Exception as e:
+            logger.warning(f"Revalidation of {fetch['url']} failed: {str(e)}")
+            return False
+
+        if response.status_code == 304:
+            bytes_saved += fetch.get('size') or 0
+            refreshed.append(fetch)
+        elif 200 <= response.status_code < 300 and hashlib.sha256(response.content).hexdigest() == fetch.get('hash'):
+            refreshed.append(upstream.validators_for(fetch['url'], response.content, response.headers))
+        else:
+            logger.info(f"Page changed since it was cached: {fetch['url']} (status {response.status_code})")
+            metrics.incr('revalidations', provider=provider, result='changed')
+            return False
+
+    db.touch(key, providers.ttl_for(provider))
+    db.set_validators(key, refreshed)
+    metrics.incr('revalidations', provider=provider, result='unchanged')
+    metrics.incr('revalidation_bytes_saved', bytes_saved, provider=provider)
+    logger.info(f"Revalidated {key}: {len(refreshed)} unchanged pages, {bytes_saved} bytes saved")
+    return True
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Production entry point. The master process binds the listening socket and
+# pre-forks SERVER_WORKERS workers that all accept from it. Each worker serves
+# the app with SERVER_THREADS waitress threads (SERVER_MODE=waitress) or runs
+# async_server on an event loop (SERVER_MODE=async, the threads then serve the
+# routes it hands to Flask).
+#
+# Workers import the app only after the fork, so every process opens its own
+# SQLite connections, Redis pool and upstream sessions. The SQLite cache is
+# switched to WAL first so that reads in one worker do not wait for a write in
+# another. Upstream rate limits are per process and are split between the
+# workers (ratelimit.set_share).
+#
+# Each worker warms up as it starts (readiness.py) and reports ready on /status
+# when done.
+#
+# SIGTERM or Ctrl-C drains: the master passes SIGTERM on, each worker stops
+# accepting, finishes the requests it has and exits. Workers still busy after
+# SERVER_DRAIN_SECONDS are killed. A worker that dies on its own is replaced.
+#
+#     SERVER_WORKERS=4 SERVER_THREADS=16 python server.py
+
+SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.environ.get('SERVER_PORT', 8080))
+SERVER_MODE = os.environ.get('SERVER_MODE', 'waitress')
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1))
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 8))
+# Pending connections the kernel queues on the shared socket
+SERVER_BACKLOG = int(os.environ.get('SERVER_BACKLOG', 2048))
+# Open connections per waitress worker before it stops accepting
+SERVER_CONNECTION_LIMIT = int(os.environ.get('SERVER_CONNECTION_LIMIT', 1000))
+SERVER_CHANNEL_TIMEOUT = int(os.environ.get('SERVER_CHANNEL_TIMEOUT', 120))
+SERVER_DRAIN_SECONDS = float(os.environ.get('SERVER_DRAIN_SECONDS', 30))
+SERVER_ACCESS_LOG = os.environ.get('SERVER_ACCESS_LOG') == '1'
+
+MODES = ['waitress', 'async']
+# A worker exiting sooner than this after it started is failing to boot; pause before replacing it
+MIN_WORKER_LIFETIME = 2.0
+# Grace on top of the drain time before busy workers are killed
+KILL_GRACE_SECONDS = 5.0
+
+
+def _use_wal():
+    """Put the SQLite cache in WAL mode (a property of the file) before the workers open it."""
+    if os.environ.get('VERCEL_ENV'):
+        return
+    path = os.environ.get('CACHE_DB_PATH', 'cache.sqlite')
+    try:
+        conn = sqlite3.connect(path, timeout=60)
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not switch {path} to WAL: {str(e)}")
+
+
+def _waitress_busy(server):
+    if server.task_dispatcher.queue:
+        return True
+    return any(channel.requests or channel.total_outbufs_len for channel in list(server.active_channels.values()))
+
+
+def serve_waitress(sock, args):
+    from waitress import create_server, wasyncore
+
+    import index
+    import readiness
+
+    # Reports ready on /status once done; requests are served meanwhile
+    readiness.start_warm_up()
+
+    app = index.app
+    if args.access_log:
+        from paste.translogger import TransLogger
+        app = TransLogger(app, setup_console_handler=False)
+    server = create_server(
+        app,
+        sockets=[sock],
+        threads=args.threads,
+        backlog=args.backlog,
+        connection_limit=args.connection_limit,
+        channel_timeout=args.channel_timeout,
+    )
+
+    def wait_until_idle():
+        give_up = time.monotonic() + args.drain
+        while _waitress_busy(server) and time.monotonic() < give_up:
+            time.sleep(0.1)
+        # Closing every channel (idle keep-alive ones included) empties the map and ends run()
+        server.trigger.pull_trigger(lambda: wasyncore.close_all(server._map))
+
+    def drain(signum, frame):
+        if not server.accepting:
+            return
+        # Leave the shared socket to the workers still accepting
+        server.accepting = False
+        server.del_channel()
+        threading.Thread(target=wait_until_idle, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    server.run()
+    server.task_dispatcher.shutdown(cancel_pending=False, timeout=args.drain)
+
+
+def serve_async(sock, args):
+    import asyncio
+
+    from aiohttp import web
+
+    import async_server
+
+    async def serve():
+        runner = web.AppRunner(async_server.make_app(args.threads), access_log=web.access_logger if args.access_log else None)
+        await runner.setup()
+        await web.SockSite(runner, sock, shutdown_timeout=args.drain).start()
+        stopping = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+        await stopping.wait()
+        # Stops accepting, then waits up to the drain time for requests in flight
+        await runner.cleanup()
+
+    asyncio.run(serve())
+
+
+def run_worker(sock, args):
+    import ratelimit
+    ratelimit.set_share(1 / args.workers)
+
+    if args.mode == 'async':
+        serve_async(sock, args)
+    else:
+        serve_waitress(sock, args)
+
+
+def spawn(sock, args):
+    pid = os.fork()
+    if pid:
+        return pid
+    # Ctrl-C reaches the whole process group; the master turns it into one SIGTERM per worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    code = 0
+    try:
+        run_worker(sock, args)
+    except BaseException:
+        logger.exception("Worker crashed")
+        code = 1
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+
+def serve_forever(sock, args):
+    """Keep args.workers workers running until SIGTERM/SIGINT, then drain them."""
+    workers = {}  # pid -> started at
+    stopping = []
+
+    def stop(signum, frame):
+        if not stopping:
+            print(f" * {signal.Signals(signum).name}: draining {len(workers)} worker(s), up to {args.drain:g}s")
+            stopping.append(time.monotonic() + args.drain + KILL_GRACE_SECONDS)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        workers[spawn(sock, args)] = time.monotonic()
+
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if not pid:
+            if stopping and time.monotonic() > stopping[0]:
+                for busy in workers:
+                    logger.warning(f"Worker {busy} still busy after {args.drain:g}s, killing it")
+                    os.kill(busy, signal.SIGKILL)
+                stopping[0] = float('inf')
+            time.sleep(0.1)
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, replacing it")
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        workers[spawn(sock, args)] = time.monotonic()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked worker processes (defaults come from SERVER_* variables)")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--mode', choices=MODES, default=SERVER_MODE)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help="worker processes")
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS, help="threads per worker")
+    parser.add_argument('--backlog', type=int, default=SERVER_BACKLOG)
+    parser.add_argument('--connection-limit', type=int, default=SERVER_CONNECTION_LIMIT)
+    parser.add_argument('--channel-timeout', type=int, default=SERVER_CHANNEL_TIMEOUT)
+    parser.add_argument('--drain', type=float, default=SERVER_DRAIN_SECONDS, help="seconds a worker gets to finish its requests on SIGTERM")
+    parser.add_argument('--access-log', action='store_true', default=SERVER_ACCESS_LOG)
+    args = parser.parse_args(argv)
+    args.workers = max(1, args.workers)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    sock.set_inheritable(True)
+    _use_wal()
+
+    host, port = sock.getsockname()[:2]
+    print(f" * Serving on http://{host}:{port} ({args.mode}, {args.workers} worker(s) x {args.threads} thread(s), backlog {args.backlog})")
+    print(f" * API endpoint: http://{host}:{port}/get_data")
+    print(f" * Stats dashboard: http://{host}:{port}/stats")
+    print(f" * Readiness: http://{host}:{port}/status")
+
+    if not hasattr(os, 'fork'):
+        # No pre-forking here (Windows): one worker in this process
+        args.workers = 1
+        run_worker(sock, args)
+    else:
+        serve_forever(sock, args)
+    sock.close()
+    print(" * Server stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+#!/usr/bin/python
+
+"""
+    Look up one title the way /get_data does, in-process.
+
+    Runs ParentalGuideService against the SQLite cache (CACHE_DB_PATH, or
+    --db) and prints the result followed by the time spent in each stage.
+    Nothing goes through the HTTP server, so it works with the server down.
+
+    Usage: python service.py --provider imdb (--imdb-id tt0111161 | --video-name "The Shawshank Redemption") [--release-year 1994]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import circuit
+import hot_cache
+import memtrace
+import metrics
+import omdb
+import providers
+import response_cache
+import revalidate
+import tracing
+import upstream
+from retry import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Seconds a single lookup may spend on upstream calls (OMDB and provider), retries included
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 25))
+
+# Where a successful lookup's result came from
+SOURCE_CACHE = 'cache'
+SOURCE_REVALIDATED = 'revalidated'
+SOURCE_SCRAPE = 'scrape'
+
+
+def get_sex_nudity_category(result):
+    review_items = result.get('review-items')
+    if not review_items:
+        return None
+    return next((item.get('cat') for item in review_items if item.get('name') == 'Sex & Nudity'), None)
+
+
+@contextmanager
+def timed(timings, stage):
+    """Add the seconds spent in the block to timings[stage], and a span to the request's trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        timings[stage] = timings.get(stage, 0.0) + seconds
+        tracing.add(stage, started, seconds)
+
+
+class LookupResult:
+    """
+        LookupResult
+
+        What one lookup produced: the payload for the client (the result,
+        an error, or for an encoded cache hit the stored
+        response_cache.EncodedResponse), its HTTP status, where the result
+        came from (SOURCE_*, None when there is no result) and the seconds
+        spent in each stage (resolve, cache, revalidate, scrape, store,
+        stats; stages a lookup never reached are absent).
+    """
+
+    __slots__ = ('payload', 'status_code', 'source', 'timings', 'key')
+
+    def __init__(self, payload, status_code, source=None, timings=None, key=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.source = source
+        self.timings = timings if timings is not None else {}
+        self.key = key
+
+    @property
+    def ok(self):
+        return self.status_code == 200
+
+    @property
+    def is_cached(self):
+        return self.source in (SOURCE_CACHE, SOURCE_REVALIDATED)
+
+    @property
+    def total_seconds(self):
+        return sum(self.timings.values())
+
+    @property
+    def retry_after(self):
+        return self.payload.get('retry_after') if isinstance(self.payload, dict) else None
+
+    def __repr__(self):
+        return f"<LookupResult {self.status_code} {self.source or '-'} {self.key}>"
+
+
+class ParentalGuideService:
+    """
+        ParentalGuideService
+
+        The /get_data pipeline as a plain object: resolve the title (local
+        index, then OMDB), answer from the cache or revalidate an expired
+        entry, otherwise scrape the provider, store what it returns, and
+        count the request in the stats. The Flask route, async_server, the
+        tryout page, batch requests and the command line all call it
+        in-process, so none of them loops back through HTTP.
+    """
+
+    def __init__(self, db, deadline_seconds=REQUEST_DEADLINE_SECONDS):
+        self.db = db
+        self.deadline_seconds = deadline_seconds
+        # Cache hits per key, and the hottest entries held in memory (see hot_cache.py)
+        self.hits = hot_cache.HitCounter(db)
+        self.hot = hot_cache.HotCache()
+
+    def lookup(self, imdb_id, video_name, release_year, provider, country=None, encoded=False):
+        """
+        Run the pipeline for one title. With encoded, a cache hit's payload
+        is the stored response_cache.EncodedResponse rather than a dict.
+        """
+        timings = {}
+        if not provider:
+            return LookupResult({"error": "Provider parameter is required"}, 400, timings=timings)
+
+        # Overall time budget shared by every upstream call made for this lookup
+        deadline = Deadline(self.deadline_seconds)
+
+        # If IMDB ID is not provided, look it up in the local title index or OMDB
+        if not imdb_id and video_name:
+            with timed(timings, 'resolve'):
+                omdb_data = omdb.client.by_title(video_name, release_year, deadline)
+            imdb_id, release_year = self._resolved(omdb_data, imdb_id, release_year)
+
+        key = f"{provider}:{imdb_id or video_name}"
+        hit = self.cached(key, provider, deadline, encoded, timings)
+        if hit:
+            payload, source, sex_nudity_category = hit
+            with timed(timings, 'stats'):
+                self.update_stats(True, sex_nudity_category, country)
+            return self._finish(LookupResult(payload, 200, source, timings, key))
+
+        # Get video name from OMDB if not provided
+        if not video_name:
+            with timed(timings, 'resolve'):
+                video_name = omdb.title_for(imdb_id, deadline)
+            if not video_name:
+                return self._finish(LookupResult({"error": "Could not retrieve video name from OMDB"}, 400, None, timings, key))
+
+        label = video_name or imdb_id
+        provider_name, breaker, refusal = self._scraper_for(provider, label)
+        if refusal:
+            return self._finish(LookupResult(*refusal, None, timings, key))
+
+        logger.info(f"Fetching fresh data for {label} from {provider}")
+        try:
+            with timed(timings, 'scrape'), upstream.capture() as fetches, memtrace.track(provider_name):
+                result = providers.scrape(provider, imdb_id, video_name, release_year, deadline)
+        except Exception as e:
+            return self._finish(LookupResult(*self.scrape_failed(e, breaker, provider_name, provider, label), None, timings, key))
+        breaker.record_success()
+
+        with timed(timings, 'store'):
+            payload, status_code, sex_nudity_category = self.store(key, result, fetches, provider, label)
+        if status_code == 200:
+            with timed(timings, 'stats'):
+                self.update_stats(False, sex_nudity_category, country)
+        return self._finish(LookupResult(payload, status_code, SOURCE_SCRAPE if status_code == 200 else None, timings, key))
+
+    async def lookup_async(self, imdb_id, video_name, release_year, provider, country=None, encoded=False):
+        """
+        Coroutine version of lookup(). OMDB and the provider are awaited on
+        the event loop; cache reads and writes and the stats update (SQLite
+        or a Redis round trip) are handed to worker threads.
+        """
+        timings = {}
+        if not provider:
+            return LookupResult({"error": "Provider parameter is required"}, 400, timings=timings)
+
+        deadline = Deadline(self.deadline_seconds)
+
+        if not imdb_id and video_name:
+            with timed(timings, 'resolve'):
+                omdb_data = await omdb.client.by_title_async(video_name, release_year, deadline)
+            imdb_id, release_year = self._resolved(omdb_data, imdb_id, release_year)
+
+        key = f"{provider}:{imdb_id or video_name}"
+        hit = await asyncio.to_thread(self.cached, key, provider, deadline, encoded, timings)
+        if hit:
+            payload, source, sex_nudity_category = hit
+            with timed(timings, 'stats'):
+                await asyncio.to_thread(self.update_stats, True, sex_nudity_category, country)
+            return self._finish(LookupResult(payload, 200, source, timings, key))
+
+        if not video_name:
+            with timed(timings, 'resolve'):
+                video_name = await omdb.title_for_async(imdb_id, deadline)
+            if not video_name:
+                return self._finish(LookupResult({"error": "Could not retrieve video name from OMDB"}, 400, None, timings, key))
+
+        label = video_name or imdb_id
+        provider_name, breaker, refusal = self._scraper_for(provider, label)
+        if refusal:
+            return self._finish(LookupResult(*refusal, None, timings, key))
+
+        logger.info(f"Fetching fresh data for {label} from {provider}")
+        try:
+            with timed(timings, 'scrape'), upstream.capture() as fetches, memtrace.track(provider_name):
+                result = await providers.scrape_async(provider, imdb_id, video_name, release_year, deadline)
+        except Exception as e:
+            return self._finish(LookupResult(*self.scrape_failed(e, breaker, provider_name, provider, label), None, timings, key))
+        breaker.record_success()
+
+        with timed(timings, 'store'):
+            payload, status_code, sex_nudity_category = await asyncio.to_thread(self.store, key, result, fetches, provider, label)
+        if status_code == 200:
+            with timed(timings, 'stats'):
+                await asyncio.to_thread(self.update_stats, False, sex_nudity_category, country)
+        return self._finish(LookupResult(payload, status_code, SOURCE_SCRAPE if status_code == 200 else None, timings, key))
+
+    @staticmethod
+    def _resolved(omdb_data, imdb_id, release_year):
+        if omdb_data:
+            imdb_id = omdb_data.get('imdbID')
+            if not release_year:
+                release_year = omdb_data.get('Year')
+        logger.info(f"Retrieved IMDB ID from OMDB: {imdb_id}, Release Year: {release_year}")
+        return imdb_id, release_year
+
+    @staticmethod
+    def _scraper_for(provider, label):
+        """(provider_name, breaker, None), or a refusal (payload, status_code) when the provider is unknown or its circuit is open."""
+        try:
+            provider_name = providers.canonical_name(provider)
+        except providers.UnknownProviderError as e:
+            return None, None, ({"error": str(e)}, 400)
+
+        # Fail fast while the provider's circuit breaker is open
+        breaker = circuit.get_breaker(provider_name)
+        if not breaker.allow():
+            logger.warning(f"Circuit open for {provider_name}, not scraping {label}")
+            return provider_name, breaker, ({"error": "Provider unavailable", "provider": provider_name, "retry_after": breaker.retry_after()}, 503)
+        return provider_name, breaker, None
+
+    @staticmethod
+    def _finish(result):
+        for stage, seconds in result.timings.items():
+            metrics.observe('lookup_stage', seconds, stage=stage)
+        return result
+
+    def cached(self, key, provider, deadline=None, encoded=False, timings=None):
+        """(payload, source, sex_nudity_category) for key when the cache is fresh or revalidates, else None."""
+        timings = {} if timings is None else timings
+        with timed(timings, 'cache'):
+            if encoded:
+                response = self.hot.get(key)
+                if response is not None:
+                    logger.info(f"Cache hit for key: {key} (in memory)")
+                    return self._hit(key, response, provider)
+
+                # The stored response answers a hit without unpickling or encoding the result
+                stored, expires = self.db.get_response(key)
+                if stored and (expires == 0 or expires > time.time()):
+                    logger.info(f"Cache hit for key: {key}")
+                    response = response_cache.EncodedResponse(**stored)
+                    self.hot.refresh(key, response, expires)
+                    return self._hit(key, response, provider)
+
+            cached_result, expires = self.db.get_entry(key)
+            if cached_result and (expires == 0 or expires > time.time()):
+                logger.info(f"Cache hit for key: {key}")
+                self.hits.record(key)
+                payload, sex_nudity_category = self.serve_cached(cached_result, provider, key if encoded else None)
+                return payload, SOURCE_CACHE, sex_nudity_category
+
+        # An expired entry whose upstream pages have not changed is extended instead of re-scraped
+        if cached_result:
+            with timed(timings, 'revalidate'):
+                revalidated = revalidate.revalidate_entry(self.db, key, provider, deadline)
+            if revalidated:
+                logger.info(f"Cache entry revalidated for key: {key}")
+                with timed(timings, 'cache'):
+                    self.hits.record(key)
+                    payload, sex_nudity_category = self.serve_cached(cached_result, provider, key if encoded else None)
+                return payload, SOURCE_REVALIDATED, sex_nudity_category
+        logger.info(f"Cache miss for key: {key}")
+        return None
+
+    def _hit(self, key, response, provider):
+        self.hits.record(key)
+        self._log_hit(response.meta.get('title') or 'Unknown title', response.meta.get('has_review_items'), provider)
+        return response, SOURCE_CACHE, response.meta.get('sex_nudity_category')
+
+    def preload(self, limit):
+        """Load the encoded responses of the limit most hit cache keys into memory; returns how many were loaded."""
+        loaded = 0
+        for key in self.db.hottest_keys(limit):
+            stored, expires = self.db.get_response(key)
+            if stored:
+                response = response_cache.EncodedResponse(**stored)
+            else:
+                # Entry cached before responses were stored with it
+                cached_result, expires = self.db.get_entry(key)
+                if not cached_result:
+                    continue
+                cached_result['is_cached'] = True
+                response = self.remember_response(key, cached_result, get_sex_nudity_category(cached_result))
+            if expires == 0 or expires > time.time():
+                self.hot.load(key, response, expires)
+                loaded += 1
+        return loaded
+
+    @staticmethod
+    def _log_hit(title, has_review_items, provider):
+        logger.info(f"Returning cached result for {title} from {provider}")
+        if not has_review_items:
+            logger.warning(f"No review items found in cached result for {title} from {provider}")
+
+    def serve_cached(self, cached_result, provider, key=None):
+        """
+        (payload, sex_nudity_category) for a cached result. With key, the
+        payload is its EncodedResponse, stored for the next hits.
+        """
+        self._log_hit(cached_result.get('title', 'Unknown title'), cached_result.get('review-items'), provider)
+        sex_nudity_category = get_sex_nudity_category(cached_result)
+        cached_result['is_cached'] = True
+        if key:
+            # Entry cached before responses were stored with it; encode it once for the next hits
+            return self.remember_response(key, cached_result, sex_nudity_category), sex_nudity_category
+        return cached_result, sex_nudity_category
+
+    def remember_response(self, key, payload, sex_nudity_category):
+        """Encode payload as a cache hit is served and store it with the entry; returns the EncodedResponse."""
+        response = response_cache.encode(payload, sex_nudity_category)
+        try:
+            self.db.set_response(key, response.as_record())
+        except Exception as e:
+            logger.error(f"Error storing encoded response for {key}: {str(e)}")
+        return response
+
+    @staticmethod
+    def scrape_failed(e, breaker, provider_name, provider, label):
+        breaker.record_failure(e)
+        if isinstance(e, DeadlineExceeded):
+            logger.warning(f"Gave up on {label} from {provider}: {str(e)}")
+            return {"error": "Upstream provider did not respond in time"}, 504
+        logger.error(f"Provider {provider_name} failed for {label}: {str(e)}", exc_info=True)
+        return {"error": "Provider error", "provider": provider_name}, 502
+
+    def store(self, key, result, fetches, provider, label):
+        """Check a fresh scrape result and cache it; returns (payload, status_code, sex_nudity_category)."""
+        if not result:
+            logger.info(f"No data found for {label} from {provider}")
+            return {"error": "No data found"}, 404, None
+
+        if not isinstance(result, dict):
+            logger.error(f"Invalid result format for {label} from {provider}")
+            return {"error": "Invalid result format"}, 500, None
+
+        if 'title' not in result or 'provider' not in result:
+            logger.error(f"Missing required keys in result for {label} from {provider}")
+            return {"error": "Invalid result format"}, 500, None
+
+        # Check if review-items exist and are not empty
+        review_items = result.get('review-items')
+        if not review_items:
+            logger.warning(f"No review items found for {label} from {provider}")
+        sex_nudity_category = get_sex_nudity_category(result)
+
+        # Only store in cache if review-items are not null
+        if review_items:
+            try:
+                self.db.set(key, result, providers.ttl_for(provider))
+                self.hot.discard(key)
+                self.db.set_validators(key, revalidate.page_validators(fetches))
+                # The body later hits are served with
+                self.remember_response(key, dict(result, is_cached=True), sex_nudity_category)
+                logger.info(f"Storing result in cache for {result['title']} from {provider}")
+            except Exception as e:
+                logger.error(f"Error storing result in cache: {str(e)}", exc_info=True)
+        else:
+            logger.info(f"Not storing result in cache due to null review-items for {result['title']} from {provider}")
+
+        result['is_cached'] = False
+        return result, 200, sex_nudity_category
+
+    def update_stats(self, is_cached, sex_nudity_category, country):
+        try:
+            stats = self.db.get_all_stats()
+            current_year = datetime.now().year
+            current_month = datetime.now().strftime('%Y-%m')
+            current_day = datetime.now().strftime('%Y-%m-%d')
+
+            # Initialize stats if they don't exist
+            stats['total_hits'] = stats.get('total_hits', 0) + 1
+            stats['cached_hits'] = stats.get('cached_hits', 0)
+            stats['fresh_hits'] = stats.get('fresh_hits', 0)
+
+            if is_cached:
+                stats['cached_hits'] += 1
+            else:
+                stats['fresh_hits'] += 1
+
+            # Update This Year's Statistics
+            hits_by_year = stats.get('hits_by_year', {})
+            hits_by_year[str(current_year)] = hits_by_year.get(str(current_year), 0) + 1
+            stats['hits_by_year'] = hits_by_year
+
+            # Update This Month's Statistics
+            hits_by_month = stats.get('hits_by_month', {})
+            hits_by_month[current_month] = hits_by_month.get(current_month, 0) + 1
+            stats['hits_by_month'] = hits_by_month
+
+            # Update daily hits
+            hits_by_day = stats.get('hits_by_day', {})
+            hits_by_day[current_day] = hits_by_day.get(current_day, 0) + 1
+            stats['hits_by_day'] = hits_by_day
+
+            # Update Sex & Nudity Categories
+            if sex_nudity_category:
+                sex_nudity_categories = stats.get('sex_nudity_categories', {})
+                sex_nudity_categories[sex_nudity_category] = sex_nudity_categories.get(sex_nudity_category, 0) + 1
+                stats['sex_nudity_categories'] = sex_nudity_categories
+
+            # Update Countries Using the API
+            if country:
+                countries = stats.get('countries', {})
+                countries[country] = countries.get(country, 0) + 1
+                stats['countries'] = countries
+
+            # Save all stats
+            self.db.set_stat('stats', stats)
+            logger.info(f"Updated stats: Total Hits: {stats['total_hits']}, Cached Hits: {stats['cached_hits']}, Fresh Hits: {stats['fresh_hits']}")
+        except Exception as e:
+            logger.error(f"Error updating stats: {str(e)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--provider', required=True)
+    parser.add_argument('--imdb-id')
+    parser.add_argument('--video-name')
+    parser.add_argument('--release-year')
+    parser.add_argument('--country', help="country to count the lookup under in the stats")
+    parser.add_argument('--db', default=os.environ.get('CACHE_DB_PATH', 'cache.sqlite'), help="SQLite cache")
+    args = parser.parse_args()
+    if not args.imdb_id and not args.video_name:
+        parser.error("one of --imdb-id and --video-name is required")
+
+    # imdb configures the root logger at INFO on import
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr, force=True)
+
+    from SQLiteCache import SqliteCache
+
+    db = SqliteCache(args.db)
+    omdb.configure(db)
+    result = ParentalGuideService(db).lookup(args.imdb_id, args.video_name, args.release_year, args.provider.lower(), args.country)
+
+    print(json.dumps(result.payload, indent=2))
+    print(f" * {result.status_code} from {result.source or 'nowhere'} in {result.total_seconds:.3f}s", file=sys.stderr)
+    for stage, seconds in result.timings.items():
+        print(f"   {stage:<12}{seconds:>8.3f}s", file=sys.stderr)
+    if not result.ok:
+        sys.exit(1)
@@ -0,0 +1,222 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import page_store
+
+logger = logging.getLogger(__name__)
+
+# Local stand-in for every upstream host (the providers and OMDB), used for
+# end-to-end load tests. Requests arrive as GET /<original url>, which is what
+# upstream sends once UPSTREAM_STANDIN (or upstream.set_standin) points at this
+# server. Replies come from a page store of recorded responses when one is
+# given, then from the anonymised fixtures in benchmarks/fixtures.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'fixtures')
+
+FIXTURE_ROUTES = [
+    (re.compile(r'imdb\.com/title/tt\d+/parentalguide'), 'imdb_new_structure.html'),
+    (re.compile(r'kids-in-mind\.com/search-desktop\.htm'), 'kidsinmind_search.html'),
+    (re.compile(r'kids-in-mind\.com/s/'), 'kidsinmind_title.html'),
+    (re.compile(r'dove\.org/search/'), 'dove_search.html'),
+    (re.compile(r'dove\.org/review/'), 'dove_review.html'),
+    (re.compile(r'commonsensemedia\.org/movie-reviews/'), 'commonsense_review.html'),
+    (re.compile(r'cringemdb\.com/search'), 'cringmdb_search.json'),
+    (re.compile(r'cringemdb\.com/movie/'), 'cringmdb_movie.html'),
+    (re.compile(r'movieguide\.org/reviews/'), 'movieguide_review.html'),
+    (re.compile(r'parentpreviews\.com/movie-reviews/'), 'parentpreviews_review.html'),
+]
+
+# latency/jitter in seconds; error_rate is the share of requests answered 503;
+# throttle_rate (requests/second per host, bursting to throttle_burst) answers 429 beyond it
+PROFILES = {
+    'instant': {'latency': 0.0, 'jitter': 0.0, 'error_rate': 0.0, 'throttle_rate': None, 'throttle_burst': 0},
+    'realistic': {'latency': 0.25, 'jitter': 0.15, 'error_rate': 0.01, 'throttle_rate': None, 'throttle_burst': 0},
+    'flaky': {'latency': 0.5, 'jitter': 0.4, 'error_rate': 0.15, 'throttle_rate': None, 'throttle_burst': 0},
+    'throttled': {'latency': 0.1, 'jitter': 0.05, 'error_rate': 0.0, 'throttle_rate': 5.0, 'throttle_burst': 10},
+}
+
+
+class HostThrottle:
+    """Token bucket that rejects instead of queueing, like an upstream answering 429."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Return 0 if the request may go ahead, else the seconds until a token is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+def omdb_reply(target):
+    """Synthetic OMDB answer: echoes the requested id, or resolves any title to tt0000001."""
+    query = {k: v[0] for k, v in parse_qs(urlsplit(target).query).items()}
+    imdb_id = query.get('i') or 'tt0000001'
+    return json.dumps({
+        'Title': query.get('t') or 'Sample Title 1',
+        'Year': query.get('y') or '2001',
+        'imdbID': imdb_id,
+        'Type': 'movie',
+        'Response': 'True',
+    }).encode()
+
+
+class StandInServer:
+    """
+        StandInServer
+
+        Threaded HTTP server replaying upstream responses with the latency,
+        error rate and throttling of one of PROFILES (individual settings can
+        be overridden). start() runs it on a background thread and returns the
+        base URL to hand to upstream.set_standin().
+    """
+
+    def __init__(self, profile='instant', store=None, host='127.0.0.1', port=0, **overrides):
+        self.settings = dict(PROFILES[profile], **{k: v for k, v in overrides.items() if v is not None})
+        self.store = store
+        self.fixtures = {}
+        self.throttles = {}
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='standin', daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, outcome):
+        with self.lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def _throttle_for(self, host):
+        if not self.settings['throttle_rate']:
+            return None
+        with self.lock:
+            throttle = self.throttles.get(host)
+            if throttle is None:
+                throttle = self.throttles[host] = HostThrottle(self.settings['throttle_rate'], self.settings['throttle_burst'])
+            return throttle
+
+    def _fixture(self, name):
+        body = self.fixtures.get(name)
+        if body is None:
+            with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                body = self.fixtures[name] = f.read()
+        return body
+
+    def lookup(self, target):
+        """(status, content type, body) recorded for target, or None."""
+        if self.store is not None:
+            try:
+                response = self.store.response_for(target)
+                return response.status_code, response.headers.get('Content-Type'), response.content
+            except page_store.PageNotStored:
+                pass
+        if 'omdbapi.com' in target:
+            return 200, 'application/json', omdb_reply(target)
+        for pattern, fixture in FIXTURE_ROUTES:
+            if pattern.search(target):
+                content_type = 'application/json' if fixture.endswith('.json') else 'text/html; charset=utf-8'
+                return 200, content_type, self._fixture(fixture)
+        return None
+
+    def respond(self, target):
+        """(status, headers, body) for one request, after applying the profile."""
+        settings = self.settings
+        delay = max(0.0, settings['latency'] + random.uniform(-settings['jitter'], settings['jitter']))
+        if delay:
+            time.sleep(delay)
+
+        throttle = self._throttle_for(urlsplit(target).hostname or '')
+        if throttle is not None:
+            wait = throttle.take()
+            if wait:
+                self._count('throttled')
+                return 429, {'Retry-After': str(max(1, round(wait)))}, b'Too Many Requests'
+
+        if random.random() < settings['error_rate']:
+            self._count('error')
+            return 503, {}, b'Service Unavailable'
+
+        found = self.lookup(target)
+        if found is None:
+            self._count('not_found')
+            return 404, {}, b'Not Found'
+        status, content_type, body = found
+        self._count('ok')
+        return status, {'Content-Type': content_type} if content_type else {}, body
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, headers, body = standin.respond(self.path.lstrip('/'))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stand-in upstream server for load tests")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='realistic')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--store', help="page store directory to replay recorded responses from")
+    parser.add_argument('--latency', type=float, help="override the profile's base latency (seconds)")
+    parser.add_argument('--jitter', type=float, help="override the profile's latency jitter (seconds)")
+    parser.add_argument('--error-rate', type=float, help="override the profile's 503 rate (0-1)")
+    parser.add_argument('--throttle-rate', type=float, help="override the profile's per-host request rate before 429s")
+    args = parser.parse_args()
+
+    store = page_store.PageStore(args.store) if args.store else None
+    server = StandInServer(args.profile, store, args.host, args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    print(f" * Stand-in upstream ({args.profile}) listening on {server.url}")
+    print(f" * Point the app at it with UPSTREAM_STANDIN={server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f" * Served: {server.counts}")
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+os.environ.setdefault('CACHE_DB_PATH', os.path.join(tempfile.mkdtemp(), 'cache.sqlite'))
+
+import index  # noqa: E402
+
+RESULT = {
+    'id': 'tt0000001',
+    'title': 'Sample Title',
+    'provider': 'imdb',
+    'review-items': [{'name': 'Sex & Nudity', 'score': 3, 'description': 'Sample', 'cat': 'Mild', 'votes': {}}],
+}
+
+
+def test_batch_cache_hits_count_towards_hot_keys():
+    index.db.set('imdb:tt0000001', RESULT)
+    index.service.hits.flush()
+    client = index.app.test_client()
+
+    response = client.post('/get_data/batch', json=[{'imdb_id': 'tt0000001', 'provider': 'imdb'}] * 3)
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 3
+
+    index.service.hits.flush()
+    assert index.db.hottest_keys(1) == ['imdb:tt0000001']
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+import circuit
+import dove
+import imdb
+import upstream
+from SQLiteCache import SqliteCache
+from service import ParentalGuideService
+
+# An IMDb page after a markup change: neither structure nor __NEXT_DATA__
+CHANGED_PAGE = '<html><body><div class="redesigned">Parents guide</div></body></html>'
+
+DOVE_SEARCH = '<div class="movie-cards search-cards"><a href="https://dove.org/review/sample">Sample</a></div>'
+DOVE_ARTICLE = '<html><head><title>Movie News - Dove.org</title></head><body><p>News</p></body></html>'
+DOVE_CHANGED_REVIEW = '<html><head><title>Sample Title - Dove.org</title></head><body><div class="redesigned"></div></body></html>'
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    fetched = []
+
+    def fetch_url(url, deadline=None, policy=None):
+        fetched.append(url)
+        return CHANGED_PAGE
+
+    async def fetch_url_async(url, deadline=None, policy=None):
+        return fetch_url(url, deadline, policy)
+
+    monkeypatch.setattr(imdb, 'fetch_url', fetch_url)
+    monkeypatch.setattr(imdb, 'fetch_url_async', fetch_url_async)
+    monkeypatch.setitem(circuit._breakers, 'imdb', circuit.CircuitBreaker('imdb', failure_threshold=3))
+    service = ParentalGuideService(SqliteCache(str(tmp_path / 'cache.sqlite')))
+    service.fetched = fetched
+    return service
+
+
+def test_imdb_parse_failures_open_the_breaker(service):
+    for _ in range(3):
+        result = service.lookup('tt0000001', 'Sample Title', None, 'imdb')
+        assert result.status_code == 502
+    assert circuit.get_breaker('imdb').state == circuit.OPEN
+
+    result = service.lookup('tt0000001', 'Sample Title', None, 'imdb')
+    assert result.status_code == 503
+    assert len(service.fetched) == 3
+
+
+def test_imdb_parse_failures_open_the_breaker_async(service):
+    for _ in range(3):
+        result = asyncio.run(service.lookup_async('tt0000001', 'Sample Title', None, 'imdb'))
+        assert result.status_code == 502
+    assert circuit.get_breaker('imdb').state == circuit.OPEN
+    assert asyncio.run(service.lookup_async('tt0000001', 'Sample Title', None, 'imdb')).status_code == 503
+
+
+class Response:
+    def __init__(self, url, text, status_code=200):
+        self.url, self.text, self.status_code = url, text, status_code
+
+
+@pytest.fixture
+def dove_service(tmp_path, monkeypatch):
+    monkeypatch.setitem(circuit._breakers, 'dove', circuit.CircuitBreaker('dove', failure_threshold=3))
+    service = ParentalGuideService(SqliteCache(str(tmp_path / 'cache.sqlite')))
+
+    def serve(review):
+        def get(url, session=None, deadline=None):
+            return Response(url, DOVE_SEARCH) if '/search/' in url else review(url)
+        monkeypatch.setattr(upstream, 'get', get)
+    service.serve = serve
+    return service
+
+
+@pytest.mark.parametrize('review', [
+    lambda url: Response(url, DOVE_ARTICLE),
+    lambda url: Response(url, 'Not Found', 404),
+], ids=['not a review', 'missing review'])
+def test_dove_misses_do_not_count_as_failures(dove_service, review):
+    dove_service.serve(review)
+    for _ in range(3):
+        result = dove_service.lookup(None, 'Sample Title', None, 'dove')
+        assert result.status_code == 200 and result.payload['review-items'] is None
+    assert circuit.get_breaker('dove').consecutive_failures == 0
+
+
+def test_dove_parse_failures_open_the_breaker(dove_service):
+    dove_service.serve(lambda url: Response(url, DOVE_CHANGED_REVIEW))
+    for _ in range(3):
+        assert dove_service.lookup(None, 'Sample Title', None, 'dove').status_code == 502
+    assert circuit.get_breaker('dove').state == circuit.OPEN
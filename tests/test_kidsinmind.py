@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+import pytest
+
+import kidsinmind
+import upstream
+
+ID = 'tt0000001'
+PAGES = {
+    'https://kids-in-mind.com/s/other.htm': ('tt0000002', 'Other Title', '1990'),
+    'https://kids-in-mind.com/s/sample.htm': (ID, 'Sample Title', '2001'),
+}
+URLS = list(PAGES)
+
+
+class Page:
+    def __init__(self, url):
+        self.text = url
+        upstream._record(url, 200, url.encode(), {})
+
+
+@pytest.fixture(autouse=True)
+def pages(monkeypatch):
+    monkeypatch.setattr(kidsinmind, 'parse_title_page', PAGES.get)
+
+
+def test_losing_candidates_are_not_captured(monkeypatch):
+    # The losing candidate only finishes after the race is over, like a straggler left in the pool
+    release, finished = threading.Event(), threading.Event()
+
+    def get(url, session=None, deadline=None):
+        if url == URLS[0]:
+            release.wait(5)
+            page = Page(url)
+            finished.set()
+            return page
+        return Page(url)
+
+    monkeypatch.setattr(upstream, 'get', get)
+    with upstream.capture() as fetches:
+        match = kidsinmind.resolve_candidate(ID, 'Sample Title', None, URLS, session=None)
+        release.set()
+        assert finished.wait(5)
+    assert match[0] == URLS[1]
+    assert [fetch['url'] for fetch in fetches] == [URLS[1]]
+
+
+def test_losing_candidates_are_not_captured_async(monkeypatch):
+    async def get_async(url, deadline=None):
+        return Page(url)
+
+    async def resolve():
+        with upstream.capture() as fetches:
+            match = await kidsinmind.resolve_candidate_async(None, 'Sample Title', '2001', URLS)
+        return match, fetches
+
+    monkeypatch.setattr(upstream, 'get_async', get_async)
+    match, fetches = asyncio.run(resolve())
+    assert match[0] == URLS[1]
+    assert [fetch['url'] for fetch in fetches] == [URLS[1]]
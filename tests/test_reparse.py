@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import providers
+import reparse
+from SQLiteCache import SqliteCache
+
+TTL = 3600
+KEY = 'kidsinmind:sample title'
+RESULT = {
+    'id': 'tt0000001',
+    'title': 'Sample Title',
+    'provider': 'kidsinmind',
+    'review-items': [{'name': 'Sex & Nudity', 'score': 3, 'description': 'Sample', 'cat': 'Mild', 'votes': {}}],
+}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Workers in threads, so the scraper stub below reaches them
+    monkeypatch.setattr(reparse, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(reparse, '_init_worker', lambda store_root: None)
+    monkeypatch.setattr(providers, 'scrape', lambda provider, imdb_id, video_name: dict(RESULT, title='Reparsed Title'))
+    return SqliteCache(str(tmp_path / 'cache.sqlite'))
+
+
+def test_reparsed_entry_keeps_its_expiry(db, tmp_path):
+    db.set(KEY, RESULT, TTL)
+    _, expires = db.get_entry(KEY)
+
+    counts = reparse.reparse(db, str(tmp_path), workers=1)
+    assert counts['updated'] == 1
+    value, reparsed_expires = db.get_entry(KEY)
+    assert value['title'] == 'Reparsed Title'
+    assert reparsed_expires == pytest.approx(expires, abs=1)
+
+
+def test_expired_entry_is_left_for_revalidation(db, tmp_path):
+    db.set(KEY, RESULT, -1)
+
+    counts = reparse.reparse(db, str(tmp_path), workers=1)
+    assert counts['updated'] == 0
+    assert db.get_entry(KEY)[0] == RESULT
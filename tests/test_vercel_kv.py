@@ -0,0 +1,201 @@
+import time
+
+import pytest
+
+import circuit
+import providers
+import revalidate
+import vercel_kv
+from service import SOURCE_REVALIDATED, ParentalGuideService
+from vercel_kv import VercelKV
+
+TTL = 3600
+RESULT = {
+    'id': 'tt0000001',
+    'title': 'Sample Title',
+    'provider': 'kidsinmind',
+    'review-items': [{'name': 'Sex & Nudity', 'score': 3, 'description': 'Sample', 'cat': 'Mild', 'votes': {}}],
+}
+PAGE = {'url': 'https://kids-in-mind.com/s/sample.htm', 'etag': '"v1"', 'last_modified': None, 'hash': 'x', 'size': 1000}
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """The part of the redis-py client VercelKV's cache methods use, with key expiry on clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+        self.expires_at = {}
+
+    def _live(self, key):
+        if key in self.expires_at and self.expires_at[key] <= self.clock():
+            self.data.pop(key, None)
+            self.expires_at.pop(key)
+        return key in self.data
+
+    def _encode(self, value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self.data[key] if self._live(key) else None
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = self._encode(value)
+        self.expires_at.pop(key, None)
+        if ex is not None:
+            self.expires_at[key] = self.clock() + ex
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+
+    def exists(self, key):
+        return int(self._live(key))
+
+    def expire(self, key, seconds):
+        if self._live(key):
+            self.expires_at[key] = self.clock() + seconds
+
+    def ttl(self, key):
+        if not self._live(key):
+            return -2
+        if key not in self.expires_at:
+            return -1
+        return int(self.expires_at[key] - self.clock())
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        self._live(key)
+        fields = self.data.setdefault(key, {})
+        for name, item in dict(mapping or {}, **({field: value} if field else {})).items():
+            fields[name.encode()] = self._encode(item)
+
+    def hgetall(self, key):
+        return dict(self.data[key]) if self._live(key) else {}
+
+    def zincrby(self, key, amount, member):
+        scores = self.data.setdefault(key, {})
+        scores[member] = scores.get(member, 0) + amount
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(vercel_kv.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def db(clock, monkeypatch):
+    monkeypatch.delenv('KV_URL', raising=False)
+    db = VercelKV()
+    db.redis = FakeRedis(clock)
+    return db
+
+
+def store(db, key):
+    service = ParentalGuideService(db)
+    db.set(key, RESULT, TTL)
+    db.set_validators(key, [PAGE])
+    service.remember_response(key, dict(RESULT, is_cached=True), 'Mild')
+    return service
+
+
+def test_expired_entry_is_kept_and_reports_its_expiry(db, clock):
+    store(db, 'kidsinmind:tt0000001')
+    value, expires = db.get_entry('kidsinmind:tt0000001')
+    assert value == RESULT
+    assert expires == pytest.approx(clock.now + TTL)
+    assert db.get_response('kidsinmind:tt0000001')[1] == pytest.approx(expires)
+
+    clock.now += TTL + 1
+    assert db.get('kidsinmind:tt0000001') is None
+    assert db.get_many(['kidsinmind:tt0000001']) == {}
+    assert db.get_entry('kidsinmind:tt0000001') == (RESULT, expires)
+
+    clock.now += vercel_kv.EXPIRED_GRACE_SECONDS
+    assert db.get_entry('kidsinmind:tt0000001') == (None, None)
+
+
+def test_validators_expire_with_their_entry(db):
+    store(db, 'kidsinmind:tt0000001')
+    assert db.redis.ttl('validators:kidsinmind:tt0000001') == db.redis.ttl('cache:kidsinmind:tt0000001')
+    assert db.redis.ttl('validators:kidsinmind:tt0000001') > 0
+
+
+def test_expired_entry_is_revalidated(db, clock, monkeypatch):
+    key = 'kidsinmind:tt0000001'
+    service = store(db, key)
+    clock.now += TTL + 1
+
+    requests = []
+
+    class NotModified:
+        status_code = 304
+
+    def conditional_get(fetch, deadline):
+        requests.append(fetch['url'])
+        return NotModified()
+
+    monkeypatch.setattr(revalidate, '_conditional_get', conditional_get)
+    payload, source, _ = service.cached(key, 'kidsinmind', encoded=True)
+    assert source == SOURCE_REVALIDATED
+    assert requests == [PAGE['url']]
+
+    # Extended: the entry and its stored response are fresh again
+    _, expires = db.get_entry(key)
+    assert expires == pytest.approx(clock.now + providers.ttl_for('kidsinmind'), abs=1)
+    stored, response_expires = db.get_response(key)
+    assert stored is not None and response_expires == pytest.approx(expires)
+    assert db.redis.ttl(f'validators:{key}') == db.redis.ttl(f'cache:{key}')
+
+
+def test_failed_connect_is_retried_when_the_breaker_half_opens(clock, monkeypatch):
+    monkeypatch.setenv('KV_URL', 'redis://localhost:6379')
+    db = VercelKV()
+    db.breaker = circuit.CircuitBreaker('redis', failure_threshold=1, reset_timeout=60)
+    redis = FakeRedis(clock)
+    outcomes = [(None, ConnectionError('Connection refused')), (redis, None)]
+    monkeypatch.setattr(db, '_connect', lambda: outcomes.pop(0))
+
+    db.set('kidsinmind:tt0000001', RESULT, TTL)
+    assert db.breaker.state == circuit.OPEN
+    assert 'cache:kidsinmind:tt0000001' in db.fallback_storage
+    assert db.redis is None and outcomes  # no new connect while the breaker is open
+
+    db.breaker.opened_at -= 60
+    db.set('kidsinmind:tt0000001', RESULT, TTL)
+    assert db.breaker.state == circuit.CLOSED
+    assert db.redis is redis and 'cache:kidsinmind:tt0000001' in redis.data
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+
+import argparse
+import gzip
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import titles
+
+logger = logging.getLogger(__name__)
+
+# Local copy of the titles in IMDb's public bulk dataset (title.basics.tsv.gz,
+# optionally with title.ratings.tsv.gz for vote counts), so that resolving a
+# name to an IMDb id, or an id to its title, is an indexed SQLite read instead
+# of an OMDB round trip. The omdb client consults it before the OMDB cache and
+# only falls back to OMDB when the title is missing or ambiguous here.
+#
+# title_keys is a WITHOUT ROWID table, i.e. sorted by the normalised title
+# (titles.compact), so a lookup is one B-tree descent; the file is opened
+# read-only and memory-mapped.
+#
+#     python title_index.py title.basics.tsv.gz --ratings title.ratings.tsv.gz
+
+TITLE_INDEX_PATH = os.environ.get('TITLE_INDEX_PATH', 'title_index.sqlite')
+MMAP_SIZE = 1 << 30
+
+# IMDb titleType -> OMDB Type. Episodes, shorts, videos and games are left out.
+IMPORT_TYPES = {
+    'movie': 'movie',
+    'tvMovie': 'movie',
+    'tvSpecial': 'movie',
+    'tvSeries': 'series',
+    'tvMiniSeries': 'series',
+}
+
+BATCH_SIZE = 50000
+
+_create_sql = [
+    'CREATE TABLE titles (tconst TEXT PRIMARY KEY, title TEXT, year INTEGER, type TEXT, votes INTEGER) WITHOUT ROWID',
+    'CREATE TABLE title_keys (key TEXT, tconst TEXT, PRIMARY KEY (key, tconst)) WITHOUT ROWID',
+    'CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)',
+]
+_by_key_sql = (
+    'SELECT t.tconst, t.title, t.year, t.type, t.votes FROM title_keys k JOIN titles t ON t.tconst = k.tconst '
+    'WHERE k.key = ? AND (? IS NULL OR t.year BETWEEN ? - 1 AND ? + 1) '
+    # Same year first, then the best known; two rows are enough to tell whether it is ambiguous
+    'ORDER BY t.year IS NOT ? AND ? IS NOT NULL, t.votes IS NULL, t.votes DESC LIMIT 2'
+)
+_by_id_sql = 'SELECT tconst, title, year, type, votes FROM titles WHERE tconst = ?'
+
+
+def _year(value):
+    return int(value) if value.isdigit() else None
+
+
+def _rows(path):
+    """Decoded lines of a gzipped IMDb TSV file, header skipped. The files use no quoting."""
+    with gzip.open(path, 'rt', encoding='utf-8', newline='\n') as f:
+        next(f, None)
+        for line in f:
+            yield line.rstrip('\n').split('\t')
+
+
+def build(basics_path, output_path=TITLE_INDEX_PATH, ratings_path=None):
+    """Import the dataset into a new index file, replacing output_path once complete. Returns the row counts."""
+    started = time.monotonic()
+    tmp_path = f"{output_path}.importing"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    for sql in _create_sql:
+        conn.execute(sql)
+
+    counts = {'read': 0, 'titles': 0, 'keys': 0, 'rated': 0}
+    title_batch, key_batch = [], []
+
+    def flush():
+        conn.executemany('INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?, NULL)', title_batch)
+        conn.executemany('INSERT OR IGNORE INTO title_keys VALUES (?, ?)', key_batch)
+        title_batch.clear()
+        key_batch.clear()
+
+    # tconst titleType primaryTitle originalTitle isAdult startYear endYear runtimeMinutes genres
+    for row in _rows(basics_path):
+        counts['read'] += 1
+        if len(row) < 6 or row[1] not in IMPORT_TYPES or row[4] == '1':
+            continue
+        tconst, title_type, primary, original = row[0], row[1], row[2], row[3]
+        title_batch.append((tconst, primary, _year(row[5]), IMPORT_TYPES[title_type]))
+        keys = {key for key in (titles.compact(primary), titles.compact(original)) if key}
+        key_batch.extend((key, tconst) for key in keys)
+        counts['titles'] += 1
+        counts['keys'] += len(keys)
+        if len(title_batch) >= BATCH_SIZE:
+            flush()
+    flush()
+
+    if ratings_path:
+        # tconst averageRating numVotes
+        batch = []
+        for row in _rows(ratings_path):
+            if len(row) >= 3 and row[2].isdigit():
+                batch.append((int(row[2]), row[0]))
+            if len(batch) >= BATCH_SIZE:
+                counts['rated'] += conn.executemany('UPDATE titles SET votes = ? WHERE tconst = ?', batch).rowcount
+                batch.clear()
+        counts['rated'] += conn.executemany('UPDATE titles SET votes = ? WHERE tconst = ?', batch).rowcount
+
+    conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+        ('source', os.path.basename(basics_path)),
+        ('imported_at', str(int(time.time()))),
+        ('titles', str(counts['titles'])),
+    ])
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+    os.replace(tmp_path, output_path)
+    counts['seconds'] = round(time.monotonic() - started, 1)
+    return counts
+
+
+def _as_record(row):
+    """OMDB-shaped record, so callers can treat an index hit like an OMDB reply."""
+    tconst, title, year, kind, _ = row
+    return {'Title': title, 'Year': str(year) if year else 'N/A', 'imdbID': tconst, 'Type': kind, 'Response': 'True', 'Source': 'title_index'}
+
+
+class TitleIndex:
+    """
+        TitleIndex
+
+        Read-only lookups against an index file made by build(). Each thread
+        gets its own connection.
+    """
+
+    def __init__(self, path=TITLE_INDEX_PATH):
+        self.path = path
+        self.local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+            self.local.conn = conn
+        return conn
+
+    def by_id(self, imdb_id):
+        row = self._conn().execute(_by_id_sql, (imdb_id,)).fetchone()
+        return _as_record(row) if row else None
+
+    def by_title(self, title, year=None):
+        """
+        The record for title, or None when it is unknown or ambiguous. With a
+        year, titles from that year (or one year off) win; among several
+        matches the one with the most votes is taken when the index has
+        ratings, otherwise the lookup is left to OMDB.
+        """
+        key = titles.compact(title)
+        if not key:
+            return None
+        year = _year(str(year).strip()[:4]) if year else None
+        rows = self._conn().execute(_by_key_sql, (key, year, year, year, year, year)).fetchall()
+        if not rows:
+            return None
+        if len(rows) > 1:
+            best, runner_up = rows
+            same_year = year is not None and best[2] == year and runner_up[2] != year
+            if not same_year and (not best[4] or best[4] == runner_up[4]):
+                return None
+        return _as_record(rows[0])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide index, or None when no index file has been imported."""
+    global _index
+    if _index is None and os.path.exists(TITLE_INDEX_PATH):
+        with _index_lock:
+            if _index is None:
+                _index = TitleIndex(TITLE_INDEX_PATH)
+    return _index
+
+
+def set_index(index):
+    global _index
+    _index = index
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    parser = argparse.ArgumentParser(description="Import IMDb's title.basics.tsv.gz into the local title index")
+    parser.add_argument('basics', help="path to title.basics.tsv.gz")
+    parser.add_argument('--ratings', help="path to title.ratings.tsv.gz, used to pick the best known of same-named titles")
+    parser.add_argument('--output', default=TITLE_INDEX_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.basics):
+        print(f'[!] Dataset not found: {args.basics}')
+        sys.exit(1)
+
+    counts = build(args.basics, args.output, args.ratings)
+    size = os.path.getsize(args.output) / (1 << 20)
+    print(f" * Imported {counts['titles']} of {counts['read']} titles ({counts['keys']} keys, {counts['rated']} rated) "
+          f"in {counts['seconds']}s into {args.output} ({size:.1f} MiB)")
@@ -0,0 +1,172 @@
+import re
+import unicodedata
+from collections import Counter
+
+# Title normalisation and fuzzy matching shared by the providers. Titles are
+# folded to plain lowercase ASCII-ish tokens once (Title), so matching a query
+# against a list of candidates only compares precomputed forms.
+
+ARTICLES = frozenset(['the', 'a', 'an'])
+ROMAN_NUMERALS = {'ii': '2', 'iii': '3', 'iv': '4', 'v': '5', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9', 'x': '10'}
+
+APOSTROPHES_RE = re.compile(r"['‘’`]")
+AMPERSAND_RE = re.compile(r'\s*&\s*')
+NON_WORD_RE = re.compile(r'[\W_]+')
+YEAR_SUFFIX_RE = re.compile(r'\s*[\(\[]\s*(\d{4})\s*[\)\]]\s*$')
+
+MATCH_THRESHOLD = 0.8
+# Same title but for a leading article, and same words in another order or count
+ARTICLE_ONLY_SCORE = 0.98
+REORDERED_FACTOR = 0.95
+
+
+def fold(text):
+    """Lowercase text with accents and other combining marks removed (Amélie -> amelie)."""
+    if text.isascii():
+        return text.casefold()
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def words(text):
+    """Folded words of a title with apostrophes and other punctuation dropped."""
+    return NON_WORD_RE.sub(' ', APOSTROPHES_RE.sub('', fold(text))).split()
+
+
+def tokens(text):
+    """Matching tokens of a title: its words, with '&' read as 'and' and numerals unified (II -> 2)."""
+    return [ROMAN_NUMERALS.get(word, word) for word in words(AMPERSAND_RE.sub(' and ', text))]
+
+
+def split_year(title):
+    """("Title", 2001) from "Title (2001)" or "Title [2001]"; the year is None when absent."""
+    match = YEAR_SUFFIX_RE.search(title)
+    if not match:
+        return title, None
+    return title[:match.start()], int(match.group(1))
+
+
+class Title:
+    """
+        Title
+
+        Precomputed normalised form of one title. Build these once for a
+        candidate list and score each of them against the query.
+    """
+
+    __slots__ = ('raw', 'tokens', 'key', 'compact', 'full_compact', 'token_set', 'token_counts', 'size', 'year')
+
+    def __init__(self, raw, year=None):
+        self.raw = raw
+        title_tokens = tokens(raw)
+        self.full_compact = ''.join(title_tokens)
+        # A leading article only breaks ties ("The Matrix" is "Matrix")
+        if len(title_tokens) > 1 and title_tokens[0] in ARTICLES:
+            title_tokens = title_tokens[1:]
+        self.tokens = title_tokens
+        self.key = ' '.join(title_tokens)
+        self.compact = ''.join(title_tokens)
+        self.token_set = frozenset(title_tokens)
+        self.token_counts = Counter(title_tokens)
+        self.size = len(title_tokens)
+        self.year = _as_year(year)
+
+    def __repr__(self):
+        return f"Title({self.raw!r}, {self.year!r})"
+
+
+def _as_year(year):
+    try:
+        return int(str(year).strip()[:4]) if year not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def prepare(title, year=None):
+    return title if isinstance(title, Title) else Title(title, year)
+
+
+def prepare_all(titles):
+    """Titles for a candidate list of strings or (title, year) pairs."""
+    return [prepare(*title) if isinstance(title, tuple) else prepare(title) for title in titles]
+
+
+def year_boost(year, release_year):
+    """+0.2 for the same year, +0.1 for one year off, else nothing."""
+    year, release_year = _as_year(year), _as_year(release_year)
+    if year is None or release_year is None:
+        return 0.0
+    if year == release_year:
+        return 0.2
+    if abs(year - release_year) <= 1:
+        return 0.1
+    return 0.0
+
+
+def score(query, candidate, release_year=None):
+    """
+    Similarity of candidate to query: 1.0 when their normalised forms agree
+    (spacing aside, so "Spider-Man" is "Spiderman"), slightly less when only
+    a leading article differs, otherwise the Dice coefficient of their word
+    multisets, scaled down so it never ties with an exact match.
+    release_year, or the query's own year, adds year_boost() for the
+    candidate's year.
+    """
+    query, candidate = prepare(query), prepare(candidate)
+    if query.compact and query.full_compact == candidate.full_compact:
+        similarity = 1.0
+    elif query.compact and query.compact == candidate.compact:
+        similarity = ARTICLE_ONLY_SCORE
+    elif query.size and candidate.size:
+        shared = sum((query.token_counts & candidate.token_counts).values())
+        similarity = REORDERED_FACTOR * 2 * shared / (query.size + candidate.size)
+    else:
+        similarity = 0.0
+    return similarity + year_boost(candidate.year, release_year if release_year is not None else query.year)
+
+
+def matches(query, candidate, release_year=None, threshold=MATCH_THRESHOLD):
+    return score(query, candidate, release_year) > threshold
+
+
+def contains(query, candidate):
+    """True when every token of query appears in candidate ("Frozen" in "Frozen II: Sing-Along")."""
+    query, candidate = prepare(query), prepare(candidate)
+    return bool(query.token_set) and query.token_set <= candidate.token_set
+
+
+def compact(title):
+    """Normalised form of a title as a single string, leading article dropped."""
+    if isinstance(title, Title):
+        return title.compact
+    title_tokens = tokens(title)
+    if len(title_tokens) > 1 and title_tokens[0] in ARTICLES:
+        title_tokens = title_tokens[1:]
+    return ''.join(title_tokens)
+
+
+def same_title(query, candidate):
+    """True when both normalise to the same title, ignoring articles, punctuation and accents."""
+    return compact(query) == compact(candidate)
+
+
+def rank(query, candidates, release_year=None):
+    """Candidates (prepared Titles) ordered best first; ties keep their original order."""
+    query = prepare(query)
+    return sorted(candidates, key=lambda candidate: -score(query, candidate, release_year))
+
+
+def best_match(query, candidates, release_year=None, threshold=MATCH_THRESHOLD):
+    """(candidate, score) of the best candidate above threshold, or None."""
+    query = prepare(query)
+    best, best_score = None, threshold
+    for candidate in candidates:
+        candidate_score = score(query, candidate, release_year)
+        if candidate_score > best_score:
+            best, best_score = candidate, candidate_score
+    return (best, best_score) if best is not None else None
+
+
+def slug(title, separator='-'):
+    """URL slug as the review sites build them: folded words as written, joined by separator."""
+    return separator.join(words(title))
@@ -0,0 +1,154 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Where the time of one /get_data request goes, span by span: the lookup
+# stages (resolve, cache, revalidate, scrape, store, stats, timed by
+# service.py), and inside them each OMDB call (omdb) and provider page fetch
+# (fetch) made through upstream, including any wait for the host's rate
+# limiter, each provider parse function (parse), the GeoIP lookup (geoip) and
+# every log row written to the database (log). Spans nest (a fetch is part of
+# its scrape), so they do not add up to the total.
+#
+# Every response gets the per-stage totals as a Server-Timing header, which
+# browser dev tools show next to the request (SERVER_TIMING=0 leaves it out).
+# TRACE_SAMPLE_RATE of the requests are also logged as a structured record
+# with every span's offset and duration. When neither applies nothing is
+# collected, and a span only looks up the context variable holding the trace.
+
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') == '1'
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    """
+        Trace
+
+        The spans recorded for one request, as (stage, started, seconds)
+        with perf_counter() start times. Spans are appended from whichever
+        thread the request's work runs in (asyncio.to_thread() and the
+        provider thread pools carry the context along), and list.append()
+        needs no lock for that.
+    """
+
+    __slots__ = ('route', 'id', 'started', 'sampled', 'spans', 'fields')
+
+    def __init__(self, route, sampled=False):
+        self.route = route
+        self.id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.spans = []
+        self.fields = {}
+
+    def note(self, **fields):
+        """Add fields (provider, key, source, status, ...) to the sampled record."""
+        self.fields.update(fields)
+
+    def totals(self):
+        """{stage: [seconds, count]} in the order the stages first started."""
+        totals = {}
+        for stage, _, seconds in self.spans:
+            total = totals.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+        return totals
+
+    def server_timing(self):
+        entries = []
+        for stage, (seconds, count) in self.totals().items():
+            entry = f"{stage};dur={seconds * 1000:.2f}"
+            entries.append(entry if count == 1 else f'{entry};desc="{count} calls"')
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+    def record(self):
+        return {
+            'trace_id': self.id,
+            'route': self.route,
+            **self.fields,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'stages': {stage: {'ms': round(seconds * 1000, 2), 'count': count} for stage, (seconds, count) in self.totals().items()},
+            'spans': [[stage, round((started - self.started) * 1000, 2), round(seconds * 1000, 2)] for stage, started, seconds in self.spans],
+        }
+
+
+@contextmanager
+def trace(route):
+    """
+    Collect the spans of the request handled inside the block. Yields the
+    Trace, or None when there is nothing to collect for (no Server-Timing
+    header and not sampled). A sampled trace is logged as it ends.
+    """
+    sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+    if not (SERVER_TIMING or sampled):
+        yield None
+        return
+    current = Trace(route, sampled)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        if sampled:
+            metrics.incr('traces_sampled', route=route)
+            logger.info(f"Trace {json.dumps(current.record())}")
+
+
+def respond(current, headers, status):
+    """Note the response status on current (a Trace or None) and add its Server-Timing header to headers."""
+    if current is None:
+        return
+    current.note(status=status)
+    if SERVER_TIMING:
+        headers['Server-Timing'] = current.server_timing()
+
+
+def add(stage, started, seconds):
+    """Record a span timed by the caller, when a trace is being collected."""
+    current = _current.get()
+    if current is not None:
+        current.spans.append((stage, started, seconds))
+
+
+@contextmanager
+def span(stage):
+    """Record the time spent in the block as a stage span of the current trace, if any."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.spans.append((stage, started, time.perf_counter() - started))
+
+
+def spanned(stage):
+    """Decorator: record every call of the function as a stage span."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            current = _current.get()
+            if current is None:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current.spans.append((stage, started, time.perf_counter() - started))
+        return wrapper
+    return decorator
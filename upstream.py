@@ -0,0 +1,262 @@
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import requests
+
+import metrics
+import page_store
+import ratelimit
+import retry
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Shared fetch path for every provider and for OMDB. All upstream traffic goes
+# through get() / get_async() so it is governed by the per-host limits in
+# ratelimit and retried according to retry.DEFAULT_POLICY. Successful bodies are
+# kept in the page store so results can be rebuilt later without refetching.
+
+# Statuses that mean the provider itself is down or refusing us, rather than "not found"
+OUTAGE_STATUSES = frozenset([403, 429])
+
+
+class UpstreamError(Exception):
+    """The provider could not be reached or answered with an outage status."""
+
+
+class ParseError(UpstreamError):
+    """The provider answered but its page no longer has the markup the scraper expects."""
+
+
+def raise_for_outage(response):
+    status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+    if status in OUTAGE_STATUSES or (status or 0) >= 500:
+        raise UpstreamError(f"{response.url} answered with status {status}")
+
+
+# When set, fetches are answered from this PageStore and never touch the network
+_replay_store = None
+
+
+def set_replay(store):
+    global _replay_store
+    _replay_store = store
+
+
+def replaying():
+    return _replay_store is not None
+
+
+# When set (e.g. UPSTREAM_STANDIN=http://127.0.0.1:8765), every fetch is sent to
+# this stand-in server as GET /<original url> instead of to the real host; see standin.py
+_standin = (os.environ.get('UPSTREAM_STANDIN') or '').rstrip('/') or None
+
+
+def set_standin(base_url):
+    global _standin
+    _standin = base_url.rstrip('/') if base_url else None
+
+
+def _target(url):
+    return f"{_standin}/{url}" if _standin else url
+
+
+# Validators of the successful fetches made inside the current capture() block
+_captured = contextvars.ContextVar('upstream_captured', default=None)
+
+
+@contextmanager
+def capture():
+    """Collect {url, etag, last_modified, hash, size} for every successful fetch made inside the block."""
+    fetches = []
+    token = _captured.set(fetches)
+    try:
+        yield fetches
+    finally:
+        _captured.reset(token)
+
+
+def add_captured(fetches):
+    """Add fetches collected by a nested capture() block to the enclosing one, if any."""
+    captured = _captured.get()
+    if captured is not None:
+        captured.extend(fetches)
+
+
+def validators_for(url, content, headers):
+    return {
+        'url': url,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'hash': hashlib.sha256(content).hexdigest(),
+        'size': len(content),
+    }
+
+
+# Synchronous fetches without a session of their own share this one, so the
+# connection to a host is kept open and reused from one fetch to the next
+_session = None
+_session_lock = threading.Lock()
+
+
+def sync_session():
+    """The requests Session synchronous fetches share, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = requests.Session()
+    return _session
+
+
+def fetch_once(url, session=None, deadline=None, timeout=None, **kwargs):
+    """Single GET through the host's rate limiter. session may be any object with a requests-style get()."""
+    if _replay_store is not None:
+        return _replay_store.response_for(url)
+    session = session or sync_session()
+    label = _provider_label(url)
+    with tracing.span(_stage(label)), ratelimit.throttle(url, deadline):
+        response = session.get(_target(url), timeout=timeout, **kwargs)
+    metrics.incr('upstream_requests', provider=label)
+    _record(url, response.status_code, response.content, response.headers)
+    return response
+
+
+def get(url, session=None, deadline=None, policy=None, **kwargs):
+    """GET url with retries. Returns the final response, whatever its status; raises once transport errors are exhausted."""
+    policy = policy or retry.DEFAULT_POLICY
+    return policy.call(
+        lambda timeout: fetch_once(url, session=session, deadline=deadline, timeout=timeout, **kwargs),
+        url,
+        deadline,
+    )
+
+
+class BufferedResponse(page_store.StoredResponse):
+    """requests-style response for a body the async path has already read, whichever client fetched it."""
+
+    def __init__(self, url, content, status_code, headers):
+        super().__init__(url, content, status_code)
+        self.headers = headers
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} for {self.url}", response=self)
+
+
+async def fetch_once_async(url, session=None, deadline=None, timeout=None, **kwargs):
+    """
+    Coroutine counterpart of fetch_once(). session is an aiohttp.ClientSession
+    (async_session() when not given) or a curl_cffi AsyncSession; the body is
+    read before the limiter slot is released and returned as a BufferedResponse.
+    """
+    import aiohttp
+
+    if _replay_store is not None:
+        return _replay_store.response_for(url)
+    session = session or async_session()
+    label = _provider_label(url)
+    with tracing.span(_stage(label)):
+        async with ratelimit.throttle_async(url, deadline):
+            if isinstance(session, aiohttp.ClientSession):
+                async with session.get(_target(url), timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+                    content = await response.read()
+                status, headers = response.status, response.headers
+            else:
+                response = await session.get(_target(url), timeout=timeout, **kwargs)
+                content, status, headers = response.content, response.status_code, response.headers
+    metrics.incr('upstream_requests', provider=label)
+    _record(url, status, content, headers)
+    return BufferedResponse(url, content, status, headers)
+
+
+async def get_async(url, session=None, deadline=None, policy=None, **kwargs):
+    policy = policy or retry.DEFAULT_POLICY
+    return await policy.call_async(
+        lambda timeout: fetch_once_async(url, session, deadline=deadline, timeout=timeout, **kwargs),
+        url,
+        deadline,
+    )
+
+
+def preconnect(url, session=None, timeout=5):
+    """
+    Open a connection to url's host in session's pool (sync_session() when
+    not given) ahead of the first fetch, with a HEAD request that is neither
+    retried nor recorded. Used by warm-up; raises on failure.
+    """
+    if _replay_store is not None:
+        return
+    session = session or sync_session()
+    with ratelimit.throttle(url):
+        session.head(_target(url), timeout=timeout)
+    metrics.incr('upstream_preconnects', provider=_provider_label(url))
+
+
+async def preconnect_async(url, session=None, timeout=5):
+    """Coroutine counterpart of preconnect(), for the pools of the running event loop."""
+    import aiohttp
+
+    if _replay_store is not None:
+        return
+    session = session or async_session()
+    async with ratelimit.throttle_async(url):
+        if isinstance(session, aiohttp.ClientSession):
+            async with session.head(_target(url), timeout=aiohttp.ClientTimeout(total=timeout)):
+                pass
+        else:
+            await session.head(_target(url), timeout=timeout)
+    metrics.incr('upstream_preconnects', provider=_provider_label(url))
+
+
+# One aiohttp session per event loop, shared by every coroutine fetch on it
+_async_sessions = {}
+
+
+def async_session():
+    """The aiohttp session of the running event loop, created on first use."""
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        # No pool limit of its own: ratelimit already caps the connections per host
+        session = _async_sessions[loop] = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+    return session
+
+
+async def close_async_session():
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def _record(url, status, content, headers):
+    if not 200 <= status < 300:
+        return
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(validators_for(url, content, headers))
+    # Stand-in replies are copies of recorded pages; keep them out of the store
+    store = page_store.get_store() if _standin is None else None
+    if store is None:
+        return
+    try:
+        store.put(url, content, status, headers.get('Content-Type'))
+    except Exception as e:
+        logger.error(f"Failed to store raw page for {url}: {str(e)}")
+
+
+def _provider_label(url):
+    limiter = ratelimit.limiter_for(url)
+    return limiter.name if limiter else 'other'
+
+
+def _stage(label):
+    """Trace stage of a fetch from the host labelled label: omdb, or fetch for a provider page."""
+    return 'omdb' if label == 'omdb' else 'fetch'
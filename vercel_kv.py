@@ -1,35 +1,89 @@
 import os
-from redis import Redis
 import json
+import threading
+import time
 from datetime import datetime
 import logging
 from datetime import date
 
+import circuit
+
 logger = logging.getLogger(__name__)
 
+# Cache entries are stored as {"value": ..., "expires": ...}, like the exp
+# column of SqliteCache, and Redis keeps the key EXPIRED_GRACE_SECONDS past
+# that expiry. An expired entry can then still be read and revalidated
+# (revalidate.py) rather than re-scraped; its validators and encoded response
+# expire with it.
+EXPIRED_GRACE_SECONDS = int(os.environ.get('EXPIRED_GRACE_SECONDS', 7*24*60*60))
+DEFAULT_CACHING_PERIOD = 30*24*60*60  # 30 days, as in SqliteCache.touch
+
 class VercelKV:
     def __init__(self):
         self.fallback_storage = {}  # In-memory fallback storage
-        kv_url = os.environ.get('KV_URL')
-        if kv_url:
-            try:
-                self.redis = Redis.from_url(kv_url, socket_timeout=10, socket_connect_timeout=10, retry_on_timeout=True, max_connections=10)
-                self.redis.ping()  # Test the connection
-                logger.info("Successfully connected to Redis")
-            except Exception as e:
-                logger.error(f"Failed to connect to Redis: {str(e)}. Using fallback storage.")
-                self.redis = None
-        else:
+        # The connection is opened (and redis imported) by the first operation,
+        # not here, so a cold start that never touches the store skips both
+        self._kv_url = os.environ.get('KV_URL')
+        self._redis = None
+        self._connected = not self._kv_url
+        self._connect_lock = threading.Lock()
+        # Trips after repeated Redis failures and sends operations to the
+        # fallback storage until a probe after the reset timeout succeeds
+        self.breaker = circuit.CircuitBreaker('redis')
+        if not self._kv_url:
             logger.warning("KV_URL not set. Using fallback storage.")
-            self.redis = None
+
+    @property
+    def redis(self):
+        if self._connected:
+            return self._redis
+        # A failed connect counts against the breaker like a failed operation,
+        # and is tried again once the breaker lets a probe through
+        if not self.breaker.allow():
+            return None
+        client = error = None
+        with self._connect_lock:
+            if not self._connected:  # else connected by another thread meanwhile
+                client, error = self._connect()
+                if error is None:
+                    self._redis, self._connected = client, True
+        # Logged (and reported to the breaker, which logs too) only now: the
+        # database log handler writes to this store, and would wait for the
+        # lock held above
+        if error is not None:
+            logger.error(f"Failed to connect to Redis: {error}. Using fallback storage.")
+            self.breaker.record_failure(error)
+        else:
+            if client is not None:
+                logger.info("Successfully connected to Redis")
+            self.breaker.record_success()
+        return self._redis
+
+    @redis.setter
+    def redis(self, value):
+        self._redis = value
+        self._connected = True
+
+    def _connect(self):
+        """(client, None) once Redis answers a ping, else (None, the exception)."""
+        try:
+            from redis import Redis
+            redis = Redis.from_url(self._kv_url, socket_timeout=10, socket_connect_timeout=10, retry_on_timeout=True, max_connections=10)
+            redis.ping()  # Test the connection
+            return redis, None
+        except Exception as e:
+            return None, e
 
     def _safe_operation(self, redis_op, fallback_op):
-        if self.redis:
+        if self.redis and self.breaker.allow():
             try:
-                return redis_op()
+                result = redis_op()
             except Exception as e:
                 logger.error(f"Redis operation failed: {str(e)}. Using fallback storage.")
-                self.redis = None  # Disable Redis for future operations
+                self.breaker.record_failure(e)
+            else:
+                self.breaker.record_success()
+                return result
         return fallback_op()
 
     def _safe_json_dumps(self, data):
@@ -55,31 +109,144 @@ class VercelKV:
         raise TypeError(f"Type {type(obj)} not serializable")
 
     # Cache methods
+    @staticmethod
+    def _entry(value, timeout):
+        return {'value': value, 'expires': time.time() + float(timeout) if timeout is not None else 0}
+
+    @staticmethod
+    def _unwrap(entry):
+        """(value, expires) of a stored entry, (None, None) when there is none."""
+        if entry is None:
+            return None, None
+        if isinstance(entry, dict) and entry.keys() == {'value', 'expires'}:
+            return entry['value'], entry['expires']
+        return entry, 0  # written before expiries were stored: fresh until Redis drops it
+
+    @staticmethod
+    def _fresh(expires):
+        return expires == 0 or expires > time.time()
+
+    @staticmethod
+    def _key_ttl(timeout):
+        return int(timeout) + EXPIRED_GRACE_SECONDS if timeout is not None else None
+
     def get(self, key):
-        return self._safe_operation(
+        value, expires = self.get_entry(key)
+        return value if value is not None and self._fresh(expires) else None
+
+    def get_entry(self, key):
+        """(value, expires) without dropping an expired entry, so it can be revalidated."""
+        return self._unwrap(self._safe_operation(
             lambda: self._safe_json_loads(self.redis.get(f"cache:{key}")),
             lambda: self.fallback_storage.get(f"cache:{key}")
+        ))
+
+    def touch(self, key, timeout=None):
+        """Push back the expiry of an existing entry, and of its validators and encoded response."""
+        timeout = DEFAULT_CACHING_PERIOD if timeout is None else timeout
+
+        def extend():
+            value, _ = self._unwrap(self._safe_json_loads(self.redis.get(f"cache:{key}")))
+            if value is None:
+                return
+            entry, key_ttl = self._entry(value, timeout), self._key_ttl(timeout)
+            pipe = self.redis.pipeline().set(f"cache:{key}", self._safe_json_dumps(entry), ex=key_ttl).expire(f"validators:{key}", key_ttl)
+            if self.redis.exists(f"response:{key}"):
+                pipe.hset(f"response:{key}", 'expires', entry['expires']).expire(f"response:{key}", key_ttl)
+            pipe.execute()
+
+        def extend_fallback():
+            value, _ = self._unwrap(self.fallback_storage.get(f"cache:{key}"))
+            if value is not None:
+                self.fallback_storage[f"cache:{key}"] = self._entry(value, timeout)
+
+        self._safe_operation(extend, extend_fallback)
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        entries = self._safe_operation(
+            lambda: [self._safe_json_loads(value) for value in self.redis.mget([f"cache:{key}" for key in keys])],
+            lambda: [self.fallback_storage.get(f"cache:{key}") for key in keys]
+        )
+        # Keyed by the lowercased cache key, matching SqliteCache.get_many;
+        # expired entries are skipped but kept, so they can still be revalidated
+        results = {}
+        for key, entry in zip(keys, entries):
+            value, expires = self._unwrap(entry)
+            if value and self._fresh(expires):
+                results[key.lower()] = value
+        return results
+
+    def keys(self):
+        return self._safe_operation(
+            lambda: [key.decode()[len("cache:"):] if isinstance(key, bytes) else key[len("cache:"):] for key in self.redis.scan_iter("cache:*")],
+            lambda: [key[len("cache:"):] for key in self.fallback_storage if key.startswith("cache:")]
         )
 
     def set(self, key, value, timeout=None):
-        json_value = self._safe_json_dumps(value)
+        entry = self._entry(value, timeout)
+        json_entry = self._safe_json_dumps(entry)
+        # The stored response was encoded from the old value
         self._safe_operation(
-            lambda: self.redis.set(f"cache:{key}", json_value, ex=timeout),
-            lambda: self.fallback_storage.update({f"cache:{key}": value})
+            lambda: self.redis.pipeline().set(f"cache:{key}", json_entry, ex=self._key_ttl(timeout)).delete(f"response:{key}").execute(),
+            lambda: (self.fallback_storage.update({f"cache:{key}": entry}), self.fallback_storage.pop(f"response:{key}", None))
         )
 
     def delete(self, key):
         self._safe_operation(
-            lambda: self.redis.delete(f"cache:{key}"),
-            lambda: self.fallback_storage.pop(f"cache:{key}", None)
+            lambda: self.redis.delete(f"cache:{key}", f"response:{key}"),
+            lambda: (self.fallback_storage.pop(f"cache:{key}", None), self.fallback_storage.pop(f"response:{key}", None))
         )
 
     def clear(self):
         self._safe_operation(
-            lambda: [self.redis.delete(key) for key in self.redis.scan_iter("cache:*")],
+            lambda: [self.redis.delete(key) for pattern in ("cache:*", "response:*", "validators:*") for key in self.redis.scan_iter(pattern)],
             lambda: self.fallback_storage.clear()
         )
 
+    # Encoded /get_data responses (see response_cache.py), kept no longer than
+    # their entry, with a copy of the entry's expiry in the hash
+    def _response_from_hash(self, fields):
+        if not fields or b'etag' not in fields:
+            return None, None
+        return {
+            'etag': fields[b'etag'].decode(),
+            'meta': self._safe_json_loads(fields[b'meta']),
+            'identity': fields[b'identity'],
+            'gzip': fields[b'gzip'],
+            'br': fields.get(b'br') or None,
+        }, float(fields.get(b'expires') or 0)
+
+    def get_response(self, key):
+        def fallback():
+            response = self.fallback_storage.get(f"response:{key}")
+            return (response, self._unwrap(self.fallback_storage.get(f"cache:{key}"))[1]) if response else (None, None)
+
+        return self._safe_operation(
+            lambda: self._response_from_hash(self.redis.hgetall(f"response:{key}")),
+            fallback
+        )
+
+    def set_response(self, key, response):
+        fields = dict(response, meta=self._safe_json_dumps(response['meta']), br=response['br'] or b'')
+
+        def store():
+            _, expires = self._unwrap(self._safe_json_loads(self.redis.get(f"cache:{key}")))
+            if expires is None:
+                return  # the entry is gone already
+            ttl = self.redis.ttl(f"cache:{key}")
+            pipe = self.redis.pipeline().hset(f"response:{key}", mapping=dict(fields, expires=expires))
+            if ttl > 0:
+                pipe.expire(f"response:{key}", ttl)
+            pipe.execute()
+
+        self._safe_operation(
+            store,
+            lambda: self.fallback_storage.update({f"response:{key}": response})
+        )
+
     # Stats methods
     def get_all_stats(self):
         return self._safe_operation(
@@ -98,8 +265,29 @@ class VercelKV:
 
     def clear_stats(self):
         self._safe_operation(
-            lambda: self.redis.delete('stats'),
-            lambda: self.fallback_storage.pop('stats', None)
+            lambda: self.redis.delete('stats', 'hits'),
+            lambda: (self.fallback_storage.pop('stats', None), self.fallback_storage.pop('hits', None))
+        )
+
+    # Hit statistics per cache key, in a sorted set
+    def record_hits(self, counts):
+        def fallback():
+            hits = self.fallback_storage.setdefault('hits', {})
+            for key, count in counts.items():
+                hits[key] = hits.get(key, 0) + count
+
+        def incr():
+            pipe = self.redis.pipeline()
+            for key, count in counts.items():
+                pipe.zincrby('hits', count, key)
+            pipe.execute()
+
+        self._safe_operation(incr, fallback)
+
+    def hottest_keys(self, limit):
+        return self._safe_operation(
+            lambda: [key.decode() if isinstance(key, bytes) else key for key in self.redis.zrevrange('hits', 0, limit - 1)],
+            lambda: sorted(self.fallback_storage.get('hits', {}), key=lambda key: -self.fallback_storage['hits'][key])[:limit]
         )
 
     # Log methods
@@ -143,7 +331,33 @@ class VercelKV:
             lambda: self.fallback_storage.update({f"omdb:{key}": value})
         )
 
+    # Validators methods
+    def get_validators(self, key):
+        return self._safe_operation(
+            lambda: self._safe_json_loads(self.redis.get(f"validators:{key}")),
+            lambda: self.fallback_storage.get(f"validators:{key}")
+        )
+
+    def set_validators(self, key, validators):
+        json_validators = self._safe_json_dumps(validators)
+
+        def store():
+            # Kept as long as the entry they revalidate
+            ttl = self.redis.ttl(f"cache:{key}")
+            if ttl == -2:
+                return  # the entry is gone already
+            self.redis.set(f"validators:{key}", json_validators, ex=ttl if ttl > 0 else None)
+
+        self._safe_operation(
+            store,
+            lambda: self.fallback_storage.update({f"validators:{key}": validators})
+        )
+
     # Utility methods
+    def ping(self):
+        """True when Redis answers, False when operations go to the fallback storage."""
+        return self._safe_operation(lambda: bool(self.redis.ping()), lambda: False)
+
     def get_cached_records_count(self):
         return self._safe_operation(
             lambda: self.redis.dbsize(),